@@ -0,0 +1,105 @@
+"""
+Microbenchmarks of drawing.geometry against the per-item code it replaced.
+
+Run from the drawing package directory:
+
+    python3 benchmark/geometry_bench.py [count]
+
+Each line reports the per-item loop, the batched call and the speedup for
+count random poses. modern_robotics is only needed for the mean benchmark,
+which is skipped without it.
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+import transforms3d as tf
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from drawing.geometry import (  # noqa: E402
+    compose, invert, rotations_to_quaternions, se3_exp, se3_mean,
+    transforms_from_poses)
+
+
+def quat_to_matrix_loop(translations, quaternions):
+    """Old Tags.array_to_transform_matrix, one pose at a time."""
+    transforms = []
+    for translation, quaternion in zip(translations, quaternions):
+        quaternion = quaternion / np.linalg.norm(quaternion)
+        transform = np.eye(4)
+        transform[:3, :3] = tf.quaternions.quat2mat(
+            [quaternion[3], quaternion[0], quaternion[1], quaternion[2]])
+        transform[:3, 3] = translation
+        transforms.append(transform)
+    return np.array(transforms)
+
+
+def matrix_to_quat_loop(transforms):
+    """Old Tags.matrix_to_position_quaternion, one matrix at a time."""
+    return np.array([tf.quaternions.mat2quat(transform[:3, :3])
+                     for transform in transforms])
+
+
+def inverse_loop(transforms):
+    """General matrix inverse per transform, as mr.TransInv was used."""
+    return np.array([np.linalg.inv(transform) for transform in transforms])
+
+
+def compose_loop(a, b):
+    """Matrix product per transform pair."""
+    return np.array([x @ y for x, y in zip(a, b)])
+
+
+def mean_loop(transforms):
+    """Old Tags.mean_transformation_matrices, MatrixLog6 per matrix."""
+    import modern_robotics as mr
+    twists = [mr.se3ToVec(mr.MatrixLog6(transform)) for transform in transforms]
+    return mr.MatrixExp6(mr.VecTose3(np.mean(twists, axis=0)))
+
+
+def bench(name, loop, batched, number=5):
+    """Time both versions and print one report line."""
+    loop_time = min(timeit.repeat(loop, number=number, repeat=3)) / number
+    batched_time = min(timeit.repeat(batched, number=number, repeat=3)) / number
+    print(f'{name:<24} loop {loop_time * 1e3:9.3f} ms   batched '
+          f'{batched_time * 1e3:9.3f} ms   x{loop_time / batched_time:7.1f}')
+
+
+def main():
+    """Run every benchmark."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rng = np.random.default_rng(0)
+    translations = rng.normal(size=(count, 3))
+    quaternions = rng.normal(size=(count, 4))
+    transforms = transforms_from_poses(translations, quaternions)
+    others = se3_exp(rng.normal(size=(count, 6)))
+
+    print(f'{count} poses')
+    bench('quaternion -> matrix',
+          lambda: quat_to_matrix_loop(translations, quaternions),
+          lambda: transforms_from_poses(translations, quaternions))
+    bench('matrix -> quaternion',
+          lambda: matrix_to_quat_loop(transforms),
+          lambda: rotations_to_quaternions(transforms[:, :3, :3]))
+    bench('inverse',
+          lambda: inverse_loop(transforms),
+          lambda: invert(transforms))
+    bench('compose',
+          lambda: compose_loop(transforms, others),
+          lambda: compose(transforms, others))
+    try:
+        import modern_robotics  # noqa: F401
+    except ImportError:
+        print('modern_robotics not installed, skipping the mean benchmark')
+        return
+    near = transforms[0] @ se3_exp(rng.normal(size=(count, 6)) * 0.01)
+    bench('log + mean',
+          lambda: mean_loop(near),
+          lambda: se3_mean(near, initial=np.eye(4), iterations=1))
+
+
+if __name__ == '__main__':
+    main()
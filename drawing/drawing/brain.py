@@ -1,17 +1,21 @@
 import rclpy
 from rclpy.node import Node
 from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
+from rclpy.qos import DurabilityPolicy, QoSProfile
 
 from std_srvs.srv import Empty
-from std_msgs.msg import Bool, String
-from matplotlib.font_manager import FontProperties
-from matplotlib.textpath import TextToPath
+from std_msgs.msg import Bool, Int64, String
 # from brain_interfaces.msg import Cartesian
-from brain_interfaces.srv import BoardTiles, MovePose, Cartesian, Box
+from brain_interfaces.srv import BoardTiles, BoardTilesBatch, MovePose, Cartesian, Box
 from brain_interfaces.msg import LetterMsg
 # from character_interfaces.alphabet import alphabet
 from geometry_msgs.msg import Pose, Point, Quaternion
 
+from drawing.glyphs import GlyphStore, default_glyph_cache
+from drawing.layout import BoardLayout, default_layout_file
+from drawing.strokes import (order_strokes, reverse_strokes, simplify_strokes,
+                             transit_distance)
+
 from enum import Enum, auto
 import numpy as np
 
@@ -30,6 +34,15 @@ class Brain(Node):
     def __init__(self):
         super().__init__("brain")
 
+        # declare parameters
+        self.declare_parameter('glyph_cache', default_glyph_cache())
+        # maximum distance between a letter's curves and the drawn chords (m)
+        self.declare_parameter('glyph_tolerance', 0.0005)
+        # nearly collinear stroke points closer than this to the line are dropped (m)
+        self.declare_parameter('simplify_tolerance', 0.0005)
+        # where the tiles are on the board
+        self.declare_parameter('layout_file', default_layout_file())
+
         self.timer_callback_group = MutuallyExclusiveCallbackGroup()
 
         self.create_timer(0.01, self.timer_callback, self.timer_callback_group)
@@ -54,7 +67,7 @@ class Brain(Node):
 
         # Create clients
         self.board_service_client = self.create_client(
-            BoardTiles, '/where_to_write', callback_group=self.tile_callback_group)  # create custom service type
+            BoardTilesBatch, '/where_to_write_batch', callback_group=self.tile_callback_group)  # create custom service type
         self.calibrate_service_client = self.create_client(
             Empty, 'calibrate', callback_group=self.cal_callback_group)  # create custom service type
         self.movepose_service_client = self.create_client(
@@ -80,6 +93,11 @@ class Brain(Node):
         # Create subscription from hangman.py
         self.hangman = self.create_subscription(
             LetterMsg, '/writer', callback=self.hangman_callback, qos_profile=10)
+        # board calibration epoch from the tags node, latched so the current
+        # one arrives even if the tags node published it before brain started
+        self.epoch_sub = self.create_subscription(
+            Int64, 'calibration_epoch', self.calibration_epoch_callback,
+            QoSProfile(depth=1, durability=DurabilityPolicy.TRANSIENT_LOCAL))
         # self.home = self.create_subscription(
         #     Bool, '/RTH', callback=self.home_callback, qos_profile=10)
         # self.trajectory_status = self.create_subscription(
@@ -92,9 +110,23 @@ class Brain(Node):
             orientation=Quaternion(x=1.0, y=0.0, z=0.0, w=0.0)
         )
         self.alphabet = {}
+        self.font_family = "Liberation Sans Narrow"
+        self.glyphs = GlyphStore(self.get_parameter(
+            'glyph_cache').get_parameter_value().string_value)
+        self.glyph_tolerance = self.get_parameter(
+            'glyph_tolerance').get_parameter_value().double_value
+        self.simplify_tolerance = self.get_parameter(
+            'simplify_tolerance').get_parameter_value().double_value
+        self.layout = BoardLayout.from_file(self.get_parameter(
+            'layout_file').get_parameter_value().string_value)
         self.board_scale = 1.0
         self.scale_factor = 0.001 * self.board_scale
         self.shape_list = []
+        # poses of the shapes in shape_list, from one where_to_write_batch
+        # call, and the calibration epoch they were computed in
+        self.shape_poses = []
+        self.shape_poses_epoch = None
+        self.calibration_epoch = None
         self.current_mp_pose = Pose()
         self.current_traj_poses = []
         self.current_shape_poses = []
@@ -106,7 +138,12 @@ class Brain(Node):
         self.create_letters()
 
     def create_letters(self):
-        """Create the dictionary of bubble letters"""
+        """
+        Create the dictionary of bubble letters.
+
+        Every entry is a list of strokes, each an (N, 2) array of board
+        points that is drawn without lifting the pen.
+        """
 
         letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0|-/_'
         for i in range(0, len(letters)):
@@ -120,71 +157,129 @@ class Brain(Node):
                     y = 35+35*np.sin(2*np.pi*t/q)
                     xvec.append(x*self.scale_factor * self.board_scale)
                     yvec.append(y*self.scale_factor * self.board_scale)
-                point_dict = {letter: {'xlist': xvec, 'ylist': yvec}}
+                point_dict = {letter: [np.column_stack((xvec, yvec))]}
                 self.alphabet.update(point_dict)
             elif letter == '|':  # Body of man
                 xlist = [0.0, 0.0, 0.0]
                 ylist = [0.1 * self.board_scale, 0.05 *
                          self.board_scale, 0.002 * self.board_scale]
-                point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
+                point_dict = {letter: [np.column_stack((xlist, ylist))]}
                 self.alphabet.update(point_dict)
             elif letter == '-':  # Arms of man
                 xlist = [0.05 * self.board_scale, 0.1 *
                          self.board_scale, 0.15 * self.board_scale]
                 ylist = [0.05 * self.board_scale, 0.05 *
                          self.board_scale, 0.05 * self.board_scale]
-                point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
+                point_dict = {letter: [np.column_stack((xlist, ylist))]}
                 self.alphabet.update(point_dict)
             elif letter == '/':  # Leg of man 1
                 xlist = [0.1 * self.board_scale, 0.075 *
                          self.board_scale, 0.05 * self.board_scale]
                 ylist = [0.1 * self.board_scale, 0.06 *
                          self.board_scale, 0.02 * self.board_scale]
-                point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
+                point_dict = {letter: [np.column_stack((xlist, ylist))]}
                 self.alphabet.update(point_dict)
             elif letter == '_':  # Leg of man 2
                 xlist = [0.0 * self.board_scale, 0.025 *
                          self.board_scale, 0.05 * self.board_scale]
                 ylist = [0.1 * self.board_scale, 0.06 *
                          self.board_scale, 0.02 * self.board_scale]
-                point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
+                point_dict = {letter: [np.column_stack((xlist, ylist))]}
                 self.alphabet.update(point_dict)
             else:  # All letters of alphabet
-                fp = FontProperties(family="Liberation Sans Narrow", style="normal")
-                verts, codes = TextToPath().get_text_path(fp, letters[i])
-                xlist = []
-                ylist = []
-                for j in range(0, len(verts) - 1):
-                    if verts[j][0] > 0: #Commented out because I want to keep the 0,0 for lifting off the board
-                        xlist.append(
-                            verts[j][0] * self.scale_factor * self.board_scale)
-                        ylist.append(
-                            verts[j][1] * self.scale_factor * self.board_scale)
-                point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
+                strokes = self.glyphs.strokes(
+                    self.font_family, self.scale_factor, self.board_scale,
+                    self.glyph_tolerance, letter)
+                point_dict = {letter: strokes}
                 self.alphabet.update(point_dict)
 
-    def process_letter_points(self, letter):
-        """ Function to make it easier to prepare letters for board tile type"""
-        xcoord = self.alphabet[letter]['xlist']
-        ycoord = self.alphabet[letter]['ylist']
+        self.glyphs.save()
+        self.get_logger().info(
+            f"glyph cache: {self.glyphs.hits} hits, {self.glyphs.misses} misses")
+
+    def process_letter_points(self, strokes):
+        """
+        Flatten the strokes of a letter into board tile points.
+
+        Points inside a stroke are drawn on the board. Between two strokes
+        the pen lifts off at the end of the first one and moves above the
+        start of the next, and it lifts once more after the last stroke, so
+        force control stays engaged for every stroke as a whole.
+        """
         board_x = []
         board_y = []
         board_bool = []
-        for i in range(0, len(xcoord)):
-            if not (0.0001 > xcoord[i] > -0.0001) or not (0.0001 > ycoord[i] > 0.0001):
-                board_x.append(xcoord[i])
-                board_y.append(ycoord[i])
-                board_bool.append(True)
-            elif i != len(xcoord):
-                board_x.append(xcoord[i+1])
-                board_y.append(ycoord[i+1])
-                board_bool.append(False)
-            else:
-                board_x.append(xcoord[i])
-                board_y.append(ycoord[i])
-                board_bool.append(False)
+
+        def add(point, onboard):
+            board_x.append(float(point[0]))
+            board_y.append(float(point[1]))
+            board_bool.append(onboard)
+
+        for i, stroke in enumerate(strokes):
+            if i > 0:
+                add(strokes[i - 1][-1], False)
+                add(stroke[0], False)
+            for point in stroke:
+                add(point, True)
+        add(strokes[-1][-1], False)
         return board_x, board_y, board_bool
 
+    def order_letters(self, msg):
+        """
+        Choose the drawing order of the strokes and letters in a LetterMsg.
+
+        The strokes of every letter are simplified with the
+        simplify_tolerance parameter and then ordered, after which the
+        letters themselves are ordered on the board using the start and end
+        point of each one. Both ordering steps may reverse what they reorder.
+
+        Args:
+        ----
+        msg (LetterMsg): the letters sent by the hangman node
+
+        Returns
+        -------
+        A list of (mode, position, strokes) tuples in drawing order, with
+        the strokes in tile coordinates.
+
+        """
+        letters = []
+        font_order = []
+        raw_points = 0
+        kept_points = 0
+        for letter, mode, position in zip(msg.letters, msg.mode, msg.positions):
+            origin = self.layout.tile_origin(mode, position)
+            strokes = simplify_strokes(
+                self.alphabet[letter], self.simplify_tolerance)
+            raw_points += sum(len(stroke) for stroke in self.alphabet[letter])
+            kept_points += sum(len(stroke) for stroke in strokes)
+            ordered, _, _ = order_strokes(strokes)
+            letters.append((mode, position, origin, ordered))
+            font_order += [stroke + origin for stroke in strokes]
+
+        # each letter becomes a single segment from its first to last point
+        segments = [np.vstack([strokes[0][0] + origin, strokes[-1][-1] + origin])
+                    for _, _, origin, strokes in letters]
+        _, order, flipped = order_strokes(segments)
+        self.get_logger().info(
+            f"simplified strokes: {raw_points} -> {kept_points} points")
+
+        shapes = []
+        board_order = []
+        for i, flip in zip(order, flipped):
+            mode, position, origin, strokes = letters[i]
+            if flip:
+                strokes = reverse_strokes(strokes)
+            shapes.append((mode, position, strokes))
+            board_order += [stroke + origin for stroke in strokes]
+
+        before = transit_distance(font_order)
+        after = transit_distance(board_order)
+        self.get_logger().info(
+            f"pen-up transit: {before:.3f} m -> {after:.3f} m, "
+            f"saved {before - after:.3f} m")
+        return shapes
+
     # def trajectory_status_callback(self, msg: String):
     #     """Callback for the service to get execute the drawing on the board"""
     #     new_msg = msg
@@ -210,15 +305,19 @@ class Brain(Node):
         self.ocr_pub.publish(False)
 
         self.shape_list = []
-        for i in range(0, len(self.last_message.positions)):
+        for mode, position, strokes in self.order_letters(self.last_message):
+            # nothing to draw, e.g. a space
+            if not strokes:
+                continue
             tile_origin = BoardTiles.Request()
-            tile_origin.mode = self.last_message.mode[i]
-            tile_origin.position = self.last_message.positions[i]
+            tile_origin.mode = mode
+            tile_origin.position = position
 
             # get x, y, onboard values
             tile_origin.x, tile_origin.y, tile_origin.onboard = self.process_letter_points(
-                self.last_message.letters[i])
+                strokes)
             self.shape_list.append(tile_origin)
+        self.shape_poses = []
 
         # switches to calibrate state
         self.state = State.CALIBRATE
@@ -231,12 +330,37 @@ class Brain(Node):
         else:
             self.state = State.WAITING
 
-    async def letter_writer(self, shape: BoardTiles.Request()):
+    def calibration_epoch_callback(self, msg):
+        """Receive the board calibration epoch from the tags node."""
+        self.calibration_epoch = msg.data
+
+    async def fetch_shape_poses(self):
+        """
+        Get the poses of every shape left to write in one service call.
+
+        The poses are only valid for the calibration epoch they were
+        computed in, timer_callback fetches them again when it changes.
+        """
+        request = BoardTilesBatch.Request()
+        request.modes = [shape.mode for shape in self.shape_list]
+        request.positions = [shape.position for shape in self.shape_list]
+        request.lengths = [len(shape.x) for shape in self.shape_list]
+        request.x = [x for shape in self.shape_list for x in shape.x]
+        request.y = [y for shape in self.shape_list for y in shape.y]
+        request.onboard = [on for shape in self.shape_list for on in shape.onboard]
+        epoch = self.calibration_epoch
+        resp = await self.board_service_client.call_async(request)
+
+        self.shape_poses = []
+        self.shape_poses_epoch = epoch
+        start = 0
+        for initial_pose, length in zip(resp.initial_poses, request.lengths):
+            self.shape_poses.append(
+                (initial_pose, resp.pose_list[start:start + length]))
+            start += length
+
+    async def letter_writer(self, shape: BoardTiles.Request(), pose1, pose_list):
         """Function to process the shape into trajectory service calls"""
-        resp = await self.board_service_client.call_async(shape)
-        pose1 = resp.initial_pose
-        pose_list = resp.pose_list
-
         self.get_logger().info(f"Pose List for Dash: {pose1}")
         self.get_logger().info(f"Pose List for Dash: {pose_list}")
 
@@ -264,6 +388,7 @@ class Brain(Node):
         self.get_logger().info(f"all done")
 
         self.shape_list.pop(0)
+        self.shape_poses.pop(0)
 
     async def timer_callback(self):
 
@@ -300,7 +425,15 @@ class Brain(Node):
         elif self.state == State.LETTER:
             if self.shape_list:
                 # moves to the approaching state if there are still things to be written
-                await self.letter_writer(self.shape_list[0])
+                if not self.shape_poses or self.shape_poses_epoch != self.calibration_epoch:
+                    # a new guess, or the board moved since the poses were computed
+                    await self.fetch_shape_poses()
+                if not self.shape_poses:
+                    self.get_logger().error(
+                        f"no poses for the {len(self.shape_list)} shapes left, skipping them")
+                    self.shape_list = []
+                else:
+                    await self.letter_writer(self.shape_list[0], *self.shape_poses[0])
 
                 # self.state = State.WAITING
             else:
@@ -0,0 +1,174 @@
+"""
+Board calibration from a window of april tag detections.
+
+Every detection of a board tag gives one estimate of the panda_link0 ->
+board transform. The estimates are averaged in the Lie algebra of SE(3),
+after dropping the ones whose residual to the first mean is far larger than
+the rest.
+
+The result is stored on disk so that a restart can reuse it once a quick
+look at the board confirms that the board has not moved, and can be kept
+up to date while drawing with BoardTracker.
+"""
+
+import os
+import time
+
+import numpy as np
+
+from drawing.geometry import compose, invert, se3_exp, se3_log, se3_mean
+
+
+def twist_residuals(mean, transforms, rotation_scale):
+    """
+    Distance of every transform from the mean.
+
+    The rotation part of the twist is converted to metres with
+    rotation_scale, so that a single number covers both errors.
+    """
+    twists = se3_log(compose(invert(mean), transforms))
+    twists[:, :3] *= rotation_scale
+    return twists, np.linalg.norm(twists, axis=1)
+
+
+def board_estimate(transforms, rotation_scale=0.1, outlier_scale=3.0,
+                   min_threshold=0.002):
+    """
+    Robust weighted mean of board transform estimates.
+
+    Args:
+    ----
+    transforms (np.array): (N, 4, 4) panda_link0 -> board estimates
+    rotation_scale (float): metres of residual per radian of rotation
+    outlier_scale (float): estimates further than this many robust
+        standard deviations from the first mean are rejected
+    min_threshold (float): never reject estimates closer than this (m)
+
+    Returns
+    -------
+    board, variance, inliers, residuals: the 4x4 mean transform, the (6,)
+    weighted variance of the inlier twists around it (rotation in rad^2,
+    translation in m^2), the inlier mask and every residual (m)
+
+    """
+    transforms = np.asarray(transforms, dtype=np.float64)
+    mean = se3_mean(transforms)
+    _, residuals = twist_residuals(mean, transforms, rotation_scale)
+
+    sigma = 1.4826 * np.median(residuals)
+    threshold = max(outlier_scale * sigma, min_threshold)
+    inliers = residuals <= threshold
+
+    # Cauchy weights: close estimates count fully, far ones fade out
+    weights = 1.0 / (1.0 + (residuals[inliers] / threshold) ** 2)
+    board = se3_mean(transforms[inliers], weights, initial=mean)
+
+    twists, residuals = twist_residuals(board, transforms, rotation_scale)
+    twists = twists[inliers]
+    twists[:, :3] /= rotation_scale
+    variance = weights @ twists ** 2 / np.sum(weights)
+    return board, variance, inliers, residuals
+
+
+def default_calibration_file():
+    """Return the default location of the stored board calibration."""
+    ros_home = os.environ.get('ROS_HOME', os.path.expanduser('~/.ros'))
+    return os.path.join(ros_home, 'board_calibration.npz')
+
+
+def save_calibration(path, board, variance, max_residual, samples):
+    """
+    Store a board calibration together with its quality metrics.
+
+    Args:
+    ----
+    path (string): the .npz file to write
+    board (np.array): 4x4 panda_link0 -> board transform
+    variance (np.array): (6,) variance reported by board_estimate
+    max_residual (float): largest inlier residual, in metres
+    samples (int): number of detections the calibration used
+
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        np.savez(file, board=board, stamp=time.time(), variance=variance,
+                 max_residual=max_residual, samples=samples)
+    os.replace(tmp_path, path)
+
+
+def load_calibration(path):
+    """
+    Load a calibration written by save_calibration.
+
+    Returns
+    -------
+    A dictionary with the same fields as save_calibration, or None if
+    there is no readable calibration at path.
+
+    """
+    try:
+        with np.load(path) as data:
+            calibration = {key: data[key] for key in data.files}
+    except (OSError, ValueError):
+        return None
+    if calibration.get('board', np.empty(0)).shape != (4, 4):
+        return None
+    return calibration
+
+
+class BoardTracker:
+    """
+    Kalman filter on the board pose for tracking it between calibrations.
+
+    The state is the panda_link0 -> board transform and the covariance of
+    a small twist error around it, rotation first like se3_log. The board
+    is modelled as a random walk, and every tag detection is a direct but
+    noisy measurement of the whole pose. A detection whose Mahalanobis
+    distance fails the gate is dropped, so a misread tag cannot drag the
+    board away. Every step is a fixed size 6x6 computation.
+    """
+
+    # 99% of a chi-square distribution with 6 degrees of freedom
+    GATE = 16.81
+
+    def __init__(self, board, variance, process_noise, measurement_noise):
+        """
+        Start tracking from a calibration.
+
+        Args:
+        ----
+        board (np.array): 4x4 panda_link0 -> board transform
+        variance (np.array): (6,) variance of the calibration
+        process_noise (np.array): (6,) variance the board drifts by per
+            second
+        measurement_noise (np.array): (6,) variance of one detection
+
+        """
+        self.board = np.asarray(board, dtype=np.float64)
+        self.covariance = np.diag(np.asarray(variance, dtype=np.float64))
+        self.process_noise = np.diag(process_noise)
+        self.measurement_noise = np.diag(measurement_noise)
+
+    def predict(self, dt):
+        """Grow the uncertainty by dt seconds of drift."""
+        self.covariance = self.covariance + self.process_noise * dt
+
+    def update(self, measurement):
+        """
+        Fuse one panda_link0 -> board estimate from a detection.
+
+        Returns
+        -------
+        True if the detection passed the gate and was used.
+
+        """
+        innovation = se3_log(invert(self.board) @ measurement)
+        S = self.covariance + self.measurement_noise
+        S_inv = np.linalg.inv(S)
+        if innovation @ S_inv @ innovation > self.GATE:
+            return False
+        K = self.covariance @ S_inv
+        self.board = self.board @ se3_exp(K @ innovation)
+        self.covariance = (np.eye(6) - K) @ self.covariance
+        return True
@@ -5,6 +5,10 @@ from rclpy.task import Future
 from geometry_msgs.msg import Point, Quaternion, Pose
 
 from path_planner.path_plan_execute import Path_Plan_Execute
+from path_planner.panda_kinematics import FRAMES, arm_positions, link_transforms
+from drawing.geometry import invert
+from drawing.plan_ahead import discard_reason
+from drawing.tf_cache import TransformCache
 
 from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
 from enum import Enum, auto
@@ -21,7 +25,6 @@ from brain_interfaces.srv import MovePose, MoveJointState, Cartesian, ExecuteJoi
 from brain_interfaces.msg import EEForce
 
 import numpy as np
-import transforms3d as tf
 np.set_printoptions(suppress=True)
 
 
@@ -67,6 +70,10 @@ class Drawing(Node):
         self.declare_parameter('robot_name', 'panda')
         self.declare_parameter('group_name', 'panda_manipulator')
         self.declare_parameter('frame_id', 'panda_link0')
+        self.declare_parameter('whole_stroke', True)
+        self.declare_parameter('plan_ahead', True)
+        self.declare_parameter('plan_ahead_tolerance', 0.02)
+        self.declare_parameter('adaptive_profile', True)
 
         # get parameters
         self.use_fake_hardware = self.get_parameter(
@@ -83,6 +90,21 @@ class Drawing(Node):
             'group_name').get_parameter_value().string_value
         self.frame_id = self.get_parameter(
             'frame_id').get_parameter_value().string_value
+        # plan every queued pose of a letter in one compute_cartesian_path
+        # request, instead of one request per pose
+        self.whole_stroke = self.get_parameter(
+            'whole_stroke').get_parameter_value().bool_value
+        # plan the next stroke while the current one executes, from where the
+        # current one ends. The plan is only used if the robot ends up within
+        # plan_ahead_tolerance (rad) of that joint state
+        self.plan_ahead_enabled = self.get_parameter(
+            'plan_ahead').get_parameter_value().bool_value
+        self.plan_ahead_tolerance = self.get_parameter(
+            'plan_ahead_tolerance').get_parameter_value().double_value
+        # pick max_step, which sets how fast a stroke is drawn, from the
+        # curvature of the stroke instead of planning everything with 1 cm
+        self.adaptive_profile = self.get_parameter(
+            'adaptive_profile').get_parameter_value().bool_value
 
         # Initialize variables
         self.joint_names = []
@@ -100,10 +122,11 @@ class Drawing(Node):
 
         self.path_planner = Path_Plan_Execute(self)
 
-        # these are used for computing the current location of the end-effector
-        # using the tf tree.
+        # these are used for looking up the board in the tf tree. The frames
+        # of the arm come from the joint states, see arm_frames
         self.buffer = Buffer()
         self.listener = TransformListener(self.buffer, self)
+        self.tf_cache = TransformCache(self, self.buffer)
 
         ##### create services #####
         # this service is for the brain node to send singular poses for
@@ -182,6 +205,15 @@ class Drawing(Node):
         self.use_force_control = []
         self.replan = False
 
+        # the waypoints of the trajectory being executed, with their
+        # velocities and force control flags, kept in case it is replanned
+        self.stroke_waypoints = []
+        self.stroke_velocity = []
+        self.stroke_use_force_control = []
+        self.stroke_replan = False
+        # task planning the next stroke ahead of time, or None
+        self.plan_ahead = None
+
         self.i = 0
 
         self.joint_trajectories = ExecuteJointTrajectories.Request()
@@ -197,40 +229,50 @@ class Drawing(Node):
         self.draw_obs(name="table", pos=table, size=[1.5, 1.0, 3.0])
         self.board_future = rclpy.task.Future()
 
-    def array_to_transform_matrix(self, translation, quaternion):
-        # Normalize the quaternion
-        quaternion /= np.linalg.norm(quaternion)
-        quaternion = [quaternion[3], quaternion[0],
-                      quaternion[1], quaternion[2]]
+    def arm_frames(self):
+        """
+        Pose of every frame of the arm in panda_link0.
+
+        Computed from the current joint state with the Panda kinematics,
+        instead of looking each frame up in the tf tree.
 
-        # Create rotation matrix from quaternion
-        rotation_matrix = tf.quaternions.quat2mat(quaternion)
+        Returns
+        -------
+        An array of transforms indexed by panda_kinematics.FRAMES, or None
+        before the first joint state.
 
-        # Create the transformation matrix
-        transform_matrix = np.eye(4)
-        transform_matrix[:3, :3] = rotation_matrix
-        transform_matrix[:3, 3] = translation
+        """
+        q = arm_positions(self.path_planner.current_joint_state)
+        return None if q is None else link_transforms(q)
 
-        return transform_matrix, rotation_matrix
+    def tcp_position(self):
+        """Position of panda_hand_tcp in panda_link0."""
+        frames = self.arm_frames()
+        if frames is None:
+            position, _ = self.get_transform('panda_link0', 'panda_hand_tcp')
+            return position
+        return frames[FRAMES['panda_hand_tcp'], :3, 3].tolist()
 
     def calc_joint_torque_offset(self):
 
-        pw6, quaternion_w6 = self.get_transform(
-            'panda_link0', 'panda_link6')
+        frames = self.arm_frames()
+        if frames is None:
+            return 0.0
 
-        Tw6, Rw6 = self.array_to_transform_matrix(pw6, quaternion_w6)
+        Tw6 = frames[FRAMES['panda_link6']]
+        Rw6 = Tw6[:3, :3]
 
-        p6f, quaternion_6f = self.get_transform('panda_link6', 'panda_hand')
+        # joint 7 sits between link6 and the hand
+        T6f = invert(Tw6) @ frames[FRAMES['panda_hand']]
+        p6f = T6f[:3, 3]
+        R6f = T6f[:3, :3]
 
         # self.get_logger().info(f"p6f: {p6f}")
-        # self.get_logger().info(f"quaternioon_6f: {quaternion_6f}")
-
-        T6f, R6f = self.array_to_transform_matrix(p6f, quaternion_6f)
 
         # self.get_logger().info(f"T6f: {T6f}")
 
         Fw = np.array([0, 0, -self.gripper_mass * self.g])
-        F6 = np.linalg.inv(Rw6) @ Fw
+        F6 = Rw6.T @ Fw
         M6 = F6 * (p6f + R6f @ self.pc)
         # M6 = np.array([F6[0] * p6f[2]])CALIBRATE
 
@@ -248,15 +290,13 @@ class Drawing(Node):
 
     def calc_ee_force(self, effort_joint6):
 
-        pe6, quaternion_e6 = self.get_transform(
-            'panda_hand_tcp', 'panda_link6')
-
-        Te6, Re6 = self.array_to_transform_matrix(pe6, quaternion_e6)
-
-        p6e, quaternion_6e = self.get_transform(
-            'panda_link6', 'panda_hand_tcp')
+        frames = self.arm_frames()
+        if frames is None:
+            return np.zeros(3)
 
-        T6e, R6e = self.array_to_transform_matrix(p6e, quaternion_6e)
+        T6e = invert(frames[FRAMES['panda_link6']]) @ frames[FRAMES['panda_hand_tcp']]
+        p6e = T6e[:3, 3]
+        Re6 = T6e[:3, :3].T
 
         M6 = np.array([0, effort_joint6, 0])
         F6 = np.divide(M6, p6e,
@@ -344,6 +384,21 @@ class Drawing(Node):
 
         self.get_logger().info(f"request.pose: {request.pose}")
 
+        # the next stroke was planned from where this one was going to end
+        self.plan_ahead = None
+
+        # the rest of the stroke was planned from the pose that is being
+        # moved, queue it again to be planned once the new pose is reached
+        remaining = slice(request.segment + 1, len(self.stroke_waypoints))
+        self.cartesian_mp_queue[0:0] = self.stroke_waypoints[remaining]
+        self.cartesian_velocity[0:0] = self.stroke_velocity[remaining]
+        self.use_force_control[0:0] = self.stroke_use_force_control[remaining]
+        if self.stroke_waypoints[remaining]:
+            self.replan = self.stroke_replan
+        self.stroke_waypoints = []
+        self.stroke_velocity = []
+        self.stroke_use_force_control = []
+
         self.cartesian_mp_queue.insert(0, request.pose)
         self.cartesian_velocity.insert(0, 0.015)
 
@@ -410,7 +465,7 @@ class Drawing(Node):
         # Add the box to the planning scene using the add_box method
         self.path_planner.add_box(box_id, frame_id, dimensions, pose)
 
-    def get_transform(self, parent_frame, child_frame):
+    def get_transform(self, parent_frame, child_frame, key=None):
         """
         Try catch block for listening to transforms between parent and child frame.
 
@@ -418,6 +473,7 @@ class Drawing(Node):
         ----
         parent_frame (string): name of parent frame
         child_frame (string): name of child frame
+        key (hashable): reuse the cached transform while this is unchanged
 
         Returns
         -------
@@ -425,9 +481,7 @@ class Drawing(Node):
 
         """
         try:
-            trans = self.buffer.lookup_transform(
-                parent_frame, child_frame, rclpy.time.Time()
-            )
+            trans = self.tf_cache.lookup(parent_frame, child_frame, key)
             transl = trans.transform.translation
             rot = trans.transform.rotation
             brick_to_platform = np.array([transl.x, transl.y, transl.z])
@@ -449,8 +503,105 @@ class Drawing(Node):
             self.get_logger().info(f"Extrapolation exception: {e}")
             return [0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0]
 
+    def next_stroke(self, start):
+        """
+        Choose the queued poses to plan in one request, and how to plan them.
+
+        Args:
+        ----
+        start (list): xyz of panda_hand_tcp where the stroke starts
+
+        Returns
+        -------
+        The number of poses, velocity and max_step, None for the planner default.
+
+        """
+        velocity = self.cartesian_velocity[0]
+        count = 1
+        while count < len(self.cartesian_mp_queue) and \
+                self.cartesian_velocity[count] == velocity:
+            count += 1
+        if not self.adaptive_profile:
+            return (count if self.whole_stroke else 1), velocity, None
+
+        # poses planned with the same step stay in one request
+        profile = self.path_planner.stroke_profile.profile(
+            start, self.cartesian_mp_queue[:count], self.use_force_control[:count])
+        count = 1
+        while self.whole_stroke and count < len(profile) and profile[count] == profile[0]:
+            count += 1
+        return count, velocity, profile[0]
+
+    async def plan_next_stroke(self, start_state, start):
+        """
+        Plan the stroke at the front of the queue from a predicted start.
+
+        Args:
+        ----
+        start_state (JointState): joint state the robot is expected to be in
+        start (list): xyz of panda_hand_tcp in that state
+
+        Returns
+        -------
+        The waypoints, velocity, max_step, start state, start and
+        GetCartesianPath response.
+
+        """
+        count, velocity, max_step = self.next_stroke(start)
+        waypoints = self.cartesian_mp_queue[:count]
+        result = await self.path_planner.cartesian_policy.plan(
+            waypoints, velocity, start_state, max_step)
+        if count > 1 and result.fraction < 1.0:
+            waypoints = waypoints[:1]
+            result = await self.path_planner.cartesian_policy.plan(
+                waypoints, velocity, start_state, max_step)
+        return waypoints, velocity, max_step, start_state, start, result
+
+    async def take_plan_ahead(self):
+        """
+        Use the stroke planned ahead of time, if it is still valid.
+
+        The plan is discarded if the queue changed since it was made, or if
+        the robot did not end up where the plan starts.
+
+        Returns
+        -------
+        The waypoints, start and max_step of the stroke, or None if it has to
+        be planned.
+
+        """
+        if self.plan_ahead is None:
+            return None
+        task, self.plan_ahead = self.plan_ahead, None
+        waypoints, velocity, max_step, start_state, start, result = await task
+
+        reason = discard_reason(
+            waypoints, velocity, self.cartesian_mp_queue, self.cartesian_velocity,
+            self.path_planner.joint_distance(start_state), self.plan_ahead_tolerance)
+        if reason is not None:
+            self.get_logger().info(reason)
+            return None
+
+        self.get_logger().info(f"using the stroke of {len(waypoints)} poses planned ahead")
+        self.path_planner.use_cartesian_path(result)
+        return waypoints, start, max_step
+
     def execute_done_callback(self, future):
 
+        # force control stopped the stroke without replanning, the waypoints
+        # after the one it stopped in were not drawn, queue them again
+        stopped = future.result().stopped_segment
+        remaining = slice(stopped + 1, len(self.stroke_waypoints))
+        if stopped >= 0 and self.stroke_waypoints[remaining]:
+            self.get_logger().info(
+                f"stroke stopped in segment {stopped}, queueing the rest again")
+            self.plan_ahead = None
+            self.cartesian_mp_queue[0:0] = self.stroke_waypoints[remaining]
+            self.cartesian_velocity[0:0] = self.stroke_velocity[remaining]
+            self.use_force_control[0:0] = self.stroke_use_force_control[remaining]
+            self.replan = self.stroke_replan
+            self.stroke_waypoints = []
+
         if not self.cartesian_mp_queue:
             self.get_logger().info("plan has been executed")
             self.plan_future.set_result("done")
@@ -495,6 +646,7 @@ class Drawing(Node):
             self.joint_trajectories = ExecuteJointTrajectories.Request()
             self.joint_trajectories.current_pose = self.moveit_mp_queue[0]
             self.joint_trajectories.use_force_control = self.use_force_control[0]
+            self.stroke_waypoints = []
 
             self.path_planner.plan_path()
 
@@ -515,7 +667,28 @@ class Drawing(Node):
 
             self.get_logger().info(f"velocity: {self.cartesian_velocity[0]}")
 
-            await self.path_planner.plan_cartesian_path([self.cartesian_mp_queue[0]], self.cartesian_velocity[0])
+            planned = await self.take_plan_ahead()
+            if planned is not None:
+                waypoints, start, max_step = planned
+                count = len(waypoints)
+            else:
+                # plan the whole stroke at once, and only split it into single
+                # poses if the planner can't get all the way through
+                start = self.tcp_position()
+                count, velocity, max_step = self.next_stroke(start)
+                self.get_logger().info(
+                    f"planning {count} poses, velocity: {velocity}, max_step: {max_step}")
+                await self.path_planner.plan_cartesian_path(
+                    self.cartesian_mp_queue[:count], velocity, max_step)
+                if count > 1 and self.path_planner.cartesian_trajectory_fraction < 1.0:
+                    self.get_logger().info(
+                        f"stroke of {count} poses only planned to "
+                        f"{self.path_planner.cartesian_trajectory_fraction * 100}%, "
+                        "planning one pose at a time")
+                    count = 1
+                    await self.path_planner.plan_cartesian_path(
+                        [self.cartesian_mp_queue[0]], velocity, max_step)
+
             self.joint_trajectories = ExecuteJointTrajectories.Request()
             # queue the remaining poses, so that if force threshold is exceeded,
             # send_trajectories can initiate a replan request directly with the
@@ -524,15 +697,26 @@ class Drawing(Node):
             self.joint_trajectories.current_pose = self.cartesian_mp_queue[0]
             self.joint_trajectories.replan = self.replan
             self.joint_trajectories.use_force_control = self.use_force_control[0]
+            if count > 1:
+                self.joint_trajectories.waypoints = self.cartesian_mp_queue[:count]
+                self.joint_trajectories.waypoint_use_force_control = \
+                    self.use_force_control[:count]
+                self.joint_trajectories.segment_index = self.path_planner.waypoint_segments(
+                    start, self.cartesian_mp_queue[:count], max_step)
             self.get_logger().info(
                 f"cartesian queue: {self.cartesian_mp_queue}")
 
-            if len(self.cartesian_mp_queue) == 1:
+            self.stroke_waypoints = self.cartesian_mp_queue[:count]
+            self.stroke_velocity = self.cartesian_velocity[:count]
+            self.stroke_use_force_control = list(self.use_force_control[:count])
+            self.stroke_replan = self.replan
+
+            if len(self.cartesian_mp_queue) == count:
                 self.replan = False
 
-            self.cartesian_mp_queue.pop(0)
-            self.cartesian_velocity.pop(0)
-            self.use_force_control.pop(0)
+            del self.cartesian_mp_queue[:count]
+            del self.cartesian_velocity[:count]
+            del self.use_force_control[:count]
 
             self.state = State.EXECUTING
 
@@ -548,6 +732,12 @@ class Drawing(Node):
                 self.joint_trajectories)
             self.execute_future.add_done_callback(self.execute_done_callback)
 
+            # while this stroke is drawn, plan the next one from where it ends
+            if self.plan_ahead_enabled and self.stroke_waypoints and self.cartesian_mp_queue:
+                end = self.stroke_waypoints[-1].position
+                self.plan_ahead = self.executor.create_task(self.plan_next_stroke(
+                    self.path_planner.final_state(), [end.x, end.y, end.z]))
+
             self.state = State.WAITING
 
         elif self.state == State.WAITING:
@@ -581,7 +771,9 @@ class Drawing(Node):
                 self.state = State.EXECUTING
                 self.path_planner.movegroup_status = GoalStatus.STATUS_UNKNOWN
         elif self.state == State.MAKE_BOARD:
-            ansT, ansR = self.get_transform("panda_link0", "board")
+            # the board frame only moves when the calibration epoch changes
+            ansT, ansR = self.get_transform(
+                "panda_link0", "board", self.path_planner.calibration_epoch)
             board_pose = Pose()
             board_pose.position = Point(x=ansT[0], y=ansT[1], z=ansT[2])
             board_pose.orientation = Quaternion(
@@ -0,0 +1,274 @@
+"""
+Batched rigid body geometry for the drawing nodes.
+
+Every function takes arrays with any number of leading batch dimensions, so
+a single 4x4 matrix and an (N, 4, 4) stack go through the same code.
+Quaternions are stored in ROS order, (x, y, z, w).
+"""
+
+import numpy as np
+
+
+def rotations_to_quaternions(rotations):
+    """
+    Convert rotation matrices to unit quaternions.
+
+    Uses Shepperd's method: for every matrix, the largest of the trace and
+    the diagonal elements picks the numerically stable formula. The sign is
+    chosen so that w is never negative.
+
+    Args:
+    ----
+    rotations (np.array): (..., 3, 3) rotation matrices
+
+    Returns
+    -------
+    quaternions: (..., 4) quaternions in (x, y, z, w) order
+
+    """
+    rotations = np.asarray(rotations, dtype=np.float64)
+    batch = rotations.shape[:-2]
+    r = rotations.reshape(-1, 3, 3)
+    m00, m01, m02 = r[:, 0, 0], r[:, 0, 1], r[:, 0, 2]
+    m10, m11, m12 = r[:, 1, 0], r[:, 1, 1], r[:, 1, 2]
+    m20, m21, m22 = r[:, 2, 0], r[:, 2, 1], r[:, 2, 2]
+
+    trace = m00 + m11 + m22
+    case = np.argmax(np.stack([trace, m00, m11, m22]), axis=0)
+    q = np.empty((len(r), 4))
+
+    # each row below is (x, y, z, w) for one case, before scaling by 1 / s
+    for k, diagonal, (x, y, z, w) in (
+            (0, trace, (m21 - m12, m02 - m20, m10 - m01, None)),
+            (1, m00 - m11 - m22, (None, m01 + m10, m02 + m20, m21 - m12)),
+            (2, m11 - m00 - m22, (m01 + m10, None, m12 + m21, m02 - m20)),
+            (3, m22 - m00 - m11, (m02 + m20, m12 + m21, None, m10 - m01))):
+        mask = case == k
+        if not mask.any():
+            continue
+        s = 2.0 * np.sqrt(np.maximum(1.0 + diagonal[mask], 0.0))
+        for column, value in enumerate((x, y, z, w)):
+            q[mask, column] = s / 4.0 if value is None else value[mask] / s
+
+    q[q[:, 3] < 0] *= -1.0
+    return q.reshape(batch + (4,))
+
+
+def quaternions_to_rotations(quaternions):
+    """
+    Convert quaternions to rotation matrices.
+
+    The quaternions are normalised on a copy, the caller's array is left
+    untouched.
+
+    Args:
+    ----
+    quaternions (np.array): (..., 4) quaternions in (x, y, z, w) order
+
+    Returns
+    -------
+    rotations: (..., 3, 3) rotation matrices
+
+    """
+    q = np.array(quaternions, dtype=np.float64)
+    q /= np.linalg.norm(q, axis=-1, keepdims=True)
+    x, y, z, w = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+        np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+        np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1)],
+        axis=-2)
+
+
+def transforms_from_poses(translations, quaternions):
+    """
+    Build homogeneous transforms from translations and quaternions.
+
+    Args:
+    ----
+    translations (np.array): (..., 3) translations
+    quaternions (np.array): (..., 4) quaternions in (x, y, z, w) order
+
+    Returns
+    -------
+    transforms: (..., 4, 4) homogeneous transforms
+
+    """
+    rotations = quaternions_to_rotations(quaternions)
+    transforms = np.zeros(rotations.shape[:-2] + (4, 4))
+    transforms[..., :3, :3] = rotations
+    transforms[..., :3, 3] = translations
+    transforms[..., 3, 3] = 1.0
+    return transforms
+
+
+def transforms_from_points(rotation, points):
+    """
+    Stack homogeneous transforms that share a rotation.
+
+    Args:
+    ----
+    rotation (np.array): (3, 3) rotation shared by every transform
+    points (np.array): (N, 3) translations
+
+    Returns
+    -------
+    transforms: (N, 4, 4) homogeneous transforms
+
+    """
+    points = np.asarray(points, dtype=np.float64)
+    transforms = np.zeros((len(points), 4, 4))
+    transforms[:, :3, :3] = rotation
+    transforms[:, :3, 3] = points
+    transforms[:, 3, 3] = 1.0
+    return transforms
+
+
+def compose(a, b):
+    """Multiply batches of homogeneous transforms, a @ b."""
+    return np.einsum('...ij,...jk->...ik', a, b)
+
+
+def hat(w):
+    """Skew symmetric matrices of (..., 3) vectors."""
+    w = np.asarray(w, dtype=np.float64)
+    zero = np.zeros(w.shape[:-1])
+    return np.stack([
+        np.stack([zero, -w[..., 2], w[..., 1]], axis=-1),
+        np.stack([w[..., 2], zero, -w[..., 0]], axis=-1),
+        np.stack([-w[..., 1], w[..., 0], zero], axis=-1)], axis=-2)
+
+
+def invert(transforms):
+    """Invert homogeneous transforms without a general matrix inverse."""
+    transforms = np.asarray(transforms, dtype=np.float64)
+    rotation_t = np.swapaxes(transforms[..., :3, :3], -1, -2)
+    inverse = np.zeros_like(transforms)
+    inverse[..., :3, :3] = rotation_t
+    inverse[..., :3, 3] = -np.einsum('...ij,...j->...i',
+                                     rotation_t, transforms[..., :3, 3])
+    inverse[..., 3, 3] = 1.0
+    return inverse
+
+
+def rotation_coefficients(theta):
+    """
+    Coefficients of the SO(3)/SE(3) exponential series.
+
+    Returns sin(t)/t, (1 - cos(t))/t^2 and (t - sin(t))/t^3, switching to
+    their Taylor expansions near zero.
+    """
+    small = theta < 1e-4
+    t = np.where(small, 1.0, theta)
+    t2 = theta * theta
+    a = np.where(small, 1.0 - t2 / 6.0, np.sin(t) / t)
+    b = np.where(small, 0.5 - t2 / 24.0, (1.0 - np.cos(t)) / (t * t))
+    c = np.where(small, 1.0 / 6.0 - t2 / 120.0, (t - np.sin(t)) / (t * t * t))
+    return a, b, c
+
+
+def so3_exp(w):
+    """Rotation matrices from (..., 3) rotation vectors."""
+    w = np.asarray(w, dtype=np.float64)
+    a, b, _ = rotation_coefficients(np.linalg.norm(w, axis=-1))
+    k = hat(w)
+    return (np.eye(3) + a[..., None, None] * k
+            + b[..., None, None] * (k @ k))
+
+
+def so3_log(rotations):
+    """Rotation vectors of (..., 3, 3) rotation matrices."""
+    rotations = np.asarray(rotations, dtype=np.float64)
+    trace = np.trace(rotations, axis1=-2, axis2=-1)
+    theta = np.arccos(np.clip((trace - 1.0) / 2.0, -1.0, 1.0))
+    vee = np.stack([rotations[..., 2, 1] - rotations[..., 1, 2],
+                    rotations[..., 0, 2] - rotations[..., 2, 0],
+                    rotations[..., 1, 0] - rotations[..., 0, 1]], axis=-1)
+    a, _, _ = rotation_coefficients(theta)
+    w = vee / (2.0 * np.maximum(a, 1e-12))[..., None]
+
+    # near pi the vee part vanishes, read the axis off the symmetric part
+    # instead, which is cos(t) I + (1 - cos(t)) a a^T
+    near_pi = theta > np.pi - 1e-3
+    if np.any(near_pi):
+        cos = np.cos(theta[near_pi])[:, None, None]
+        symmetric = (rotations[near_pi] + np.swapaxes(rotations[near_pi], -1, -2)) / 2.0
+        b = (symmetric - cos * np.eye(3)) / (1.0 - cos)
+        diagonal = np.diagonal(b, axis1=-2, axis2=-1)
+        k = np.argmax(diagonal, axis=-1)
+        rows = np.arange(len(b))
+        axis = b[rows, :, k] / np.sqrt(np.maximum(diagonal[rows, k], 1e-12))[:, None]
+        sign = np.where(np.sum(axis * vee[near_pi], axis=-1) < 0, -1.0, 1.0)
+        w[near_pi] = axis * (sign * theta[near_pi])[:, None]
+    return w
+
+
+def se3_exp(twists):
+    """
+    Homogeneous transforms from (..., 6) twists.
+
+    Twists are ordered (wx, wy, wz, vx, vy, vz), the same as the
+    exponential coordinates used by modern_robotics.
+    """
+    twists = np.asarray(twists, dtype=np.float64)
+    w, v = twists[..., :3], twists[..., 3:]
+    a, b, c = rotation_coefficients(np.linalg.norm(w, axis=-1))
+    k = hat(w)
+    k2 = k @ k
+    rotation = np.eye(3) + a[..., None, None] * k + b[..., None, None] * k2
+    jacobian = np.eye(3) + b[..., None, None] * k + c[..., None, None] * k2
+    transforms = np.zeros(twists.shape[:-1] + (4, 4))
+    transforms[..., :3, :3] = rotation
+    transforms[..., :3, 3] = np.einsum('...ij,...j->...i', jacobian, v)
+    transforms[..., 3, 3] = 1.0
+    return transforms
+
+
+def se3_log(transforms):
+    """(..., 6) twists of homogeneous transforms, the inverse of se3_exp."""
+    transforms = np.asarray(transforms, dtype=np.float64)
+    w = so3_log(transforms[..., :3, :3])
+    theta = np.linalg.norm(w, axis=-1)
+    a, b, _ = rotation_coefficients(theta)
+    small = theta < 1e-4
+    t2 = np.where(small, 1.0, theta * theta)
+    d = np.where(small, 1.0 / 12.0 + theta * theta / 720.0,
+                 (1.0 - a / (2.0 * np.maximum(b, 1e-12))) / t2)
+    k = hat(w)
+    inverse_jacobian = np.eye(3) - 0.5 * k + d[..., None, None] * (k @ k)
+    v = np.einsum('...ij,...j->...i', inverse_jacobian, transforms[..., :3, 3])
+    return np.concatenate([w, v], axis=-1)
+
+
+def se3_mean(transforms, weights=None, initial=None, iterations=20):
+    """
+    Weighted mean of transforms in the Lie algebra (Karcher mean).
+
+    Starting from an initial guess, every iteration moves the estimate by
+    the weighted average of the twists from the estimate to each transform,
+    until the update is negligible.
+
+    Args:
+    ----
+    transforms (np.array): (N, 4, 4) homogeneous transforms
+    weights (np.array): optional (N,) non-negative weights
+    initial (np.array): optional 4x4 starting estimate
+    iterations (int): the most updates to run
+
+    Returns
+    -------
+    mean: the 4x4 mean transform
+
+    """
+    transforms = np.asarray(transforms, dtype=np.float64)
+    if weights is None:
+        weights = np.ones(len(transforms))
+    weights = np.asarray(weights, dtype=np.float64) / np.sum(weights)
+    mean = transforms[0] if initial is None else np.asarray(initial)
+    for _ in range(iterations):
+        twists = se3_log(compose(invert(mean), transforms))
+        step = weights @ twists
+        mean = mean @ se3_exp(step)
+        if np.linalg.norm(step) < 1e-10:
+            break
+    return mean
@@ -0,0 +1,304 @@
+"""
+Precompiled glyph store for the nodes that draw letters.
+
+Building the alphabet with matplotlib's TextToPath is slow, and the first
+FontProperties lookup on a fresh machine triggers a full font cache scan.
+The GlyphStore keeps every glyph it has generated in a single compressed
+.npz file, keyed by font family, scale factor and board scale, so matplotlib
+is only imported when a glyph is missing from the file.
+
+A glyph is a list of strokes, each one a polyline the pen draws without
+lifting. On disk the strokes of a glyph are stored as one (N, 2) array with
+a row of NaNs between consecutive strokes.
+"""
+
+import os
+from math import comb
+import tempfile
+
+import numpy as np
+
+# matplotlib path codes, duplicated here so matplotlib stays optional
+STOP = 0
+MOVETO = 1
+LINETO = 2
+CURVE3 = 3
+CURVE4 = 4
+CLOSEPOLY = 79
+
+# bump this whenever the way glyphs are built changes, so stale caches miss
+GLYPH_FORMAT = 3
+
+
+def default_glyph_cache():
+    """Return the default location of the glyph cache file."""
+    ros_home = os.environ.get('ROS_HOME', os.path.expanduser('~/.ros'))
+    return os.path.join(ros_home, 'drawing_glyphs.npz')
+
+
+def glyph_key(family, scale_factor, board_scale, tolerance, letter):
+    """
+    Build the archive key for one glyph.
+
+    The letter is stored by its code point so characters like '/' do not end
+    up as directories inside the zip archive.
+    """
+    return (f'v{GLYPH_FORMAT}|{family}|{scale_factor:.9g}|{board_scale:.9g}'
+            f'|{tolerance:.9g}|{ord(letter)}')
+
+
+def text_to_path(family, letter):
+    """
+    Get the outline of a letter from matplotlib.
+
+    matplotlib is imported here rather than at module level so that nodes
+    which find every glyph in the cache never load it.
+
+    Args:
+    ----
+    family (string): font family to render the letter with
+    letter (string): the character to render
+
+    Returns
+    -------
+    verts, codes: the vertices and path codes of the letter outline
+
+    """
+    from matplotlib.font_manager import FontProperties
+    from matplotlib.textpath import TextToPath
+
+    fp = FontProperties(family=family, style='normal')
+    return TextToPath().get_text_path(fp, letter)
+
+
+def bezier_points(ctrl, tolerance):
+    """
+    Flatten one quadratic or cubic Bezier segment.
+
+    The number of chords is picked from the bound on the second derivative
+    of the curve, so the distance between the curve and the returned
+    polyline never exceeds the tolerance. Flat curves come back as a single
+    chord, tight ones get as many chords as they need.
+
+    Args:
+    ----
+    ctrl (np.array): (3, 2) or (4, 2) control points, starting at the
+        current pen position
+    tolerance (float): maximum chord error, in the units of ctrl
+
+    Returns
+    -------
+    points: the flattened points, excluding the start point
+
+    """
+    degree = len(ctrl) - 1
+    second = np.linalg.norm(np.diff(ctrl, n=2, axis=0), axis=1).max()
+    bound = degree * (degree - 1) * second / 8.0
+    n = max(1, int(np.ceil(np.sqrt(bound / tolerance))))
+
+    t = np.linspace(0.0, 1.0, n + 1)[1:, None]
+    basis = np.hstack([comb(degree, i) * t**i * (1.0 - t)**(degree - i)
+                       for i in range(degree + 1)])
+    return basis @ ctrl
+
+
+def flatten_path(verts, codes, tolerance):
+    """
+    Split a path into flattened subpaths using its path codes.
+
+    Straight segments keep only their end points, and curved segments are
+    flattened with bezier_points. The dummy vertex that comes with CLOSEPOLY
+    is dropped and the subpath is closed back onto its first point instead.
+
+    Args:
+    ----
+    verts (np.array): (N, 2) path vertices
+    codes (np.array): (N,) matplotlib path codes
+    tolerance (float): maximum chord error, in the units of verts
+
+    Returns
+    -------
+    subpaths: a list of (M, 2) arrays, one per MOVETO
+
+    """
+    verts = np.asarray(verts, dtype=np.float64)
+    subpaths = []
+    current = []
+
+    def finish():
+        if current:
+            points = np.vstack(current)
+            if len(points) > 1:
+                subpaths.append(points)
+        current.clear()
+
+    i = 0
+    while i < len(codes):
+        code = codes[i]
+        if code == MOVETO:
+            finish()
+            current.append(verts[i:i + 1])
+            i += 1
+        elif code == LINETO:
+            current.append(verts[i:i + 1])
+            i += 1
+        elif code in (CURVE3, CURVE4):
+            step = code - 1
+            ctrl = np.vstack([current[-1][-1:], verts[i:i + step]])
+            current.append(bezier_points(ctrl, tolerance))
+            i += step
+        elif code == CLOSEPOLY:
+            if current:
+                start, end = current[0][0], current[-1][-1]
+                if not np.allclose(start, end):
+                    current.append(start[None, :])
+            finish()
+            i += 1
+        else:  # STOP
+            break
+    finish()
+    return subpaths
+
+
+def join_strokes(strokes):
+    """Pack a list of (M, 2) strokes into one NaN separated array."""
+    gap = np.full((1, 2), np.nan)
+    rows = []
+    for stroke in strokes:
+        if rows:
+            rows.append(gap)
+        rows.append(np.asarray(stroke, dtype=np.float64))
+    if not rows:
+        return np.empty((0, 2))
+    return np.vstack(rows)
+
+
+def split_strokes(points):
+    """Unpack a NaN separated array back into a list of (M, 2) strokes."""
+    points = np.asarray(points, dtype=np.float64)
+    gaps = np.flatnonzero(np.isnan(points[:, 0]))
+    strokes = np.split(points, gaps)
+    # every stroke after the first starts with its NaN separator row
+    return [stroke[1:] if i else stroke for i, stroke in enumerate(strokes)
+            if len(stroke) > (1 if i else 0)]
+
+
+def build_glyph(family, scale_factor, board_scale, tolerance, letter):
+    """
+    Turn a letter outline into NaN separated strokes of scaled board points.
+
+    Every subpath of the outline becomes its own stroke, so the pen is only
+    lifted where the font itself moves to a new contour. The tolerance is
+    given in metres on the board, so it is converted to font units before the
+    outline is flattened.
+    """
+    scale = scale_factor * board_scale
+    verts, codes = text_to_path(family, letter)
+    subpaths = flatten_path(verts, codes, tolerance / scale)
+    points = join_strokes([subpath * scale for subpath in subpaths])
+    return points.astype(np.float32)
+
+
+class GlyphStore:
+    """
+    Lazily loaded on-disk cache of glyph strokes.
+
+    The archive is only opened on the first lookup, and individual glyphs are
+    read from it on demand. Glyphs that miss are generated with TextToPath and
+    written back the next time save() is called.
+    """
+
+    def __init__(self, path=None):
+        """
+        Create a store backed by an archive.
+
+        Args:
+        ----
+        path (string): the .npz archive, the installed glyph cache if None
+
+        """
+        self.path = path or default_glyph_cache()
+        self.archive = None
+        self.loaded = False
+        self.new_glyphs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def open(self):
+        """Open the archive the first time it is needed."""
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            self.archive = np.load(self.path)
+        except (OSError, ValueError):
+            # no cache yet, or a corrupt one that will be rewritten on save
+            self.archive = None
+
+    def strokes(self, family, scale_factor, board_scale, tolerance, letter):
+        """
+        Get the strokes of a letter, generating them on a cache miss.
+
+        Args:
+        ----
+        family (string): font family of the letter
+        scale_factor (float): font units to metres
+        board_scale (float): scale of the letters on the board
+        tolerance (float): maximum chord error on the board, in metres
+        letter (string): the character to look up
+
+        Returns
+        -------
+        strokes: a list of (M, 2) arrays of x, y board coordinates
+
+        """
+        key = glyph_key(family, scale_factor, board_scale, tolerance, letter)
+        if key in self.new_glyphs:
+            self.hits += 1
+            return split_strokes(self.new_glyphs[key])
+
+        self.open()
+        if self.archive is not None and key in self.archive.files:
+            self.hits += 1
+            return split_strokes(self.archive[key])
+
+        self.misses += 1
+        points = build_glyph(
+            family, scale_factor, board_scale, tolerance, letter)
+        self.new_glyphs[key] = points
+        return split_strokes(points)
+
+    def save(self):
+        """Write newly generated glyphs back to the archive file."""
+        if not self.new_glyphs:
+            return
+
+        # reread the archive, another node may have saved since it was opened
+        if self.archive is not None:
+            self.archive.close()
+        self.loaded = False
+        self.open()
+        entries = {}
+        if self.archive is not None:
+            # glyphs built by an older GLYPH_FORMAT are dropped here
+            prefix = f'v{GLYPH_FORMAT}|'
+            entries = {key: self.archive[key] for key in self.archive.files
+                       if key.startswith(prefix)}
+            self.archive.close()
+        entries.update(self.new_glyphs)
+
+        # a temporary file of its own, the Brain and Hangman nodes share the cache
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.savez_compressed(file, **entries)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self.archive = None
+        self.loaded = False
+        self.new_glyphs = {}
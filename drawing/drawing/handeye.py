@@ -0,0 +1,200 @@
+"""
+Hand-eye calibration samples.
+
+A sample pairs the panda_link0 -> panda_hand_tcp transform (A) with the
+camera_link -> tag transform (B) seen at the same moment. Samples are
+appended to a flat binary file of float64 records, one per sample:
+
+    stamp, tag id, A (16 values, row major), B (16 values, row major)
+
+The file can be memory mapped and reshaped straight into (N, 4, 4) arrays,
+so even long recording sessions load without any parsing.
+
+solve_hand_eye turns the samples into the panda_hand_tcp -> camera_link
+transform that the tags node publishes.
+"""
+
+import os
+import time
+
+import numpy as np
+
+from drawing.calibration import twist_residuals
+from drawing.geometry import compose, invert, se3_mean, so3_log
+
+RECORD_SIZE = 34
+
+
+def default_sample_file():
+    """Return the default location of the hand-eye sample log."""
+    ros_home = os.environ.get('ROS_HOME', os.path.expanduser('~/.ros'))
+    return os.path.join(ros_home, 'handeye_samples.bin')
+
+
+def tag_id(frame):
+    """Read the numeric id out of an april tag frame name such as 'tag56'."""
+    digits = ''.join(c for c in frame if c.isdigit())
+    return int(digits) if digits else -1
+
+
+def append_sample(path, stamp, tag, A, B):
+    """
+    Append one sample to the log.
+
+    Args:
+    ----
+    path (string): the sample log
+    stamp (float): time of the sample in seconds
+    tag (int): id of the tag seen by the camera
+    A (np.array): 4x4 panda_link0 -> panda_hand_tcp transform
+    B (np.array): 4x4 camera_link -> tag transform
+
+    """
+    record = np.empty(RECORD_SIZE)
+    record[0] = stamp
+    record[1] = tag
+    record[2:18] = np.ravel(A)
+    record[18:] = np.ravel(B)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'ab') as file:
+        file.write(record.tobytes())
+
+
+def load_samples(path, tag=None):
+    """
+    Load every sample of the log in one batch.
+
+    A record cut short by an interrupted write at the end of the file is
+    ignored.
+
+    Args:
+    ----
+    path (string): the sample log
+    tag (int): only return samples of this tag id
+
+    Returns
+    -------
+    A, B, stamps, tags: (N, 4, 4) robot and camera transforms, and the (N,)
+    stamps and tag ids of the samples
+
+    """
+    count = 0
+    if os.path.exists(path):
+        count = os.path.getsize(path) // (8 * RECORD_SIZE)
+    if count == 0:
+        records = np.empty((0, RECORD_SIZE))
+    else:
+        records = np.memmap(path, dtype=np.float64, mode='r',
+                            shape=(count, RECORD_SIZE))
+    if tag is not None:
+        records = records[records[:, 1] == tag]
+    return (np.array(records[:, 2:18]).reshape(-1, 4, 4),
+            np.array(records[:, 18:]).reshape(-1, 4, 4),
+            np.array(records[:, 0]),
+            np.array(records[:, 1], dtype=int))
+
+
+def relative_motions(A, B, tags, max_pairs=20000):
+    """
+    Pair up samples of the same tag into relative motions.
+
+    While the tag stays put, A_i X B_i is the same for every sample, so
+    every pair (i, j) gives inv(A_j) A_i X = X B_j inv(B_i).
+
+    Returns
+    -------
+    A_rel, B_rel: (M, 4, 4) relative robot and camera motions
+
+    """
+    first, second = [], []
+    for tag in np.unique(tags):
+        index = np.flatnonzero(tags == tag)
+        i, j = np.triu_indices(len(index), k=1)
+        first.append(index[i])
+        second.append(index[j])
+    first = np.concatenate(first) if first else np.empty(0, dtype=int)
+    second = np.concatenate(second) if second else np.empty(0, dtype=int)
+    if len(first) > max_pairs:
+        keep = np.random.default_rng(0).choice(len(first), max_pairs, replace=False)
+        first, second = first[keep], second[keep]
+    A_rel = compose(invert(A[second]), A[first])
+    B_rel = compose(B[second], invert(B[first]))
+    return A_rel, B_rel
+
+
+def solve_hand_eye(A, B, tags=None):
+    """
+    Solve AX = XB for the panda_hand_tcp -> camera_link transform.
+
+    Uses the method of Park and Martin: the rotation is the least squares
+    fit between the rotation vectors of the relative motions (solved with
+    an SVD), and the translation is then a stacked linear least squares
+    problem over all motions.
+
+    Args:
+    ----
+    A (np.array): (N, 4, 4) panda_link0 -> panda_hand_tcp transforms
+    B (np.array): (N, 4, 4) camera_link -> tag transforms
+    tags (np.array): optional (N,) tag id of each sample, only samples of
+        the same tag are paired
+
+    Returns
+    -------
+    X, residuals: the 4x4 hand-eye transform and the (N,) distance (m) of
+    every sample's panda_link0 -> tag estimate from their mean
+
+    """
+    A = np.asarray(A, dtype=np.float64)
+    B = np.asarray(B, dtype=np.float64)
+    if tags is None:
+        tags = np.zeros(len(A), dtype=int)
+    A_rel, B_rel = relative_motions(A, B, np.asarray(tags))
+    if len(A_rel) < 2:
+        raise ValueError('hand-eye calibration needs at least 3 samples of a tag')
+
+    alpha = so3_log(A_rel[:, :3, :3])
+    beta = so3_log(B_rel[:, :3, :3])
+    u, _, vt = np.linalg.svd(beta.T @ alpha)
+    d = np.sign(np.linalg.det(vt.T @ u.T))
+    rotation = vt.T @ np.diag([1.0, 1.0, d]) @ u.T
+
+    # (R_A - I) t_X = R_X t_B - t_A for every motion
+    lhs = (A_rel[:, :3, :3] - np.eye(3)).reshape(-1, 3)
+    rhs = (B_rel[:, :3, 3] @ rotation.T - A_rel[:, :3, 3]).reshape(-1)
+    translation = np.linalg.lstsq(lhs, rhs, rcond=None)[0]
+
+    X = np.eye(4)
+    X[:3, :3] = rotation
+    X[:3, 3] = translation
+
+    residuals = np.empty(len(A))
+    Trt = compose(compose(A, X), B)
+    for tag in np.unique(tags):
+        index = tags == tag
+        _, residuals[index] = twist_residuals(se3_mean(Trt[index]), Trt[index], 0.1)
+    return X, residuals
+
+
+def default_result_file():
+    """Return the default location of the solved hand-eye transform."""
+    ros_home = os.environ.get('ROS_HOME', os.path.expanduser('~/.ros'))
+    return os.path.join(ros_home, 'hand_eye.npz')
+
+
+def save_result(path, X, residuals):
+    """Store a solved hand-eye transform with its per-sample residuals."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        np.savez(file, X=X, residuals=residuals, stamp=time.time())
+    os.replace(tmp_path, path)
+
+
+def load_result(path):
+    """Load the hand-eye transform written by save_result, or None."""
+    try:
+        with np.load(path) as data:
+            X = np.array(data['X'])
+    except (OSError, ValueError, KeyError):
+        return None
+    return X if X.shape == (4, 4) else None
@@ -2,10 +2,10 @@ from enum import Enum, auto
 import rclpy
 from rclpy.node import Node
 from std_msgs.msg import String, Float64MultiArray
-from matplotlib.textpath import TextToPath
-from matplotlib.font_manager import FontProperties
 import urllib.request
 from brain_interfaces.msg import LetterMsg
+from drawing.glyphs import GlyphStore, default_glyph_cache
+from drawing.layout import BoardLayout, default_layout_file
 from random import randint
 
 
@@ -24,12 +24,20 @@ class Hangman(Node):
         super().__init__("hangman")
         """Initialize the game vars and other stuff"""
 
+        self.declare_parameter('glyph_cache', default_glyph_cache())
+        self.glyphs = GlyphStore(self.get_parameter(
+            'glyph_cache').get_parameter_value().string_value)
+        # the word has as many letters as the layout has tiles for
+        self.declare_parameter('layout_file', default_layout_file())
+        self.layout = BoardLayout.from_file(self.get_parameter(
+            'layout_file').get_parameter_value().string_value)
+
         self.state = State.WAITING
         self.word = "BABIES"
         self.guesses_to_fail = 5
         self.current_wrong_guesses = 0
         self.guessed_letters = []
-        self.word_status = ['_', '_', '_', '_', '_']
+        self.word_status = ['_'] * self.layout.word_length
         self.game_won = False
         self.user_guess = None
         self.Alphabet = {}
@@ -55,18 +63,11 @@ class Hangman(Node):
         letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
         for i in range(0, len(letters)):
             letter = letters[i]
-            fp = FontProperties(family="DejaVu Sans Mono", style="normal")
-            verts, codes = TextToPath().get_text_path(fp, letters[i])
-            # print(type(path))
-            # print(verts)
-            xlist = []
-            ylist = []
-            for j in range(0, len(verts)-1):
-                if verts[j][0] > 0:
-                    xlist.append(verts[j][0])
-                    ylist.append(verts[j][1])
-            point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
+            strokes = self.glyphs.strokes(
+                "DejaVu Sans Mono", 1.0, 1.0, 0.5, letter)
+            point_dict = {letter: strokes}
             self.Alphabet.update(point_dict)
+        self.glyphs.save()
 
     def pick_words(self):
         """Randomly chooses a 6 letter word"""
@@ -77,7 +78,7 @@ class Hangman(Node):
         words = long_txt.splitlines()
         word_list = []
         for i in range(0, len(words)):
-            if len(words[i]) == 5:
+            if len(words[i]) == self.layout.word_length:
                 word_list.append(words[i])
 
         self.word = word_list[randint(0, len(word_list))].upper()
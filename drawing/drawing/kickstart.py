@@ -7,7 +7,9 @@ from geometry_msgs.msg import Pose, Point, Quaternion
 from std_srvs.srv import Empty
 from std_msgs.msg import String
 
-from brain_interfaces.srv import BoardTiles, MovePose, Cartesian
+from brain_interfaces.srv import BoardTilesBatch, MovePose, Cartesian
+
+from drawing.layout import BoardLayout, default_layout_file, STAND, WORD, WRONG
 
 from enum import Enum, auto
 
@@ -24,6 +26,11 @@ class Kickstart(Node):
     def __init__(self):
         super().__init__("kickstart")
 
+        # where the tiles are on the board
+        self.declare_parameter('layout_file', default_layout_file())
+        self.layout = BoardLayout.from_file(self.get_parameter(
+            'layout_file').get_parameter_value().string_value)
+
         # create kickstart service
         self.kickstart_service = self.create_service(
             Empty, 'kickstart_service', self.kickstart_callback)
@@ -43,7 +50,7 @@ class Kickstart(Node):
         self.cal_client = self.create_client(
             Empty, 'calibrate', callback_group=self.cal_callback_group)
         self.tile_client = self.create_client(
-            BoardTiles, 'where_to_write', callback_group=self.tile_callback_group)
+            BoardTilesBatch, 'where_to_write_batch', callback_group=self.tile_callback_group)
         self.movemp_client = self.create_client(
             MovePose, '/moveit_mp', callback_group=self.mp_callback_group)
         self.cartesian_client = self.create_client(
@@ -71,29 +78,34 @@ class Kickstart(Node):
         self.get_logger().info('finished calibrating')
 
         # DASHES
-        # draw dashes for word to guess
-        await self.draw_component(1, 0)
-        self.get_logger().info('drew first dash')
-        await self.draw_component(1, 1)
-        await self.draw_component(1, 2)
-        await self.draw_component(1, 3)
-        await self.draw_component(1, 4)
-        # await self.draw_component(1, 5)
-
-        # # draw dashes for wrong letters
-        await self.draw_component(0, 0)
-        await self.draw_component(0, 1)
-        await self.draw_component(0, 2)
-        await self.draw_component(0, 3)
-        await self.draw_component(0, 4)
-
-        # # draw stand for hangman
-        await self.draw_component(3, 0)
+        # dashes for word to guess, dashes for wrong letters, then the stand
+        # for hangman; the poses of all of them come from one service call
+        components = [(WORD, position) for position in range(self.layout.word_length)]
+        components += [(WRONG, position) for position in range(self.layout.wrong_guesses)]
+        components += [(STAND, 0)]
+        shapes = [self.component_shape(mode) for mode, _ in components]
+
+        request = BoardTilesBatch.Request()
+        request.modes = [mode for mode, _ in components]
+        request.positions = [position for _, position in components]
+        request.lengths = [len(x) for x, _, _ in shapes]
+        request.x = [value for x, _, _ in shapes for value in x]
+        request.y = [value for _, y, _ in shapes for value in y]
+        request.onboard = [value for _, _, on in shapes for value in on]
+        resp = await self.tile_client.call_async(request)
+
+        start = 0
+        for (mode, position), (_, _, on), pose1 in zip(components, shapes, resp.initial_poses):
+            pose_list = resp.pose_list[start:start + len(on)]
+            start += len(on)
+            await self.draw_component(mode, pose1, pose_list, on)
+            if (mode, position) == (WORD, 0):
+                self.get_logger().info('drew first dash')
 
         return response
 
-    async def draw_component(self, mode, position):
-
+    def component_shape(self, mode):
+        """Return the x, y and onboard values of a dash or the stand."""
         # if mode = 0 or 1 then drawing dashes
         dash_x = [0.01, 0.09, 0.09]
         dash_y = [0.0, 0.0, 0.0]
@@ -104,97 +116,50 @@ class Kickstart(Node):
         stand_y = [0.05, 0.05, 0.00, 0.00]
         stand_on = [True, True, True, False]
 
-        if mode == 0 or mode == 1:
-            # take in mode and position and draw component accordingly
-            request = BoardTiles.Request()
-            request.mode = mode
-            request.position = position
-            request.x = dash_x
-            request.y = dash_y
-            request.onboard = dash_on
-
-            # denote pose_list and initial_pose from BoardTiles response
-            resp = await self.tile_client.call_async(request)
-            pose1 = resp.initial_pose
-            pose_list = resp.pose_list
-
-            ##################### moving to the position####################
-
-            self.get_logger().info(f"Pose List for Dash: {pose1}")
-            self.get_logger().info(f"Pose List for Dash: {pose_list}")
-            request2 = Cartesian.Request()
-            request2.poses = [pose1]
-            request2.velocity = 0.1
-            request2.replan = False
-            request2.use_force_control = [False]
-            await self.cartesian_client.call_async(request2)
-            self.get_logger().info(f"one done")
-
-            request2 = Cartesian.Request()
-            request2.poses = [pose_list[0]]
-            request2.velocity = 0.015
-            request2.replan = False
-            request2.use_force_control = [dash_on[0]]
-            await self.cartesian_client.call_async(request2)
-            self.get_logger().info(f"second done")
-            # draw remaining pose dashes with Cartesian mp
-            request3 = Cartesian.Request()
-            request3.poses = pose_list[1:]
-            request3.velocity = 0.015
-            request3.replan = True
-            request3.use_force_control = dash_on[1:]
-            self.get_logger().info(f"pose_list: {pose_list[1:]}")
-            await self.cartesian_client.call_async(request3)
-            self.get_logger().info(f"all done")
-
-        if mode == 3:
-            # take in mode and position and draw component accordingly
-            request = BoardTiles.Request()
-            request.mode = mode
-            request.position = position
-            request.x = stand_x
-            request.y = stand_y
-            request.onboard = stand_on
-
-            # denote pose_list and initial_pose from BoardTiles response
-            resp = await self.tile_client.call_async(request)
-            pose1 = resp.initial_pose
-            pose_list = resp.pose_list
-
-            self.get_logger().info(f"Pose List for Stand: {pose1}")
-            self.get_logger().info(f"Pose List for Stand: {pose_list}")
-            request2 = Cartesian.Request()
-            request2.poses = [pose1]
-            request2.velocity = 0.1
-            request2.replan = False
-            request2.use_force_control = [False]
-            await self.cartesian_client.call_async(request2)
-            self.get_logger().info(f"working on it")
-
-            request2 = Cartesian.Request()
-            request2.poses = [pose_list[0]]
-            request2.velocity = 0.015
-            request2.replan = False
-            request2.use_force_control = [stand_on[0]]
-            await self.cartesian_client.call_async(request2)
-            self.get_logger().info(f"still working on it")
-            # draw remaining pose dashes with Cartesian mp
-            request3 = Cartesian.Request()
-            request3.poses = pose_list[1:]
-            request3.velocity = 0.015
-            request3.replan = True
-            request3.use_force_control = stand_on[1:]
-            self.get_logger().info(f"pose_list: {pose_list[1:]}")
-            await self.cartesian_client.call_async(request3)
-            self.get_logger().info(f"all done")
-
-            # request4 = Cartesian.Request()
-            # request4.poses = [Pose(position=Point(x=0.0, y=-0.3, z=0.3), orientation=Quaternion(
-            #     x=0.7117299678289105, y=-0.5285053338340909, z=0.268057323473255, w=0.37718408812611504))]
-            # request4.velocity = 0.1
-            # request4.replan = False
-            # request4.use_force_control = [False]
-            # await self.cartesian_client.call_async(request4)
+        if mode == STAND:
+            return stand_x, stand_y, stand_on
+        return dash_x, dash_y, dash_on
+
+    async def draw_component(self, mode, pose1, pose_list, onboard):
+        """Draw one dash or the stand from its poses."""
+        name = "Stand" if mode == STAND else "Dash"
+
+        ##################### moving to the position####################
+
+        self.get_logger().info(f"Pose List for {name}: {pose1}")
+        self.get_logger().info(f"Pose List for {name}: {pose_list}")
+        request2 = Cartesian.Request()
+        request2.poses = [pose1]
+        request2.velocity = 0.1
+        request2.replan = False
+        request2.use_force_control = [False]
+        await self.cartesian_client.call_async(request2)
+        self.get_logger().info(f"one done")
+
+        request2 = Cartesian.Request()
+        request2.poses = [pose_list[0]]
+        request2.velocity = 0.015
+        request2.replan = False
+        request2.use_force_control = [onboard[0]]
+        await self.cartesian_client.call_async(request2)
+        self.get_logger().info(f"second done")
+        # draw remaining pose dashes with Cartesian mp
+        request3 = Cartesian.Request()
+        request3.poses = pose_list[1:]
+        request3.velocity = 0.015
+        request3.replan = True
+        request3.use_force_control = onboard[1:]
+        self.get_logger().info(f"pose_list: {pose_list[1:]}")
+        await self.cartesian_client.call_async(request3)
+        self.get_logger().info(f"all done")
+
+        # request4 = Cartesian.Request()
+        # request4.poses = [Pose(position=Point(x=0.0, y=-0.3, z=0.3), orientation=Quaternion(
+        #     x=0.7117299678289105, y=-0.5285053338340909, z=0.268057323473255, w=0.37718408812611504))]
+        # request4.velocity = 0.1
+        # request4.replan = False
+        # request4.use_force_control = [False]
+        # await self.cartesian_client.call_async(request4)
 
 
 def main(args=None):
@@ -0,0 +1,117 @@
+"""
+Tile layout of the hangman board.
+
+The Tags, Brain, Kickstart and Hangman nodes all use this layout. It is read
+from a YAML file (config/layout.yaml by default) and the board origin of
+every tile is computed once when it is loaded, so looking a tile up is a
+dictionary access.
+
+Modes are 0 for wrong guesses, 1 for the letters of the word, 2 for the
+parts of the man and 3 for the stand.
+"""
+
+import os
+
+import numpy as np
+import yaml
+
+from drawing.geometry import compose, transforms_from_points
+
+WRONG = 0
+WORD = 1
+MAN = 2
+STAND = 3
+
+
+def default_layout_file():
+    """Return the layout installed with the drawing package."""
+    from ament_index_python.packages import get_package_share_directory
+    return os.path.join(get_package_share_directory('drawing'), 'layout.yaml')
+
+
+class BoardLayout:
+    """
+    Board origins of every tile.
+
+    Tiles sit on a grid of cell_size cells, and their origins are scaled by
+    tile_scale. The letters of the word and the wrong guesses each take a
+    row, starting at letter_column and letter_step cells apart.
+    """
+
+    def __init__(self, board_size=(0.8, 0.4), cell_size=0.1, tile_scale=0.667,
+                 word_length=5, wrong_guesses=5, word_row=2, wrong_row=0,
+                 letter_column=2, letter_step=2,
+                 man_cells=((1, 2), (1, 1), (0, 1), (0, 0), (1, 0)),
+                 stand_cell=(0, 3)):
+        """
+        Compute the tile table.
+
+        Args:
+        ----
+        board_size (tuple): width and height of the board, in metres
+        cell_size (float): size of a grid cell, in metres
+        tile_scale (float): scale from grid positions to tile origins
+        word_length (int): number of letters in the word
+        wrong_guesses (int): number of wrong guesses that are written down
+        word_row, wrong_row (int): grid rows of the word and wrong guesses
+        letter_column (int): grid column of the first letter of each row
+        letter_step (int): grid columns from one letter to the next
+        man_cells (list): [column, row] of each part of the man, in the
+            order they are drawn
+        stand_cell (list): [column, row] of the stand
+
+        """
+        self.board_size = tuple(board_size)
+        self.word_length = word_length
+        self.wrong_guesses = wrong_guesses
+        self.man_parts = len(man_cells)
+
+        cells = {}
+        for position in range(word_length):
+            cells[(WORD, position)] = (letter_column + letter_step * position, word_row)
+        for position in range(wrong_guesses):
+            cells[(WRONG, position)] = (letter_column + letter_step * position, wrong_row)
+        for position, cell in enumerate(man_cells):
+            cells[(MAN, position)] = tuple(cell)
+        cells[(STAND, 0)] = tuple(stand_cell)
+
+        self.table = {tile: np.array(cell, dtype=np.float64) * cell_size * tile_scale
+                      for tile, cell in cells.items()}
+        for tile, origin in self.table.items():
+            if np.any(origin < 0.0) or np.any(origin >= self.board_size):
+                raise ValueError(
+                    f'tile {tile} at {origin} is off the {board_size} board')
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a layout from a YAML file of BoardLayout arguments."""
+        with open(path) as file:
+            return cls(**(yaml.safe_load(file) or {}))
+
+    def tiles(self):
+        """List every (mode, position) pair of the layout."""
+        return list(self.table)
+
+    def tile_origin(self, mode, position):
+        """Return the origin of a tile in the board frame, in metres."""
+        return self.table[(mode, position)]
+
+
+def tile_table(layout, Trb):
+    """
+    Compute the panda_link0 -> tile transform of every tile of a layout.
+
+    Args:
+    ----
+    layout (BoardLayout): the tiles and their board origins
+    Trb (np.array): 4x4 panda_link0 -> board transform
+
+    Returns
+    -------
+    A dictionary from (mode, position) to a 4x4 transform.
+
+    """
+    tiles = layout.tiles()
+    origins = np.array([layout.tile_origin(*tile) for tile in tiles])
+    Tbl = transforms_from_points(np.eye(3), np.column_stack((origins, np.zeros(len(tiles)))))
+    return dict(zip(tiles, compose(Trb, Tbl)))
@@ -0,0 +1,58 @@
+"""
+When a stroke planned ahead of time may be used.
+
+While one stroke is drawn, the Drawing node plans the next one from the
+joint state the current one ends in. By the time the plan is wanted the
+queue may have changed, for example because force control stopped the
+stroke and the rest of it was queued again, and the robot may not have
+ended where the plan starts. Either makes the plan useless.
+"""
+
+
+def queue_changed(waypoints, velocity, queue, velocities):
+    """
+    Check whether the queue still starts with the planned waypoints.
+
+    Args:
+    ----
+    waypoints (list): the Pose waypoints that were planned
+    velocity (float): the velocity they were planned with
+    queue (list): the Pose waypoints queued now
+    velocities (list): the velocity of every queued waypoint
+
+    Returns
+    -------
+    True if the plan is not for the front of the queue any more.
+
+    """
+    if not queue or len(waypoints) > len(queue) or velocity != velocities[0]:
+        return True
+    # the queue holds the same Pose objects the plan was made for
+    return any(planned is not queued for planned, queued in zip(waypoints, queue))
+
+
+def discard_reason(waypoints, velocity, queue, velocities, distance, tolerance):
+    """
+    Say why a stroke planned ahead can not be used.
+
+    Args:
+    ----
+    waypoints (list): the Pose waypoints that were planned
+    velocity (float): the velocity they were planned with
+    queue (list): the Pose waypoints queued now
+    velocities (list): the velocity of every queued waypoint
+    distance (float): largest joint difference (rad) between the robot and
+        the start of the plan, None if it is not known
+    tolerance (float): largest distance (rad) at which the plan is used
+
+    Returns
+    -------
+    A message for the log, or None if the plan can be used.
+
+    """
+    if queue_changed(waypoints, velocity, queue, velocities):
+        return 'queue changed, discarding the planned ahead stroke'
+    if distance is None or distance > tolerance:
+        return (f'robot is {distance} rad from where the planned ahead stroke '
+                'starts, discarding it')
+    return None
@@ -5,7 +5,7 @@ from rclpy.task import Future
 
 from trajectory_msgs.msg import JointTrajectory
 from geometry_msgs.msg import Pose, Point, Quaternion
-from std_msgs.msg import String
+from std_msgs.msg import Bool, String
 
 from brain_interfaces.msg import EEForce
 
@@ -46,6 +46,10 @@ class Executor(Node):
         self.execute_trajectory_status_pub = self.create_publisher(
             String, '/execute_trajectory_status', 10)
 
+        # true while force control holds the pen on the board, the tags node
+        # samples the board surface then
+        self.pen_contact_pub = self.create_publisher(Bool, 'pen_contact', 10)
+
         # create services
         self.joint_trajectories_service = self.create_service(
             ExecuteJointTrajectories, '/joint_trajectories', self.joint_trajectories_callback, callback_group=self.joint_trajectories_callback_group)
@@ -83,6 +87,15 @@ class Executor(Node):
         self.distance = 0.01  # distance along quaternion to move
         self.replan = False
 
+        # when a trajectory visits several waypoints, the waypoint each of the
+        # remaining joint trajectories is heading to, and their force control flags
+        self.waypoints = []
+        self.waypoint_use_force_control = []
+        self.segment_index = []
+        self.segment = 0
+        # waypoint a force stop without replanning happened in, reported back
+        self.stopped_segment = -1
+
         self.future = Future()
 
         self.i = 1
@@ -140,6 +153,13 @@ class Executor(Node):
         self.pose = request.current_pose
         self.replan = request.replan
         self.use_force_control = request.use_force_control
+        self.waypoints = request.waypoints
+        self.waypoint_use_force_control = request.waypoint_use_force_control
+        self.segment_index = list(request.segment_index)
+        self.segment = 0
+        self.stopped_segment = -1
+        if self.segment_index:
+            self.enter_segment(self.segment_index[0])
         if not self.use_force_control:
             self.use_control_loop = False
         self.get_logger().info(f"use force control: {self.use_force_control}")
@@ -155,11 +175,37 @@ class Executor(Node):
 
         self.future = Future()
 
+        response.stopped_segment = self.stopped_segment
         return response
 
+    def enter_segment(self, segment):
+        """Take the pose and force control flag of the waypoint being drawn to."""
+        self.segment = segment
+        self.pose = self.waypoints[segment]
+        self.use_force_control = self.waypoint_use_force_control[segment]
+        if not self.use_force_control:
+            self.use_control_loop = False
+        self.get_logger().info(
+            f"segment {segment}, use force control: {self.use_force_control}")
+
+    def publish_next(self):
+        """Send the next joint trajectory to the controller."""
+        self.pub.publish(self.joint_trajectories[0])
+        self.joint_trajectories.pop(0)
+        if self.segment_index:
+            self.segment_index.pop(0)
+            if self.segment_index and self.segment_index[0] != self.segment:
+                self.enter_segment(self.segment_index[0])
+
+    def pen_contact(self):
+        """Whether force control is holding the pen on the board right now."""
+        return (self.use_force_control or self.use_control_loop) and \
+            self.lower_threshold <= self.ee_force <= self.upper_threshold
+
     async def replan_trajectory(self, into_the_board):
         self.get_logger().info("joint trajectories cleared")
         self.joint_trajectories.clear()
+        self.segment_index = []
 
         # replan the trajectory!!
         self.get_logger().info(
@@ -168,7 +214,8 @@ class Executor(Node):
 
         self.pose = update_trajectory_response.output_pose
 
-        replan_response = await self.replan_client.call_async(Replan.Request(pose=self.pose))
+        replan_response = await self.replan_client.call_async(
+            Replan.Request(pose=self.pose, segment=self.segment))
 
         self.joint_trajectories = replan_response.joint_trajectories
         self.output_angle = self.joint_trajectories[0].points[0].positions[5]
@@ -197,7 +244,12 @@ class Executor(Node):
 
                 self.get_logger().info("joint trajectories cleared")
                 self.get_logger().info("poses all done")
+                # the waypoints after this one still have to be drawn, the
+                # drawing node queues them again
+                if self.segment_index:
+                    self.stopped_segment = self.segment
                 self.joint_trajectories.clear()
+                self.segment_index = []
 
         elif self.joint_trajectories and self.state == State.PUBLISH and self.i % 10 == 0:
             # self.get_logger().info(f"publishing!!!!!!!!!!!!!!!")
@@ -245,12 +297,12 @@ class Executor(Node):
                     await self.replan_trajectory(True)
                     self.use_control_loop = False
 
-                self.pub.publish(self.joint_trajectories[0])
-                self.joint_trajectories.pop(0)
+                self.publish_next()
 
             else:
-                self.pub.publish(self.joint_trajectories[0])
-                self.joint_trajectories.pop(0)
+                self.publish_next()
+
+            self.pen_contact_pub.publish(Bool(data=self.pen_contact()))
 
         # if we've reached the goal, send a message to draw.py that says we're done.
         elif not self.joint_trajectories and self.state == State.PUBLISH:
@@ -0,0 +1,233 @@
+"""
+Stroke processing helpers used by the Brain before letters go to the board.
+
+A stroke is an (N, 2) array of board points drawn without lifting the pen.
+"""
+
+from itertools import permutations
+
+import numpy as np
+
+# above this many items the exact search gets too slow, use 2-opt instead
+EXACT_ORDER_LIMIT = 6
+
+
+def transit_distance(strokes, start=None):
+    """
+    Total pen-up travel needed to draw strokes in the given order.
+
+    Args:
+    ----
+    strokes (list): list of (N, 2) strokes
+    start (np.array): optional pen position before the first stroke
+
+    Returns
+    -------
+    distance: the summed distance between the end of each stroke and the
+    start of the next one
+
+    """
+    distance = 0.0
+    previous = start
+    for stroke in strokes:
+        if previous is not None:
+            distance += float(np.linalg.norm(stroke[0] - previous))
+        previous = stroke[-1]
+    return distance
+
+
+def tour_cost(order, flipped, starts, ends, start):
+    """Pen-up travel of one tour over the stroke end points."""
+    heads = np.where(flipped[:, None], ends[order], starts[order])
+    tails = np.where(flipped[:, None], starts[order], ends[order])
+    cost = np.linalg.norm(heads[1:] - tails[:-1], axis=1).sum()
+    if start is not None:
+        cost += np.linalg.norm(heads[0] - start)
+    return float(cost)
+
+
+def best_orientation(order, starts, ends, start):
+    """
+    Pick the direction of every stroke for a fixed visiting order.
+
+    This is a shortest path over two states per stroke (forward or
+    reversed), solved with a small dynamic program.
+    """
+    n = len(order)
+    points = np.stack([np.stack([starts[order], ends[order]], axis=1),
+                       np.stack([ends[order], starts[order]], axis=1)],
+                      axis=1)  # (n, direction, head/tail, 2)
+    if start is None:
+        cost = np.zeros(2)
+    else:
+        cost = np.linalg.norm(points[0, :, 0] - start, axis=1)
+    choice = np.zeros((n, 2), dtype=int)
+    for i in range(1, n):
+        # hop[a, b]: previous stroke in direction a to this one in direction b
+        hop = np.linalg.norm(points[i - 1, :, None, 1] - points[i, None, :, 0],
+                             axis=2)
+        total = cost[:, None] + hop
+        choice[i] = np.argmin(total, axis=0)
+        cost = total.min(axis=0)
+
+    flipped = np.zeros(n, dtype=bool)
+    direction = int(np.argmin(cost))
+    for i in range(n - 1, -1, -1):
+        flipped[i] = bool(direction)
+        direction = choice[i, direction]
+    return flipped, float(cost.min())
+
+
+def order_strokes(strokes, start=None):
+    """
+    Reorder and reverse strokes to minimise pen-up travel.
+
+    This is a small travelling salesman problem over the stroke end points,
+    where every stroke may be drawn in either direction. Up to
+    EXACT_ORDER_LIMIT strokes are searched exhaustively, larger inputs use a
+    nearest neighbour tour refined with 2-opt, whose strokes are then turned
+    the best way round.
+
+    Args:
+    ----
+    strokes (list): list of (N, 2) strokes
+    start (np.array): optional pen position before the first stroke
+
+    Returns
+    -------
+    ordered, order, flipped: the reordered strokes, the original index of
+    each one, and whether it was reversed
+
+    """
+    n = len(strokes)
+    if n == 0 or (n == 1 and start is None):
+        return list(strokes), list(range(n)), [False] * n
+
+    starts = np.array([stroke[0] for stroke in strokes], dtype=np.float64)
+    ends = np.array([stroke[-1] for stroke in strokes], dtype=np.float64)
+    if start is not None:
+        start = np.asarray(start, dtype=np.float64)
+
+    if n <= EXACT_ORDER_LIMIT:
+        best = None
+        for order in permutations(range(n)):
+            order = np.array(order)
+            flipped, cost = best_orientation(order, starts, ends, start)
+            if best is None or cost < best[0] - 1e-12:
+                best = (cost, order, flipped)
+        _, order, flipped = best
+    else:
+        order, flipped = nearest_neighbour_tour(starts, ends, start)
+        order, flipped = two_opt(order, flipped, starts, ends, start)
+        # 2-opt only turns strokes around inside the sections it reverses,
+        # pick the best direction of every stroke for the order it found
+        flipped, _ = best_orientation(order, starts, ends, start)
+
+    ordered = [strokes[i][::-1] if flip else strokes[i]
+               for i, flip in zip(order, flipped)]
+    return ordered, [int(i) for i in order], [bool(f) for f in flipped]
+
+
+def nearest_neighbour_tour(starts, ends, start):
+    """Greedy tour that always draws the closest remaining stroke next."""
+    n = len(starts)
+    remaining = np.ones(n, dtype=bool)
+    order = []
+    flipped = []
+    pen = start if start is not None else starts[0]
+    for _ in range(n):
+        to_start = np.linalg.norm(starts - pen, axis=1)
+        to_end = np.linalg.norm(ends - pen, axis=1)
+        to_start[~remaining] = np.inf
+        to_end[~remaining] = np.inf
+        if to_end.min() < to_start.min():
+            i = int(np.argmin(to_end))
+            flipped.append(True)
+            pen = starts[i]
+        else:
+            i = int(np.argmin(to_start))
+            flipped.append(False)
+            pen = ends[i]
+        order.append(i)
+        remaining[i] = False
+    return np.array(order), np.array(flipped)
+
+
+def two_opt(order, flipped, starts, ends, start):
+    """Improve a tour by reversing sections of it until nothing helps."""
+    order = order.copy()
+    flipped = flipped.copy()
+    cost = tour_cost(order, flipped, starts, ends, start)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                new_order = order.copy()
+                new_flipped = flipped.copy()
+                # reversing a section also reverses every stroke inside it
+                new_order[i:j + 1] = order[i:j + 1][::-1]
+                new_flipped[i:j + 1] = ~flipped[i:j + 1][::-1]
+                new_cost = tour_cost(new_order, new_flipped, starts, ends, start)
+                if new_cost < cost - 1e-12:
+                    order, flipped, cost = new_order, new_flipped, new_cost
+                    improved = True
+    return order, flipped
+
+
+def reverse_strokes(strokes):
+    """Draw a sequence of strokes backwards, end to start."""
+    return [stroke[::-1] for stroke in strokes[::-1]]
+
+
+def simplify_stroke(stroke, tolerance):
+    """
+    Drop nearly collinear points from a stroke (Ramer-Douglas-Peucker).
+
+    The distances of all points between two kept points are computed in one
+    NumPy call, and the sections still to be checked are kept on a stack
+    instead of recursing.
+
+    Args:
+    ----
+    stroke (np.array): (N, 2) stroke points
+    tolerance (float): the largest distance a dropped point may have from
+        the simplified stroke, in metres on the board
+
+    Returns
+    -------
+    simplified: the kept points, always including both ends of the stroke
+
+    """
+    stroke = np.asarray(stroke, dtype=np.float64)
+    n = len(stroke)
+    if n < 3 or tolerance <= 0.0:
+        return stroke
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    sections = [(0, n - 1)]
+    while sections:
+        first, last = sections.pop()
+        if last - first < 2:
+            continue
+        chord = stroke[last] - stroke[first]
+        offsets = stroke[first + 1:last] - stroke[first]
+        length = np.hypot(*chord)
+        if length > 0.0:
+            distance = np.abs(chord[0] * offsets[:, 1] -
+                              chord[1] * offsets[:, 0]) / length
+        else:
+            # closed section, measure from the shared end point
+            distance = np.hypot(offsets[:, 0], offsets[:, 1])
+        i = int(np.argmax(distance))
+        if distance[i] > tolerance:
+            middle = first + 1 + i
+            keep[middle] = True
+            sections += [(first, middle), (middle, last)]
+    return stroke[keep]
+
+
+def simplify_strokes(strokes, tolerance):
+    """Simplify every stroke of a glyph with simplify_stroke."""
+    return [simplify_stroke(stroke, tolerance) for stroke in strokes]
@@ -0,0 +1,105 @@
+"""
+Height of the board surface, learned from force controlled contacts.
+
+While the executor holds the pen on the board under force control, the
+tags node records the measured height of the pen tip in the board frame.
+A low order polynomial fitted to those heights predicts where the surface is
+under points that have not been drawn yet.
+"""
+
+from collections import deque
+
+import numpy as np
+
+# fewer samples than this only fit a constant offset, then a plane
+PLANE_SAMPLES = 3
+# from this many samples the surface may also bend
+QUADRATIC_SAMPLES = 12
+
+
+def surface_terms(x, y, terms):
+    """Columns of the polynomial surface model, up to the given count."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    columns = [np.ones_like(x), x, y, x * x, x * y, y * y]
+    return np.stack(columns[:terms], axis=-1)
+
+
+class BoardSurface:
+    """
+    Least squares height map of the board.
+
+    The model grows with the data: a constant offset, then a plane, then a
+    quadratic surface. Only the most recent samples are kept, so a board
+    that settles over a game is followed.
+
+    The model also only grows as far as the spread of the contacts allows.
+    Contacts along a single dash say nothing about the slope across it, so
+    until they spread over min_spread in two directions the surface is a
+    constant, or a slope along the line that is flat across it.
+    """
+
+    def __init__(self, max_samples=200, min_spread=0.01):
+        """
+        Start with an empty model.
+
+        Args:
+        ----
+        max_samples (int): number of recent contacts the fit uses
+        min_spread (float): RMS spread (m) of the contacts along a direction
+            for the fit to tilt or bend along it
+
+        """
+        self.samples = deque(maxlen=max_samples)
+        self.min_spread = min_spread
+        self.coefficients = None
+
+    def reset(self):
+        """Forget every contact, for example after a recalibration."""
+        self.samples.clear()
+        self.coefficients = None
+
+    def add(self, x, y, z):
+        """Record the pen height z at board point (x, y) and refit."""
+        self.samples.append((x, y, z))
+        data = np.array(self.samples)
+        if len(data) < PLANE_SAMPLES:
+            self.coefficients = np.array([data[:, 2].mean()])
+            return
+
+        # principal directions of the contacts on the board, with their
+        # RMS spread
+        center = data[:, :2].mean(axis=0)
+        _, spread, directions = np.linalg.svd(
+            (data[:, :2] - center) / np.sqrt(len(data)), full_matrices=False)
+        if spread[1] >= self.min_spread:
+            terms = 6 if len(data) >= QUADRATIC_SAMPLES else 3
+            A = surface_terms(data[:, 0], data[:, 1], terms)
+            self.coefficients = np.linalg.lstsq(A, data[:, 2], rcond=None)[0]
+        elif spread[0] >= self.min_spread:
+            # a line of contacts: fit the slope along it as a plane
+            u = directions[0]
+            A = np.column_stack((np.ones(len(data)), (data[:, :2] - center) @ u))
+            offset, slope = np.linalg.lstsq(A, data[:, 2], rcond=None)[0]
+            self.coefficients = np.array([offset - slope * (center @ u),
+                                          slope * u[0], slope * u[1]])
+        else:
+            self.coefficients = np.array([data[:, 2].mean()])
+
+    def height(self, x, y, default):
+        """
+        Predict the pen height at board points.
+
+        Args:
+        ----
+        x, y (np.array): board coordinates of the points
+        default (float): height to use while there are no contacts
+
+        Returns
+        -------
+        heights: the predicted heights, the same shape as x
+
+        """
+        if self.coefficients is None:
+            return np.full(np.shape(x), default, dtype=np.float64)
+        return surface_terms(x, y, len(self.coefficients)) @ self.coefficients
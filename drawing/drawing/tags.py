@@ -6,27 +6,42 @@
 import rclpy
 from rclpy.node import Node
 from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
+from rclpy.qos import DurabilityPolicy, QoSProfile
 
 from tf2_ros.buffer import Buffer
 from tf2_ros.transform_listener import TransformListener
-from tf2_ros import TransformBroadcaster
 import tf2_ros
-from tf2_ros.static_transform_broadcaster import StaticTransformBroadcaster
 
-from std_msgs.msg import String
+from std_msgs.msg import Bool, Int64, String
 from std_srvs.srv import Empty
 from geometry_msgs.msg import Point, Quaternion, Vector3, Pose
 from geometry_msgs.msg import TransformStamped
 
-from brain_interfaces.srv import BoardTiles, MovePose, UpdateTrajectory, Box
+from brain_interfaces.srv import BoardTiles, BoardTilesBatch, MovePose, UpdateTrajectory, Box
 
 from path_planner.path_plan_execute import Path_Plan_Execute
 
+from drawing.calibration import (board_estimate, BoardTracker, default_calibration_file,
+                                 load_calibration, save_calibration, twist_residuals)
+from drawing.geometry import (compose, invert, rotations_to_quaternions, transforms_from_points,
+                              transforms_from_poses)
+from drawing.handeye import (append_sample, default_result_file, default_sample_file, load_result,
+                             load_samples, save_result, solve_hand_eye, tag_id)
+from drawing.layout import BoardLayout, default_layout_file, tile_table
+from drawing.surface import BoardSurface
+from drawing.tf_cache import TransformCache
+from drawing.tf_publisher import TransformPublisher
+
 from enum import Enum, auto
 
-import modern_robotics as mr
 import numpy as np
-import transforms3d as tf
+import time
+
+
+# orientation of the pen relative to a board tile while writing
+PEN_ROTATION = np.array([[-0.03948997, 0.99782373, 0.05280484],
+                         [0.06784999, 0.05540183, -0.99615612],
+                         [-0.9969137, -0.03575537, -0.06989015]])
 
 
 class State(Enum):
@@ -34,56 +49,99 @@ class State(Enum):
     OTHER = auto()
 
 
-class Grid:
-    def __init__(self, xrange, yrange, cell_size):
-
-        self.xrange = xrange
-        self.yrange = yrange
-        self.cell_size = cell_size
-        self.xnum = int(((self.xrange[1] - self.xrange[0]) / self.cell_size))
-        self.ynum = int(((self.yrange[1] - self.yrange[0]) / self.cell_size))
-        self.grid = np.zeros((self.ynum, self.xnum))
-
-    def grid_to_world(self, mode, position):
-        if mode == 0:
-            point = (0, position+2)
-
-        if mode == 1:
-            point = (2, position+2)
-
-        if mode == 2:
-            if position == 0:
-                point = (2, 1)
-            if position == 1:
-                point = (1, 1)
-            if position == 2:
-                point = (1, 0)
-            if position == 3:
-                point = (0, 0)
-            if position == 4:
-                point = (0, 1)
-        if mode == 3:
-            point = (3, 0)
-
-        point_y = (point[0])*self.cell_size + self.yrange[0]
-        point_x = (point[1])*self.cell_size + self.xrange[0]
-        if mode == 0 or mode == 1:
-            # point_y += .2*position
-            point_x += .1*position
-        return [point_x, point_y]
-
-
 class Tags(Node):
 
     def __init__(self):
         super().__init__("tags")
+
+        # declare parameters
+        # board tags used for calibration, and the x, y offset from each tag
+        # to the board origin in the tag frame
+        self.declare_parameter('board_tags', ['tag11', 'tag12'])
+        self.declare_parameter('board_tag_offsets', [0.05, 0.05, 0.05, -0.05])
+        # number of detections averaged per calibration, and how long (s) to
+        # wait for them before using whatever has been collected
+        self.declare_parameter('calibration_samples', 30)
+        self.declare_parameter('calibration_timeout', 3.0)
+        # where the last calibration is stored, and how far (m) a quick look
+        # at the board may disagree with it before the board is recalibrated
+        self.declare_parameter('calibration_file', default_calibration_file())
+        self.declare_parameter('calibration_tolerance', 0.005)
+        self.declare_parameter('verify_samples', 5)
+        self.declare_parameter('verify_timeout', 1.0)
+        # keep following the board with the detections seen while drawing,
+        # variances are (rotation rad^2 x3, translation m^2 x3), drift is
+        # per second; the tile table is only rebuilt once the tracked board
+        # moved by more than track_update_threshold (m)
+        self.declare_parameter('track_board', False)
+        self.declare_parameter('track_drift', [1e-7, 1e-7, 1e-7, 1e-8, 1e-8, 1e-8])
+        self.declare_parameter('track_detection_noise', [1e-4, 1e-4, 1e-4, 4e-6, 4e-6, 4e-6])
+        self.declare_parameter('track_update_threshold', 0.0005)
+        # pen heights measured while drawing under force control correct new
+        # onboard points by at most surface_max_correction (m); a contact is
+        # only recorded surface_sample_spacing (m) away from the last one
+        self.declare_parameter('surface_model', True)
+        self.declare_parameter('surface_max_correction', 0.005)
+        self.declare_parameter('surface_sample_spacing', 0.002)
+        # where the tiles are on the board
+        self.declare_parameter('layout_file', default_layout_file())
+        # hand-eye samples recorded by the record_transform service
+        self.declare_parameter('handeye_file', default_sample_file())
+        self.declare_parameter('handeye_tag', 'tag56')
+        self.declare_parameter('handeye_result', default_result_file())
+
+        board_tags = self.get_parameter(
+            'board_tags').get_parameter_value().string_array_value
+        board_tag_offsets = self.get_parameter(
+            'board_tag_offsets').get_parameter_value().double_array_value
+        self.calibration_window = self.get_parameter(
+            'calibration_samples').get_parameter_value().integer_value
+        self.calibration_timeout = self.get_parameter(
+            'calibration_timeout').get_parameter_value().double_value
+        self.calibration_file = self.get_parameter(
+            'calibration_file').get_parameter_value().string_value
+        self.calibration_tolerance = self.get_parameter(
+            'calibration_tolerance').get_parameter_value().double_value
+        self.verify_window = self.get_parameter(
+            'verify_samples').get_parameter_value().integer_value
+        self.verify_timeout = self.get_parameter(
+            'verify_timeout').get_parameter_value().double_value
+        self.track_board = self.get_parameter(
+            'track_board').get_parameter_value().bool_value
+        self.track_drift = self.get_parameter(
+            'track_drift').get_parameter_value().double_array_value
+        self.track_detection_noise = self.get_parameter(
+            'track_detection_noise').get_parameter_value().double_array_value
+        self.track_update_threshold = self.get_parameter(
+            'track_update_threshold').get_parameter_value().double_value
+        self.surface_model = self.get_parameter(
+            'surface_model').get_parameter_value().bool_value
+        self.surface_max_correction = self.get_parameter(
+            'surface_max_correction').get_parameter_value().double_value
+        self.surface_sample_spacing = self.get_parameter(
+            'surface_sample_spacing').get_parameter_value().double_value
+        self.handeye_file = self.get_parameter(
+            'handeye_file').get_parameter_value().string_value
+        self.handeye_tag = self.get_parameter(
+            'handeye_tag').get_parameter_value().string_value
+        self.handeye_result = self.get_parameter(
+            'handeye_result').get_parameter_value().string_value
+
+        # tag -> board transform of every board tag
+        self.board_tags = {}
+        for i, frame in enumerate(board_tags):
+            Ttb = np.eye(4)
+            Ttb[:2, 3] = board_tag_offsets[2 * i:2 * i + 2]
+            self.board_tags[frame] = Ttb
+
         self.freq = 100.0
         self.buffer = Buffer()
         self.listener = TransformListener(self.buffer, self)
+        # lookups of the pen are keyed by the joint state stamp, see arm_stamp
+        self.tf_cache = TransformCache(self, self.buffer)
 
-        self.file_path_A = 'A.csv'
-        self.file_path_B = 'B.csv'
-        self.grid = Grid((0, .8), (0, .40), .1)
+        self.layout = BoardLayout.from_file(self.get_parameter(
+            'layout_file').get_parameter_value().string_value)
         self.path_planner = Path_Plan_Execute(self)
         self.state = State.OTHER
         self.execute_trajectory_status_callback_group = MutuallyExclusiveCallbackGroup()
@@ -97,17 +155,28 @@ class Tags(Node):
         # creating services
         self.record_service = self.create_service(
             Empty, 'record_transform', self.record_callback)
+        self.solve_hand_eye_service = self.create_service(
+            Empty, 'solve_hand_eye', self.solve_hand_eye_callback)
         self.calibrate_service = self.create_service(
             Empty, 'calibrate', self.calibrate_callback, callback_group=self.calibrate_callback_grp)
         self.where_to_write = self.create_service(
             BoardTiles, 'where_to_write', self.where_to_write_callback)
+        self.where_to_write_batch = self.create_service(
+            BoardTilesBatch, 'where_to_write_batch', self.where_to_write_batch_callback)
         self.update_trajectory = self.create_service(
             UpdateTrajectory, 'update_trajectory', self.update_trajectory_callback)
 
         # create publishers
         self.state_publisher = self.create_publisher(String, 'cal_state', 10)
+        # latched, so planners started later still learn the current epoch
+        self.epoch_publisher = self.create_publisher(
+            Int64, 'calibration_epoch',
+            QoSProfile(depth=1, durability=DurabilityPolicy.TRANSIENT_LOCAL))
 
         # create subscribers
+        # the executor reports when the pen is held on the board by force control
+        self.pen_contact_sub = self.create_subscription(
+            Bool, 'pen_contact', self.pen_contact_callback, 10)
         # self.goal_reach_sub = self.create_subscription(
         #     String, 'execute_trajectory_status', self.goal_reach_sub_callback, 10, callback_group=self.execute_trajectory_status_callback_group)
         self.goal_state = "not"
@@ -116,29 +185,64 @@ class Tags(Node):
         self.move_js_client = self.create_client(
             MovePose, 'moveit_mp', callback_group=self.move_js_callback_group)
 
+        # camera and board frames are static and only change on
+        # calibration, the point frame is sent when where_to_write moves it
+        self.transforms = TransformPublisher(self, rebroadcast_static=("board",))
+
         # making static transform
-        self.tf_static_broadcaster = StaticTransformBroadcaster(self)
         self.make_transform()
 
         # making broadcast between board and robot
-        self.broadcaster = TransformBroadcaster(self)
         self.robot_board = TransformStamped()
         self.robot_board.header.frame_id = "panda_link0"
         self.robot_board.child_frame_id = "board"
         self.robot_board.transform.translation.z = -0.9
-        self.robot_board.header.stamp = self.get_clock().now().to_msg()
-        self.broadcaster.sendTransform(self.robot_board)
+        self.transforms.set_static(self.robot_board)
 
         self.robot_board_write = TransformStamped()
         self.robot_board_write.header.frame_id = "panda_link0"
         self.robot_board_write.child_frame_id = "point"
-        self.robot_board_write.header.stamp = self.get_clock().now().to_msg()
-
-        # Transform to save the robot to board transform
-        self.boardT = np.eye(4)
+        self.robot_board_write.transform.rotation.w = 1.0
+        self.transforms.set_dynamic(self.robot_board_write)
+
+        # Transform to save the robot to board transform. Every time it
+        # changes the calibration epoch goes up and the tile table, which
+        # holds the panda_link0 -> tile transform of every layout tile, is
+        # rebuilt. Epochs start from the wall clock, so planners that cache
+        # by epoch never confuse a restarted tags node with the last one.
+        self.calibration_epoch = int(time.time())
+        self.tile_table = {}
+        self.set_board_transform(np.eye(4))
+
+        # detection window filled by the timer while calibrating
+        self.calibration_samples = []
+        self.calibration_stamps = {}
+        self.collect_window = self.calibration_window
+        self.collect_timeout = self.calibration_timeout
+        self.collect_wait_for_one = True
+        self.calibration_start = self.get_clock().now()
+        self.calibration_future = rclpy.task.Future()
+
+        # heights of the pen measured while it is held on the board
+        self.surface = BoardSurface()
+
+        # board tracking, started by the first calibration
+        self.tracker = None
+        self.track_stamps = {}
+        self.track_time = None
+
+        # reuse the last calibration until a look at the board disagrees
+        self.stored_calibration = load_calibration(self.calibration_file)
+        if self.stored_calibration is not None:
+            age = time.time() - float(self.stored_calibration['stamp'])
+            self.get_logger().info(
+                f'loaded board calibration from {self.calibration_file}, '
+                f'{age / 3600.0:.1f} h old')
+            self.set_board_transform(self.stored_calibration['board'])
+            self.broadcast_board(self.boardT)
+            self.start_tracking(self.stored_calibration['variance'])
 
     # Create a new Future object.
-        self.future = rclpy.task.Future()
         self.future_satate = rclpy.task.Future()
         # wait for services
         while not self.move_js_client.wait_for_service(timeout_sec=1.0):
@@ -155,74 +259,114 @@ class Tags(Node):
     #     self.get_logger().info("subs")
 
     def make_transform(self):
+        """
+        Publish the static panda_hand_tcp -> camera_link transform.
 
+        Uses the solved hand-eye calibration if there is one, otherwise the
+        hand measured transform.
+        """
         self.robot_to_camera = TransformStamped()
         self.robot_to_camera.header.stamp = self.get_clock().now().to_msg()
         self.robot_to_camera.header.frame_id = "panda_hand_tcp"
         self.robot_to_camera.child_frame_id = "camera_link"
 
-        self.robot_to_camera.transform.translation = Vector3(
-            x=0.03524146, y=-0.015, z=-0.043029)
-        self.robot_to_camera.transform.rotation = Quaternion(
-            x=7.07106765e-01, y=1.44018704e-04, z=7.07106768e-01, w=-1.44018703e-04)
+        X = load_result(self.handeye_result)
+        if X is not None:
+            self.get_logger().info(f'using hand-eye calibration from {self.handeye_result}')
+            self.robot_to_camera.transform.translation, self.robot_to_camera.transform.rotation = \
+                self.matrix_to_position_quaternion(X)
+        else:
+            self.robot_to_camera.transform.translation = Vector3(
+                x=0.03524146, y=-0.015, z=-0.043029)
+            self.robot_to_camera.transform.rotation = Quaternion(
+                x=7.07106765e-01, y=1.44018704e-04, z=7.07106768e-01, w=-1.44018703e-04)
 
         # self.robot_to_camera.transform.translation = Vector3(x=0.011807788327606367, y=-0.2697480532095115, z=0.03157999806748111)
         # self.robot_to_camera.transform.rotation = Quaternion(x=-0.10948317052954765, y=-0.28408415419824595, z=0.2376708393954742, w=0.9224002389447412)
 
         # self.get_logger().info(type(self))
-        self.tf_static_broadcaster.sendTransform(self.robot_to_camera)
+        self.transforms.set_static(self.robot_to_camera)
 
     def matrix_to_position_quaternion(self, matrix, point=0):
         translation = matrix[:3, 3]
-        rotation_matrix = matrix[:3, :3]
 
-        # Convert rotation matrix to quaternion using tf2
-        quaternion = tf.quaternions.mat2quat(rotation_matrix)
+        # Convert rotation matrix to an (x, y, z, w) quaternion
+        quaternion = rotations_to_quaternions(matrix[:3, :3])
 
         # Create Vector3 for position
         if point == 0:
             position = Vector3()
         elif point == 1:
             position = Point()
-        position.x, position.y, position.z = translation
+        position.x, position.y, position.z = translation.tolist()
 
         # Create Quaternion for rotation
         rotation = Quaternion()
-        rotation.w, rotation.x, rotation.y, rotation.z = quaternion
+        rotation.x, rotation.y, rotation.z, rotation.w = quaternion.tolist()
 
         return position, rotation
 
-    def array_to_transform_matrix(self, translation, quaternion):
-        # Normalize the quaternion
-        quaternion /= np.linalg.norm(quaternion)
-        quaternion = [quaternion[3], quaternion[0],
-                      quaternion[1], quaternion[2]]
+    async def collect_detections(self, window, timeout, wait_for_one=True):
+        """
+        Collect a window of board estimates from the tag detections.
 
-        # Create rotation matrix from quaternion
-        rotation_matrix = tf.quaternions.quat2mat(quaternion)
+        Args:
+        ----
+        window (int): number of detections to collect
+        timeout (float): seconds to wait before settling for fewer
+        wait_for_one (bool): keep waiting past the timeout until there is
+            at least one detection
 
-        # Create the transformation matrix
-        transform_matrix = np.eye(4)
-        transform_matrix[:3, :3] = rotation_matrix
-        transform_matrix[:3, 3] = translation
+        Returns
+        -------
+        A list of (tag frame, 4x4 panda_link0 -> board transform) pairs.
 
-        return transform_matrix
+        """
+        self.calibration_samples = []
+        self.calibration_stamps = {}
+        self.collect_window = window
+        self.collect_timeout = timeout
+        self.collect_wait_for_one = wait_for_one
+        self.calibration_start = self.get_clock().now()
+        self.calibration_future = rclpy.task.Future()
+        self.goal_state = "done"
+        samples = await self.calibration_future
+        self.goal_state = "not"
+        return samples
 
-    def mean_transformation_matrices(self, matrices):
-        # Convert transformation matrices to exponential coordinates
-        exp_coords = [mr.se3ToVec(mr.MatrixLog6(matrix))
-                      for matrix in matrices]
-        print(exp_coords)
-        # Calculate the mean of exponential coordinates
-        mean_exp_coord = np.mean(exp_coords, axis=0)
+    async def verify_stored_calibration(self):
+        """
+        Check the stored calibration against a quick look from here.
+
+        Returns
+        -------
+        True if the board tags are visible from the current pose and agree
+        with the stored calibration within calibration_tolerance.
 
-        # Convert the mean exponential coordinate back to a transformation matrix
-        mean_matrix = mr.MatrixExp6(mr.VecTose3(mean_exp_coord))
-        return mean_matrix
+        """
+        samples = await self.collect_detections(
+            self.verify_window, self.verify_timeout, wait_for_one=False)
+        if not samples:
+            self.get_logger().info('no board tags visible, recalibrating')
+            return False
+
+        Trb, _, _, _ = board_estimate(np.array([Trb for _, Trb in samples]))
+        _, residual = twist_residuals(self.boardT, Trb[None], 0.1)
+        if residual[0] > self.calibration_tolerance:
+            self.get_logger().info(
+                f'board moved by {residual[0]:.4f} m, recalibrating')
+            return False
+
+        self.get_logger().info(
+            f'stored calibration verified, residual {residual[0]:.4f} m')
+        return True
 
     async def calibrate_callback(self, request, response):
         self.state = State.CALIBRATE
-        # ([], [])
+
+        if self.stored_calibration is not None and await self.verify_stored_calibration():
+            self.state = State.OTHER
+            return response
 
         goal_js = MovePose.Request()
         # goal_js.joint_names = ["panda_joint4", "panda_joint5", "panda_joint7"]
@@ -235,44 +379,34 @@ class Tags(Node):
         ##################### moving to the position####################
         self.get_logger().info('before moved')
         ans = await self.move_js_client.call_async(goal_js)
-        self.goal_state = "done"
         self.get_logger().info('moved')
-        # self.goal_state = await self.future_satate
 
         # 3when its done start doing calibrate sequence
-
-        ansT, ansR = await self.future
-        ansT1, ansT2 = ansT
-        ansR1, ansR2 = ansR
-        while ansT1[0] == 0.0 and ansT2[0]:
-            ansT, ansR = await self.future
-            ansT1, ansT2 = ansT
-            ansR1, ansR2 = ansR
-            # self.get_logger().info(f"{ansT, ansR}")
-            self.get_logger().info('value set in service')
-        # if ansT[0] != 0.0:
-        Tt1b = np.array([[1, 0, 0, 0.05],
-                        [0, 1, 0, 0.05],
-                        [0, 0, 1, 0],
-                        [0, 0, 0, 1]])
-        Tt2b = np.array([[1, 0, 0, 0.05],
-                        [0, 1, 0, -0.05],
-                        [0, 0, 1, 0],
-                        [0, 0, 0, 1]])
-        # Ttb = np.array([0.063,0.063,0,1])
-        Trt1 = self.array_to_transform_matrix(ansT1, ansR1)
-        Trt2 = self.array_to_transform_matrix(ansT2, ansR2)
-        Trb1 = Trt1 @ Tt1b
-        Trb2 = Trt2 @ Tt2b
-        Trb = self.mean_transformation_matrices([Trb1, Trb2])
-
-        self.boardT = Trb1
-        self.get_logger().info(f'Trb: \n{Trb1}')
-        pos, rotation = self.matrix_to_position_quaternion(Trb1)
-        self.get_logger().info(f'Trt: \n{Trt1}')
+        samples = await self.collect_detections(
+            self.calibration_window, self.calibration_timeout)
+
+        transforms = np.array([Trb for _, Trb in samples])
+        Trb, variance, inliers, residuals = board_estimate(transforms)
+        self.set_board_transform(Trb)
+
+        kept = {}
+        for (frame, _), inlier in zip(samples, inliers):
+            kept[frame] = kept.get(frame, 0) + int(inlier)
+        max_residual = residuals[inliers].max()
+        self.get_logger().info(
+            f'calibration: kept {int(inliers.sum())}/{len(samples)} detections '
+            f'{kept}, max residual {max_residual:.4f} m')
+        self.get_logger().info(
+            f'calibration variance (rad^2, m^2): {variance}')
         self.get_logger().info(f'Trb: \n{Trb}')
-        self.robot_board.transform.translation = pos
-        self.robot_board.transform.rotation = rotation
+
+        save_calibration(self.calibration_file, Trb, variance,
+                         max_residual, int(inliers.sum()))
+        self.stored_calibration = load_calibration(self.calibration_file)
+        self.start_tracking(variance)
+        self.surface.reset()
+
+        pos, rotation = self.broadcast_board(Trb)
 
         # pos, rotation = self.matrix_to_position_quaternion(Trb2)
         # self.get_logger().info(f'Trt: \n{Trt1}')
@@ -313,85 +447,193 @@ class Tags(Node):
         self.get_logger().info("calibrate")
         return response
 
-    async def where_to_write_callback(self, request, response):
-        self.get_logger().info("where_to_write1")
-        response_a = []
+    def broadcast_board(self, Trb):
+        """Point the broadcast board frame at a panda_link0 -> board transform."""
+        pos, rotation = self.matrix_to_position_quaternion(Trb)
+        self.robot_board.transform.translation = pos
+        self.robot_board.transform.rotation = rotation
+        self.transforms.set_static(self.robot_board)
+        return pos, rotation
+
+    def set_board_transform(self, Trb):
+        """
+        Store a new panda_link0 -> board transform.
+
+        Bumps the calibration epoch and rebuilds the tile table in one
+        batched composition, so where_to_write never has to go through the
+        layout at request time.
+        """
+        self.boardT = Trb
+        self.calibration_epoch += 1
+
+        self.tile_table = tile_table(self.layout, Trb)
+        self.epoch_publisher.publish(Int64(data=self.calibration_epoch))
+        self.get_logger().info(
+            f"calibration epoch {self.calibration_epoch}: "
+            f"{len(self.tile_table)} tiles")
+
+    def tile_transform(self, mode, position):
+        """Look up the panda_link0 -> tile transform of a layout tile."""
+        return self.tile_table[(mode, position)]
+
+    def board_poses(self, Trl, x, y, z):
+        """
+        Convert tile points into pen poses in the panda_link0 frame.
+
+        All points are stacked into one (N, 4, 4) batch, composed with the
+        tile transform in a single einsum and converted to quaternions in
+        bulk.
+
+        Args:
+        ----
+        Trl (np.array): 4x4 transform from panda_link0 to the tile, or an
+            (N, 4, 4) stack with the tile of every point
+        x, y, z (np.array): tile coordinates of the points
+
+        Returns
+        -------
+        Tra, poses: the (N, 4, 4) pen transforms and the matching Pose list
 
-        self.get_logger().info("where_to_write2")
+        """
+        Tla = transforms_from_points(PEN_ROTATION, np.column_stack((x, y, z)))
+        Tra = compose(Trl, Tla)
+        positions = Tra[:, :3, 3].tolist()
+        quaternions = rotations_to_quaternions(Tra[:, :3, :3]).tolist()
+        poses = [Pose(position=Point(x=p[0], y=p[1], z=p[2]),
+                      orientation=Quaternion(x=q[0], y=q[1], z=q[2], w=q[3]))
+                 for p, q in zip(positions, quaternions)]
+        return Tra, poses
+
+    def pen_heights(self, mode, position, x, y):
+        """
+        Height of the pen on the board at tile points.
+
+        Uses the learned board surface where there is one, kept within
+        surface_max_correction of the nominal 4 mm.
+        """
+        if not self.surface_model:
+            return np.full(len(x), 0.004)
+        origin = self.layout.tile_origin(mode, position)
+        heights = self.surface.height(origin[0] + np.asarray(x),
+                                      origin[1] + np.asarray(y), 0.004)
+        return np.clip(heights, 0.004 - self.surface_max_correction,
+                       0.004 + self.surface_max_correction)
+
+    async def where_to_write_callback(self, request, response):
+        self.get_logger().debug("where_to_write")
         # ansT, ansR = self.get_transform('panda_link0', 'board')
         # ansT = self.robot_board.transform.translation
         # ansR = self.robot_board.transform.rotation
         # self.get_logger().info(f'board : {ansT, ansR}')
         # Trb = self.array_to_transform_matrix(ansT, ansR)
-        Trb = self.boardT
-        lx, ly = self.grid.grid_to_world(request.mode, request.position)
-        Tbl = np.array([[1, 0, 0, lx * 0.667],
-                        [0, 1, 0, ly * 0.667],
-                        [0, 0, 1, 0],
-                        [0, 0, 0, 1]])
-        Trl = Trb @ Tbl
-
-        x, y = request.x[0], request.y[0]
-        z = 0.12
-
-        Tla = np.array([[-0.03948997,  0.99782373,  0.05280484, x],
-                        [0.06784999,  0.05540183, -0.99615612,  y],
-                        [-0.9969137, -0.03575537, -0.06989015,  z],
-                        [0.,        0.,        0.,         1.]]
-                       )
-        pos = Pose()
-        Tra = Trl @ Tla
-        position, rotation = self.matrix_to_position_quaternion(Tra, 1)
-        pos.position = position
-        pos.orientation = rotation
+        Trl = self.tile_transform(request.mode, request.position)
+
+        # the first pose hovers above the first point, the rest are the
+        # points themselves, on the board or lifted off it
+        x = np.concatenate(([request.x[0]], request.x))
+        y = np.concatenate(([request.y[0]], request.y))
+        z = np.concatenate(([0.12], np.where(request.onboard, self.pen_heights(
+            request.mode, request.position, request.x, request.y), 0.1)))
+        Tra, poses = self.board_poses(Trl, x, y, z)
+
         self.robot_board_write.transform.translation, self.robot_board_write.transform.rotation = self.matrix_to_position_quaternion(
-            Tra)
-
-        response.initial_pose = pos
-
-        for i in range(len(request.x)):
-            x, y = request.x[i], request.y[i]
-            self.get_logger().info(f"sanity check:  {x,y}")
-            self.get_logger().info(f'x,y : {x,y}')
-            z = 0.004 if request.onboard[i] else 0.1
-
-            # Tla = np.array([[0, 1, 0, x],
-            #                 [0.5,  0.0 ,        -0.8660254, y],
-            #                 [-0.8660254,  0.0  , -0.5, z],
-            #                 [0, 0, 0, 1]])
-
-            Tla = np.array([[-0.03948997,  0.99782373,  0.05280484, x],
-                            [0.06784999,  0.05540183, -0.99615612,  y],
-                            [-0.9969137, -0.03575537, -0.06989015,  z],
-                            [0.,        0.,        0.,         1.]]
-                           )
-            Tra = Trl @ Tla
-            position, rotation = self.matrix_to_position_quaternion(Tra, 1)
-            pos = Pose()
-            pos.position = position
-            pos.orientation = rotation
-
-            self.robot_board_write.transform.translation, self.robot_board_write.transform.rotation = self.matrix_to_position_quaternion(
-                Tra)
-            self.get_logger().info(f'pose is: {pos}')
-            response_a.append(pos)
-            self.get_logger().info(f'Now the list is: {response_a}')
-
-        self.get_logger().info("where_to_write3")
-        response.pose_list = response_a
+            Tra[-1])
+        self.transforms.set_dynamic(self.robot_board_write)
+
+        response.initial_pose = poses[0]
+        response.pose_list = poses[1:]
         response.use_force_control = request.onboard
-        # self.get_logger().info(f'{response.pose_list}')
         return response
 
-    def update_trajectory_callback(self, request, response):
+    async def where_to_write_batch_callback(self, request, response):
+        """
+        Answer where_to_write for every tile of a guess at once.
 
-        ansT, ansR = self.get_transform("board", "panda_hand_tcp")
+        The hover pose of each tile is inserted in front of its points, and
+        all points of all tiles go through board_poses as one batch, each
+        with the transform of its own tile. A request with a tile without
+        points is rejected with an empty response.
+        """
+        self.get_logger().debug("where_to_write_batch")
+        lengths = np.asarray(request.lengths, dtype=int)
+        if len(lengths) == 0:
+            return response
+        if np.any(lengths <= 0):
+            # an empty tile has no first point to hover above
+            self.get_logger().error(
+                f"where_to_write_batch: tiles without points, lengths {lengths.tolist()}")
+            return response
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        x = np.asarray(request.x)
+        y = np.asarray(request.y)
+        onboard = np.asarray(request.onboard, dtype=bool)
+
+        z = np.full(len(x), 0.1)
+        for mode, position, start, length in zip(request.modes, request.positions,
+                                                 starts, lengths):
+            points = slice(start, start + length)
+            z[points] = np.where(onboard[points], self.pen_heights(
+                mode, position, x[points], y[points]), 0.1)
+
+        # hover above the first point of every tile before its points
+        x = np.insert(x, starts, x[starts])
+        y = np.insert(y, starts, y[starts])
+        z = np.insert(z, starts, 0.12)
+        Trl = np.repeat([self.tile_transform(mode, position) for mode, position
+                         in zip(request.modes, request.positions)], lengths + 1, axis=0)
+        Tra, poses = self.board_poses(Trl, x, y, z)
+
+        self.robot_board_write.transform.translation, self.robot_board_write.transform.rotation = \
+            self.matrix_to_position_quaternion(Tra[-1])
+        self.transforms.set_dynamic(self.robot_board_write)
+
+        hover = starts + np.arange(len(starts))
+        is_hover = np.zeros(len(poses), dtype=bool)
+        is_hover[hover] = True
+        response.initial_poses = [poses[i] for i in hover]
+        response.pose_list = [pose for pose, h in zip(poses, is_hover) if not h]
+        response.use_force_control = onboard.tolist()
+        return response
 
-        # positive z is out of the board
-        if request.into_board:
-            z = ansT[2] + 0.0013
-        else:
-            z = ansT[2] - 0.002
+    def pen_on_board(self):
+        """
+        Measured position of the pen tip in the board frame.
+
+        Returns
+        -------
+        The x, y, z of panda_hand_tcp in the board frame, or None if the
+        transform is not available.
+
+        """
+        try:
+            # the board frame moves with the calibration epoch
+            stamp = self.arm_stamp()
+            key = None if stamp is None else (stamp, self.calibration_epoch)
+            transl = self.tf_cache.lookup(
+                "board", "panda_hand_tcp", key).transform.translation
+        except (tf2_ros.LookupException, tf2_ros.ConnectivityException,
+                tf2_ros.ExtrapolationException) as e:
+            self.get_logger().debug(f"no pen position: {e}")
+            return None
+        return transl.x, transl.y, transl.z
+
+    def pen_contact_callback(self, msg):
+        """Record the height of the pen while force control holds it on the board."""
+        if not msg.data:
+            return
+        pen = self.pen_on_board()
+        if pen is None:
+            return
+        if self.surface.samples and np.hypot(
+                pen[0] - self.surface.samples[-1][0],
+                pen[1] - self.surface.samples[-1][1]) < self.surface_sample_spacing:
+            return
+        self.surface.add(*pen)
+        self.get_logger().debug(
+            f"board surface: {len(self.surface.samples)} contacts, "
+            f"coefficients {self.surface.coefficients}")
+
+    def update_trajectory_callback(self, request, response):
 
         self.get_logger().info("reached update trajcetory callback")
 
@@ -402,9 +644,18 @@ class Tags(Node):
         Trans_arr = [pose.position.x, pose.position.y, pose.position.z]
         Rot_arr = [pose.orientation.x, pose.orientation.y,
                    pose.orientation.z, pose.orientation.w]
-        Tra = self.array_to_transform_matrix(Trans_arr, Rot_arr)
+        Tra = transforms_from_poses(Trans_arr, Rot_arr)
         Trb = self.boardT
-        Tba = mr.TransInv(Trb)@Tra
+        Tba = invert(Trb) @ Tra
+
+        # nudge from where the pen is, or from the planned height when the
+        # pen position is not known; positive z is out of the board
+        pen = self.pen_on_board()
+        height = Tba[2, 3] if pen is None else pen[2]
+        if request.into_board:
+            z = height + 0.0013
+        else:
+            z = height - 0.002
         # update = np.array([[1, 0, 0, 0],
         #                    [0, 1, 0, 0],
         #                    [0, 0, 1, z],
@@ -427,45 +678,150 @@ class Tags(Node):
         return response
 
     def record_callback(self, request, response):
-        At, Aq = self.get_transform('panda_link0', 'panda_hand_tcp')
-        # self.get_logger().info(f'Tba: {ans1}')
-        Bt, Bq = self.get_transform('camera_link', 'tag56')
-        # self.get_logger().info(f'Tca: {ans2}')
+        """Append the current (A, B) hand-eye sample to the sample log."""
+        # both halves of the sample from the tree of the same joint state
+        stamp = self.arm_stamp()
+        At, Aq = self.get_transform('panda_link0', 'panda_hand_tcp', stamp)
+        Bt, Bq = self.get_transform('camera_link', self.handeye_tag, stamp)
+        if not np.any(Aq) or not np.any(Bq):
+            self.get_logger().info('hand-eye sample not recorded, missing transform')
+            return response
+
+        A = transforms_from_poses(At, Aq)
+        B = transforms_from_poses(Bt, Bq)
+        stamp = self.get_clock().now().nanoseconds * 1e-9
+        append_sample(self.handeye_file, stamp, tag_id(self.handeye_tag), A, B)
+        self.get_logger().info(f'hand-eye sample recorded to {self.handeye_file}')
 
-        A = self.array_to_transform_matrix(At, Aq)
-        B = self.array_to_transform_matrix(Bt, Bq)
-        self.write_matrix_to_file(self.file_path_A, A)
-        self.write_matrix_to_file(self.file_path_B, B)
+        return response
 
+    def solve_hand_eye_callback(self, request, response):
+        """Solve the hand-eye calibration from every recorded sample and publish it."""
+        A, B, _, tags = load_samples(self.handeye_file)
+        try:
+            X, residuals = solve_hand_eye(A, B, tags)
+        except ValueError as e:
+            self.get_logger().info(f'hand-eye calibration failed: {e}')
+            return response
+
+        self.get_logger().info(
+            f'hand-eye calibration from {len(A)} samples, residual '
+            f'median {np.median(residuals):.4f} m, max {residuals.max():.4f} m')
+        self.get_logger().info(f'residual per sample: {np.round(residuals, 4)}')
+        self.get_logger().info(f'X: \n{X}')
+        save_result(self.handeye_result, X, residuals)
+        self.make_transform()
         return response
 
-    # Function to read matrices from a file
-    def read_matrices_from_file(self, file_path):
-        matrices = []
-        delimiter = '---'
+    def tag_detection(self, frame):
+        """
+        Get the latest detection of a tag in the panda_link0 frame.
+
+        Args:
+        ----
+            frame (string): name of the tag frame
 
-        with open(file_path, 'r') as file:
-            matrix_strings = file.read().split(delimiter)
+        Returns
+        -------
+            The stamp of the detection as (sec, nanosec) and the 4x4
+            panda_link0 -> tag transform, or None if the tag is not visible.
 
-            for matrix_string in matrix_strings:
-                if matrix_string.strip():
-                    matrix_lines = matrix_string.strip().split('\n')
-                    matrix_values = [
-                        list(map(float, line.strip().split(','))) for line in matrix_lines]
-                    matrices.append(np.array(matrix_values))
+        """
+        try:
+            trans = self.buffer.lookup_transform(
+                'panda_link0', frame, rclpy.time.Time())
+        except (tf2_ros.LookupException, tf2_ros.ConnectivityException,
+                tf2_ros.ExtrapolationException):
+            return None
+        transl = trans.transform.translation
+        rot = trans.transform.rotation
+        stamp = (trans.header.stamp.sec, trans.header.stamp.nanosec)
+        return stamp, transforms_from_poses(
+            [transl.x, transl.y, transl.z], [rot.x, rot.y, rot.z, rot.w])
+
+    def collect_board_detections(self):
+        """
+        Add new board tag detections to the calibration window.
+
+        Each detection is only used once, even though the timer runs faster
+        than the camera, and detections older than the window are ignored
+        so a board that has since moved is not mistaken for a verified
+        one. The window is handed back to collect_detections
+        once it is full, or once the timeout has passed (with at least one
+        detection, unless the caller said not to wait for one).
+        """
+        if self.calibration_future.done():
+            return
+
+        for frame, Ttb in self.board_tags.items():
+            detection = self.tag_detection(frame)
+            if detection is None:
+                continue
+            stamp, Trt = detection
+            # skip repeats, and detections buffered before the window opened
+            if self.calibration_stamps.get(frame) == stamp or \
+                    stamp < self.calibration_start.seconds_nanoseconds():
+                continue
+            self.calibration_stamps[frame] = stamp
+            self.calibration_samples.append((frame, Trt @ Ttb))
+
+        elapsed = (self.get_clock().now() -
+                   self.calibration_start).nanoseconds * 1e-9
+        timed_out = elapsed > self.collect_timeout and (
+            self.calibration_samples or not self.collect_wait_for_one)
+        if len(self.calibration_samples) >= self.collect_window or timed_out:
+            self.calibration_future.set_result(list(self.calibration_samples))
+
+    def start_tracking(self, variance):
+        """Restart board tracking from the current board transform."""
+        if not self.track_board:
+            return
+        self.tracker = BoardTracker(self.boardT, variance, self.track_drift,
+                                    self.track_detection_noise)
+        self.track_stamps = {}
+        self.track_time = None
+
+    def track_board_detections(self):
+        """
+        Fuse new board tag detections into the tracked board pose.
 
-        return matrices
+        The tile table is rebuilt and the board frame republished only when
+        the tracked pose has moved far enough from the one in use.
+        """
+        for frame, Ttb in self.board_tags.items():
+            detection = self.tag_detection(frame)
+            if detection is None or self.track_stamps.get(frame) == detection[0]:
+                continue
+            stamp, Trt = detection
+            self.track_stamps[frame] = stamp
+            now = stamp[0] + stamp[1] * 1e-9
+            if self.track_time is not None:
+                self.tracker.predict(max(now - self.track_time, 0.0))
+            self.track_time = now
+            if not self.tracker.update(Trt @ Ttb):
+                self.get_logger().debug(f'{frame} detection rejected by the board tracker')
+
+        _, moved = twist_residuals(self.boardT, self.tracker.board[None], 0.1)
+        if moved[0] > self.track_update_threshold:
+            self.get_logger().info(f'board tracked {moved[0]:.4f} m from the last update')
+            self.set_board_transform(self.tracker.board)
+            self.broadcast_board(self.boardT)
+
+    def arm_stamp(self):
+        """
+        Stamp of the joint state the arm frames in the tf tree were built from.
 
-    # Function to write matrices to a file
-    def write_matrix_to_file(self, file_path, matrix):
-        with open(file_path, 'a') as file:
-            for row in matrix:
-                file.write(','.join(map(str, row)) + '\n')
-            file.write('---\n')
+        Returns
+        -------
+        A (sec, nanosec) tuple, or None before the first joint state.
 
-    # File path for your file
+        """
+        stamp = self.path_planner.current_joint_state.header.stamp
+        if stamp.sec == 0 and stamp.nanosec == 0:
+            return None
+        return stamp.sec, stamp.nanosec
 
-    def get_transform(self, parent_frame, child_frame):
+    def get_transform(self, parent_frame, child_frame, key=None):
         """
         Try catch block for Listning transforms between parent and child frame.
 
@@ -473,6 +829,7 @@ class Tags(Node):
         ----
             parent_frame (string): name of parent frame
             child_frame (string): name of child frame
+            key (hashable): reuse the cached transform while this is unchanged
 
         Returns
         -------
@@ -480,9 +837,7 @@ class Tags(Node):
 
         """
         try:
-            trans = self.buffer.lookup_transform(
-                parent_frame, child_frame, rclpy.time.Time()
-            )
+            trans = self.tf_cache.lookup(parent_frame, child_frame, key)
             transl = trans.transform.translation
             rot = trans.transform.rotation
             brick_to_platform = [transl.x, transl.y, transl.z]
@@ -510,21 +865,15 @@ class Tags(Node):
 
         # self.get_logger().info("timmer function")
         if self.state == State.CALIBRATE and self.goal_state == "done":
-
-            # self.get_logger().info('function done')
-            ansT1, ansR1 = self.get_transform('panda_link0', 'tag11')
-            ansT2, ansR2 = self.get_transform('panda_link0', 'tag12')
-            # self.get_logger().info(f'{ansT, ansR}')
-            self.future.set_result([[ansT1, ansT2], [ansR1, ansR2]])
+            self.collect_board_detections()
+        elif self.state == State.OTHER and self.tracker is not None:
+            self.track_board_detections()
 
         # ansTi, ansRi = self.get_transform('board', 'panda_hand_tcp')
         # pls = self.array_to_transform_matrix(ansTi, ansRi)
         # self.get_logger().info(f'{pls}')
         # if self.state == State.OTHER:
-        self.robot_board.header.stamp = self.get_clock().now().to_msg()
-        self.robot_board_write.header.stamp = self.get_clock().now().to_msg()
-        self.broadcaster.sendTransform(self.robot_board)
-        self.broadcaster.sendTransform(self.robot_board_write)
+        self.transforms.tick()
 
 
 def Tags_entry(args=None):
@@ -0,0 +1,91 @@
+"""
+Memoised TF lookups for the drawing nodes.
+
+The control loops look up the same few frame pairs on every tick. A pair
+is served from a memo while the caller's key is unchanged: the stamp of
+the joint state the tree was built from for frames on the arm, the
+calibration epoch for the board. Lookups without a key are reused for
+max_age seconds.
+"""
+
+import rclpy.time
+
+
+class TransformCache:
+    """
+    Cache in front of a tf2 buffer.
+
+    Lookups that fail raise the same tf2_ros exceptions as the buffer, and
+    are never cached.
+    """
+
+    def __init__(self, node, buffer, max_age=0.0, report_period=60.0):
+        """
+        Create an empty cache.
+
+        Args:
+        ----
+        node (Node): node whose clock and logger are used
+        buffer (Buffer): the tf2 buffer to look transforms up in
+        max_age (float): seconds an unkeyed lookup is reused, 0 for never
+        report_period (float): seconds between hit rate reports, 0 for none
+
+        """
+        self.node = node
+        self.buffer = buffer
+        self.max_age = max_age
+        self.report_period = report_period
+        self.memo = {}
+        self.hits = 0
+        self.misses = 0
+        self.last_report = self.now()
+
+    def now(self):
+        """Node time in seconds."""
+        return self.node.get_clock().now().nanoseconds * 1e-9
+
+    def lookup(self, parent_frame, child_frame, key=None):
+        """
+        Latest parent_frame -> child_frame transform.
+
+        Args:
+        ----
+        parent_frame (string): name of parent frame
+        child_frame (string): name of child frame
+        key (hashable): the memo is reused while the key is the same, for
+            example the stamp of the current joint state
+
+        Returns
+        -------
+        The TransformStamped from the buffer.
+
+        """
+        pair = (parent_frame, child_frame)
+        now = self.now()
+        entry = self.memo.get(pair)
+        if entry is not None:
+            fetched, entry_key, transform = entry
+            if (entry_key == key) if key is not None else (now - fetched < self.max_age):
+                self.hits += 1
+                self.report(now)
+                return transform
+
+        self.misses += 1
+        transform = self.buffer.lookup_transform(
+            parent_frame, child_frame, rclpy.time.Time())
+        self.memo[pair] = (now, key, transform)
+        self.report(now)
+        return transform
+
+    def report(self, now):
+        """Log the hit rate every report_period seconds."""
+        if self.report_period <= 0.0 or now - self.last_report < self.report_period:
+            return
+        total = self.hits + self.misses
+        self.node.get_logger().info(
+            f'tf cache: {self.hits}/{total} hits '
+            f'({100.0 * self.hits / max(total, 1):.1f}%), '
+            f'{len(self.memo)} frame pairs')
+        self.hits = 0
+        self.misses = 0
+        self.last_report = now
@@ -0,0 +1,118 @@
+"""
+Transform publication for the tags node.
+
+Frames that only change on calibration go out on /tf_static, and frames
+that change while drawing are sent on /tf when they change plus a slow
+keepalive, instead of re-broadcasting everything from a 100 Hz timer.
+"""
+
+from rclpy.serialization import serialize_message
+from tf2_msgs.msg import TFMessage
+from tf2_ros import TransformBroadcaster
+from tf2_ros.static_transform_broadcaster import StaticTransformBroadcaster
+
+
+def transform_key(transform):
+    """Values of a TransformStamped that matter for change detection."""
+    t = transform.transform.translation
+    r = transform.transform.rotation
+    return (transform.header.frame_id, t.x, t.y, t.z, r.x, r.y, r.z, r.w)
+
+
+class TransformPublisher:
+    """
+    Send transforms only when they change.
+
+    Static transforms are held together and republished as one message
+    whenever any of them changes, because every /tf_static message
+    replaces the previous one from the same broadcaster. Dynamic transforms
+    are sent when they change and again every keepalive seconds.
+
+    tick is meant to be called from a timer at the old re-broadcast rate;
+    it sends the keepalives and counts the messages that rate would have
+    sent, so the saving can be reported.
+    """
+
+    def __init__(self, node, keepalive=1.0, report_period=60.0, rebroadcast_static=()):
+        """
+        Create the broadcasters.
+
+        Args:
+        ----
+        node (Node): the node that publishes the transforms
+        keepalive (float): seconds between resends of unchanged dynamic
+            transforms
+        report_period (float): seconds between bandwidth reports
+        rebroadcast_static (tuple): static frames that used to be
+            re-broadcast on /tf every tick, counted in the saving
+
+        """
+        self.node = node
+        self.keepalive = keepalive
+        self.report_period = report_period
+        self.rebroadcast_static = set(rebroadcast_static)
+        self.static_broadcaster = StaticTransformBroadcaster(node)
+        self.broadcaster = TransformBroadcaster(node)
+
+        self.static = {}
+        self.dynamic = {}
+        self.sent_key = {}
+        self.sent_time = {}
+
+        # /tf bytes that were sent, and that re-broadcasting every frame on
+        # every tick would have sent
+        self.sent_bytes = 0
+        self.rebroadcast_bytes = 0
+        self.message_bytes = {}
+        self.last_report = self.now()
+
+    def now(self):
+        """Node time in seconds."""
+        return self.node.get_clock().now().nanoseconds * 1e-9
+
+    def set_static(self, transform):
+        """Add or update a static transform and republish all of them."""
+        self.static[transform.child_frame_id] = transform
+        if transform.child_frame_id in self.rebroadcast_static:
+            self.message_bytes[transform.child_frame_id] = len(
+                serialize_message(TFMessage(transforms=[transform])))
+        stamp = self.node.get_clock().now().to_msg()
+        for static in self.static.values():
+            static.header.stamp = stamp
+        self.static_broadcaster.sendTransform(list(self.static.values()))
+
+    def set_dynamic(self, transform):
+        """Add or update a dynamic transform, sending it if it changed."""
+        frame = transform.child_frame_id
+        self.dynamic[frame] = transform
+        if self.sent_key.get(frame) != transform_key(transform):
+            self.send(frame)
+
+    def send(self, frame):
+        """Stamp and send one dynamic transform."""
+        transform = self.dynamic[frame]
+        transform.header.stamp = self.node.get_clock().now().to_msg()
+        self.broadcaster.sendTransform(transform)
+        size = len(serialize_message(TFMessage(transforms=[transform])))
+        self.message_bytes[frame] = size
+        self.sent_bytes += size
+        self.sent_key[frame] = transform_key(transform)
+        self.sent_time[frame] = self.now()
+
+    def tick(self):
+        """Send due keepalives and report the /tf bandwidth saved."""
+        now = self.now()
+        for frame in self.dynamic:
+            if now - self.sent_time.get(frame, 0.0) >= self.keepalive:
+                self.send(frame)
+        self.rebroadcast_bytes += sum(self.message_bytes.values())
+
+        if now - self.last_report >= self.report_period:
+            elapsed = now - self.last_report
+            saved = self.rebroadcast_bytes - self.sent_bytes
+            self.node.get_logger().info(
+                f'/tf: sent {self.sent_bytes / elapsed:.0f} B/s, saved '
+                f'{saved / elapsed:.0f} B/s against re-broadcasting every tick')
+            self.sent_bytes = 0
+            self.rebroadcast_bytes = 0
+            self.last_report = now
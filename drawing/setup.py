@@ -17,6 +17,7 @@ setup(
              'launch/image_proc.launch.py',
              'launch/ocr_game.launch.xml',
              'config/tag.yaml',
+             'config/layout.yaml',
              'config/view_camera.rviz',
              'launch/game_time.launch.xml'
          ]
@@ -0,0 +1,101 @@
+from drawing.calibration import board_estimate, BoardTracker, load_calibration, save_calibration
+from drawing.geometry import compose, invert, se3_exp, se3_log
+import numpy as np
+
+BOARD = se3_exp(np.array([0.1, -0.05, 1.5, 0.6, 0.1, -0.9]))
+
+
+def noisy_estimates(n, rotation_noise, translation_noise, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = np.hstack([rng.normal(scale=rotation_noise, size=(n, 3)),
+                       rng.normal(scale=translation_noise, size=(n, 3))])
+    return compose(BOARD, se3_exp(noise))
+
+
+def pose_error(board):
+    twist = se3_log(invert(BOARD) @ board)
+    return np.linalg.norm(twist[:3]), np.linalg.norm(twist[3:])
+
+
+def test_board_estimate_averages_noise():
+    transforms = noisy_estimates(200, 0.01, 0.001)
+    board, variance, inliers, residuals = board_estimate(transforms)
+    rotation, translation = pose_error(board)
+    assert rotation < 0.003
+    assert translation < 0.0003
+    assert inliers.mean() > 0.95
+    assert residuals.shape == (200,)
+    # about the variance of the noise that was added
+    np.testing.assert_allclose(variance[:3], 1e-4, rtol=0.5)
+    np.testing.assert_allclose(variance[3:], 1e-6, rtol=0.5)
+
+
+def test_board_estimate_rejects_outliers():
+    transforms = noisy_estimates(40, 0.002, 0.0005)
+    # a few misread tags, several centimetres and degrees off
+    outliers = compose(BOARD, se3_exp(np.array([
+        [0.2, 0.0, 0.0, 0.05, 0.0, 0.0],
+        [0.0, -0.3, 0.1, 0.0, 0.08, 0.0],
+        [0.0, 0.0, 0.0, 0.0, 0.0, -0.1]])))
+    board, _, inliers, _ = board_estimate(np.concatenate([transforms, outliers]))
+    assert not inliers[40:].any()
+    assert inliers[:40].all()
+    rotation, translation = pose_error(board)
+    assert rotation < 0.002
+    assert translation < 0.0005
+
+
+def test_board_estimate_of_identical_estimates():
+    board, variance, inliers, residuals = board_estimate(np.repeat(BOARD[None], 5, axis=0))
+    np.testing.assert_allclose(board, BOARD, atol=1e-12)
+    np.testing.assert_allclose(variance, 0.0, atol=1e-20)
+    assert inliers.all()
+    np.testing.assert_allclose(residuals, 0.0, atol=1e-12)
+
+
+def test_save_and_load_calibration(tmp_path):
+    path = str(tmp_path / 'calibration' / 'board.npz')
+    variance = np.array([1e-4, 1e-4, 1e-4, 1e-6, 1e-6, 1e-6])
+    save_calibration(path, BOARD, variance, 0.0015, 120)
+    calibration = load_calibration(path)
+    np.testing.assert_array_equal(calibration['board'], BOARD)
+    np.testing.assert_array_equal(calibration['variance'], variance)
+    assert float(calibration['max_residual']) == 0.0015
+    assert int(calibration['samples']) == 120
+    assert float(calibration['stamp']) > 0.0
+
+
+def test_load_missing_or_broken_calibration(tmp_path):
+    assert load_calibration(str(tmp_path / 'missing.npz')) is None
+    broken = tmp_path / 'broken.npz'
+    broken.write_bytes(b'not a calibration')
+    assert load_calibration(str(broken)) is None
+    wrong = str(tmp_path / 'wrong.npz')
+    np.savez(wrong, board=np.eye(3))
+    assert load_calibration(wrong) is None
+
+
+def test_tracker_converges_to_the_board():
+    start = compose(BOARD, se3_exp(np.array([0.0, 0.0, 0.01, 0.004, -0.003, 0.0])))
+    tracker = BoardTracker(start, [1e-4] * 3 + [1e-5] * 3, [1e-6] * 6,
+                           [1e-4] * 3 + [4e-6] * 3)
+    for measurement in noisy_estimates(100, 0.005, 0.001, seed=3):
+        tracker.predict(0.1)
+        assert tracker.update(measurement)
+    # it started 0.01 rad and 5 mm off
+    rotation, translation = pose_error(tracker.board)
+    assert rotation < 0.003
+    assert translation < 0.001
+    # the covariance stays symmetric and shrinks below the starting one
+    np.testing.assert_allclose(tracker.covariance, tracker.covariance.T, atol=1e-15)
+    assert np.all(np.diag(tracker.covariance) < [1e-4] * 3 + [1e-5] * 3)
+
+
+def test_tracker_gates_outliers():
+    tracker = BoardTracker(BOARD, [1e-6] * 6, [1e-8] * 6, [1e-4] * 3 + [4e-6] * 3)
+    covariance = tracker.covariance.copy()
+    # a detection 5 cm away
+    far = compose(BOARD, se3_exp(np.array([0.0, 0.0, 0.0, 0.05, 0.0, 0.0])))
+    assert not tracker.update(far)
+    np.testing.assert_array_equal(tracker.board, BOARD)
+    np.testing.assert_array_equal(tracker.covariance, covariance)
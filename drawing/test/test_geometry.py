@@ -0,0 +1,137 @@
+from drawing.geometry import (compose, hat, invert, rotations_to_quaternions, se3_exp, se3_log,
+                              se3_mean, so3_exp, so3_log, transforms_from_points)
+import numpy as np
+
+
+def random_rotations(n, seed=0):
+    # QR of a Gaussian matrix, with the signs fixed so the result is a rotation
+    rng = np.random.default_rng(seed)
+    q, r = np.linalg.qr(rng.normal(size=(n, 3, 3)))
+    q *= np.sign(np.diagonal(r, axis1=-2, axis2=-1))[:, None, :]
+    q[np.linalg.det(q) < 0, :, 0] *= -1.0
+    return q
+
+
+def random_twists(n, seed=0, angle=np.pi):
+    rng = np.random.default_rng(seed)
+    axes = rng.normal(size=(n, 3))
+    axes /= np.linalg.norm(axes, axis=1, keepdims=True)
+    angles = rng.uniform(0.0, angle, n)
+    return np.hstack([axes * angles[:, None], rng.normal(scale=0.5, size=(n, 3))])
+
+
+def rotation_of(q):
+    x, y, z, w = q
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]])
+
+
+def test_rotations_to_quaternions():
+    rotations = random_rotations(200)
+    quaternions = rotations_to_quaternions(rotations)
+    assert quaternions.shape == (200, 4)
+    np.testing.assert_allclose(np.linalg.norm(quaternions, axis=1), 1.0)
+    assert np.all(quaternions[:, 3] >= 0.0)
+    for rotation, q in zip(rotations, quaternions):
+        np.testing.assert_allclose(rotation_of(q), rotation, atol=1e-12)
+
+
+def test_rotations_to_quaternions_every_branch():
+    # identity, and half turns about x, y and z pick the four formulas
+    rotations = np.array([np.eye(3), np.diag([1.0, -1.0, -1.0]),
+                          np.diag([-1.0, 1.0, -1.0]), np.diag([-1.0, -1.0, 1.0])])
+    np.testing.assert_allclose(rotations_to_quaternions(rotations), np.array([
+        [0, 0, 0, 1], [1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]]), atol=1e-12)
+    # a single matrix keeps its shape
+    assert rotations_to_quaternions(np.eye(3)).shape == (4,)
+
+
+def test_transforms_from_points_and_compose():
+    rotation = random_rotations(1)[0]
+    points = np.arange(12.0).reshape(4, 3)
+    transforms = transforms_from_points(rotation, points)
+    assert transforms.shape == (4, 4, 4)
+    np.testing.assert_array_equal(transforms[:, :3, 3], points)
+    np.testing.assert_array_equal(transforms[:, :3, :3], np.broadcast_to(rotation, (4, 3, 3)))
+    np.testing.assert_array_equal(transforms[:, 3], np.broadcast_to([0, 0, 0, 1], (4, 4)))
+
+    a = transforms
+    b = transforms[::-1]
+    np.testing.assert_allclose(compose(a, b), a @ b)
+    np.testing.assert_allclose(compose(a[0], b), a[0] @ b)
+
+
+def test_hat():
+    w = np.array([1.0, 2.0, 3.0])
+    v = np.array([-0.5, 0.25, 2.0])
+    np.testing.assert_allclose(hat(w) @ v, np.cross(w, v))
+
+
+def test_invert():
+    transforms = se3_exp(random_twists(50))
+    np.testing.assert_allclose(compose(invert(transforms), transforms),
+                               np.broadcast_to(np.eye(4), (50, 4, 4)), atol=1e-12)
+
+
+def test_so3_exp_log_round_trip():
+    w = random_twists(500, angle=np.pi - 1e-6)[:, :3]
+    rotations = so3_exp(w)
+    np.testing.assert_allclose(rotations @ np.swapaxes(rotations, -1, -2),
+                               np.broadcast_to(np.eye(3), (500, 3, 3)), atol=1e-12)
+    np.testing.assert_allclose(np.linalg.det(rotations), 1.0)
+    np.testing.assert_allclose(so3_log(rotations), w, atol=1e-6)
+
+
+def test_so3_log_near_pi():
+    for axis in np.eye(3).tolist() + [[1.0, 1.0, 0.0], [1.0, -2.0, 3.0]]:
+        axis = np.array(axis) / np.linalg.norm(axis)
+        for angle in (np.pi, np.pi - 1e-4, np.pi - 1e-2):
+            rotation = so3_exp(axis * angle)
+            np.testing.assert_allclose(so3_exp(so3_log(rotation)), rotation, atol=1e-9)
+
+
+def test_se3_exp_log_round_trip():
+    twists = random_twists(500, angle=3.0)
+    transforms = se3_exp(twists)
+    np.testing.assert_allclose(se3_log(transforms), twists, atol=1e-9)
+    np.testing.assert_allclose(se3_exp(se3_log(transforms)), transforms, atol=1e-12)
+
+
+def test_se3_small_twists():
+    twists = np.array([[0, 0, 0, 1, 2, 3], [1e-6, 0, 0, 0, 0, 0], [1e-9, 2e-9, 0, 0, 1e-3, 0]])
+    transforms = se3_exp(twists)
+    np.testing.assert_allclose(transforms[0, :3, 3], [1, 2, 3])
+    np.testing.assert_allclose(se3_log(transforms), twists, atol=1e-15)
+
+
+def test_se3_exp_matches_matrix_exponential():
+    # compare with the series of the 4x4 twist matrix
+    twist = np.array([0.3, -0.2, 0.5, 0.1, 0.4, -0.3])
+    matrix = np.zeros((4, 4))
+    matrix[:3, :3] = hat(twist[:3])
+    matrix[:3, 3] = twist[3:]
+    expected = np.eye(4)
+    term = np.eye(4)
+    for k in range(1, 30):
+        term = term @ matrix / k
+        expected = expected + term
+    np.testing.assert_allclose(se3_exp(twist), expected, atol=1e-12)
+
+
+def test_se3_mean():
+    center = se3_exp(np.array([0.2, -0.1, 0.3, 0.5, 0.1, 0.9]))
+    offsets = random_twists(20, seed=1, angle=0.05) * [1, 1, 1, 0.01, 0.01, 0.01]
+    # symmetric offsets around the center average out exactly
+    transforms = compose(center, se3_exp(np.vstack([offsets, -offsets])))
+    mean = se3_mean(transforms)
+    residual = se3_log(invert(mean) @ center)
+    assert np.linalg.norm(residual) < 1e-3
+    # the mean is a fixed point: the twists from it average to zero
+    twists = se3_log(compose(invert(mean), transforms))
+    np.testing.assert_allclose(twists.mean(axis=0), 0.0, atol=1e-9)
+
+    weights = np.zeros(40)
+    weights[3] = 1.0
+    np.testing.assert_allclose(se3_mean(transforms, weights), transforms[3], atol=1e-9)
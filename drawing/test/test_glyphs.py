@@ -0,0 +1,146 @@
+from math import comb
+
+from drawing.glyphs import (bezier_points, CLOSEPOLY, CURVE3, CURVE4, flatten_path, glyph_key,
+                            GlyphStore, join_strokes, LINETO, MOVETO, split_strokes)
+import numpy as np
+import pytest
+
+FAMILY = 'DejaVu Sans'
+
+
+def bezier(ctrl, t):
+    degree = len(ctrl) - 1
+    t = np.asarray(t)[:, None]
+    return sum(comb(degree, i) * t**i * (1 - t)**(degree - i) * ctrl[i]
+               for i in range(degree + 1))
+
+
+def chord_error(ctrl, points):
+    """Largest distance of the curve from the polyline through points."""
+    polyline = np.vstack([ctrl[:1], points])
+    curve = bezier(ctrl, np.linspace(0, 1, 2001))
+    error = np.full(len(curve), np.inf)
+    for a, b in zip(polyline[:-1], polyline[1:]):
+        ab = b - a
+        t = np.clip((curve - a) @ ab / max(ab @ ab, 1e-300), 0, 1)
+        error = np.minimum(error, np.linalg.norm(curve - a - t[:, None] * ab, axis=1))
+    return error.max()
+
+
+def test_glyph_key_has_no_path_separators():
+    key = glyph_key(FAMILY, 0.001, 1.0, 0.0005, '/')
+    assert '/' not in key
+    assert key != glyph_key(FAMILY, 0.001, 1.0, 0.0005, 'a')
+    assert key != glyph_key(FAMILY, 0.001, 2.0, 0.0005, '/')
+
+
+def test_join_and_split_strokes():
+    strokes = [np.array([[0.0, 0.0], [1.0, 0.0]]), np.array([[2.0, 2.0]]),
+               np.array([[3.0, 3.0], [4.0, 4.0], [5.0, 5.0]])]
+    points = join_strokes(strokes)
+    assert points.shape == (8, 2)
+    assert np.isnan(points[[2, 4]]).all()
+    split = split_strokes(points)
+    assert len(split) == 3
+    for a, b in zip(split, strokes):
+        np.testing.assert_array_equal(a, b)
+    assert join_strokes([]).shape == (0, 2)
+    assert split_strokes(join_strokes([])) == []
+
+
+def test_store_generates_once_and_reloads(tmp_path):
+    pytest.importorskip('matplotlib')
+    path = str(tmp_path / 'glyphs.npz')
+    store = GlyphStore(path)
+    strokes = store.strokes(FAMILY, 0.001, 1.0, 0.0005, 'o')
+    assert (store.hits, store.misses) == (0, 1)
+    # an o is two closed contours
+    assert len(strokes) == 2
+    for stroke in strokes:
+        np.testing.assert_allclose(stroke[0], stroke[-1], atol=1e-6)
+    store.strokes(FAMILY, 0.001, 1.0, 0.0005, 'o')
+    assert (store.hits, store.misses) == (1, 1)
+    store.save()
+
+    reloaded = GlyphStore(path)
+    for a, b in zip(reloaded.strokes(FAMILY, 0.001, 1.0, 0.0005, 'o'), strokes):
+        np.testing.assert_array_equal(a, b)
+    assert (reloaded.hits, reloaded.misses) == (1, 0)
+
+
+def test_store_scales_glyphs(tmp_path):
+    pytest.importorskip('matplotlib')
+    store = GlyphStore(str(tmp_path / 'glyphs.npz'))
+    small = store.strokes(FAMILY, 0.001, 1.0, 0.0005, 'l')
+    large = store.strokes(FAMILY, 0.001, 2.0, 0.0005, 'l')
+    np.testing.assert_allclose(np.ptp(np.vstack(large), axis=0),
+                               2.0 * np.ptp(np.vstack(small), axis=0), rtol=1e-5)
+
+
+def test_two_stores_saving_to_one_file(tmp_path):
+    pytest.importorskip('matplotlib')
+    path = str(tmp_path / 'glyphs.npz')
+    # both nodes start before either has saved
+    brain = GlyphStore(path)
+    hangman = GlyphStore(path)
+    o = brain.strokes(FAMILY, 0.001, 1.0, 0.0005, 'o')
+    x = hangman.strokes(FAMILY, 0.001, 1.0, 0.0005, 'x')
+    brain.save()
+    hangman.save()
+    assert [p.name for p in tmp_path.iterdir()] == ['glyphs.npz']
+
+    reloaded = GlyphStore(path)
+    for letter, strokes in (('o', o), ('x', x)):
+        for a, b in zip(reloaded.strokes(FAMILY, 0.001, 1.0, 0.0005, letter), strokes):
+            np.testing.assert_array_equal(a, b)
+    assert (reloaded.hits, reloaded.misses) == (2, 0)
+
+
+def test_missing_or_corrupt_archive(tmp_path):
+    path = tmp_path / 'glyphs.npz'
+    path.write_bytes(b'not an archive')
+    store = GlyphStore(str(path))
+    store.open()
+    assert store.archive is None
+    # nothing new, so nothing is written
+    store.save()
+    assert path.read_bytes() == b'not an archive'
+
+
+@pytest.mark.parametrize('ctrl', [
+    [[0, 0], [1, 2], [2, 0]],
+    [[0, 0], [0, 1], [1, 1], [1, 0]],
+    [[0, 0], [3, 1], [-2, 1], [1, 0]],
+])
+@pytest.mark.parametrize('tolerance', [0.1, 0.01, 0.001])
+def test_bezier_points_within_tolerance(ctrl, tolerance):
+    ctrl = np.array(ctrl, dtype=float)
+    points = bezier_points(ctrl, tolerance)
+    np.testing.assert_allclose(points[-1], ctrl[-1])
+    assert chord_error(ctrl, points) <= tolerance
+
+
+def test_bezier_points_of_a_flat_curve():
+    ctrl = np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0], [3.0, 0.0]])
+    np.testing.assert_allclose(bezier_points(ctrl, 0.001), [[3.0, 0.0]])
+
+
+def test_flatten_path_uses_codes():
+    verts = np.array([[0, 0], [1, 0], [1, 1], [0, 0],
+                      [5, 5], [6, 5], [6, 6], [0, 0]], dtype=float)
+    codes = np.array([MOVETO, LINETO, LINETO, CLOSEPOLY,
+                      MOVETO, CURVE3, CURVE3, LINETO])
+    square, curve = flatten_path(verts, codes, 0.01)
+    # the CLOSEPOLY vertex is dropped and the subpath closes onto its start
+    np.testing.assert_array_equal(square, [[0, 0], [1, 0], [1, 1], [0, 0]])
+    np.testing.assert_array_equal(curve[0], [5, 5])
+    np.testing.assert_allclose(curve[-2], [6, 6])
+    np.testing.assert_array_equal(curve[-1], [0, 0])
+    assert len(curve) > 4
+
+
+def test_flatten_path_cubic():
+    verts = np.array([[0, 0], [0, 1], [1, 1], [1, 0]], dtype=float)
+    codes = np.array([MOVETO, CURVE4, CURVE4, CURVE4])
+    (points,) = flatten_path(verts, codes, 0.001)
+    assert chord_error(verts, points[1:]) <= 0.001
@@ -0,0 +1,99 @@
+from drawing.geometry import compose, invert, se3_exp, se3_log
+from drawing.handeye import (append_sample, load_result, load_samples, save_result,
+                             solve_hand_eye, tag_id)
+import numpy as np
+import pytest
+
+# panda_hand_tcp -> camera_link
+X = se3_exp(np.array([0.3, -1.2, 0.4, 0.05, -0.02, 0.08]))
+
+
+def random_transforms(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return se3_exp(np.hstack([rng.uniform(-1.0, 1.0, (n, 3)), rng.uniform(-0.5, 0.5, (n, 3))]))
+
+
+def test_tag_id():
+    assert tag_id('tag56') == 56
+    assert tag_id('tag36h11:3') == 36113
+    assert tag_id('board') == -1
+
+
+def test_append_and_load_samples(tmp_path):
+    path = str(tmp_path / 'samples' / 'handeye.bin')
+    A = random_transforms(5, seed=1)
+    B = random_transforms(5, seed=2)
+    tags = [56, 57, 56, 56, 57]
+    for i in range(5):
+        append_sample(path, 100.0 + i, tags[i], A[i], B[i])
+
+    loaded_A, loaded_B, stamps, loaded_tags = load_samples(path)
+    np.testing.assert_array_equal(loaded_A, A)
+    np.testing.assert_array_equal(loaded_B, B)
+    np.testing.assert_array_equal(stamps, 100.0 + np.arange(5))
+    np.testing.assert_array_equal(loaded_tags, tags)
+
+    loaded_A, _, stamps, loaded_tags = load_samples(path, tag=57)
+    np.testing.assert_array_equal(loaded_A, A[[1, 4]])
+    np.testing.assert_array_equal(stamps, [101.0, 104.0])
+    assert (loaded_tags == 57).all()
+
+
+def test_load_ignores_a_cut_record(tmp_path):
+    path = tmp_path / 'handeye.bin'
+    A = random_transforms(2)
+    append_sample(str(path), 1.0, 56, A[0], A[1])
+    with open(path, 'ab') as file:
+        file.write(b'\0' * 100)
+    loaded_A, _, _, _ = load_samples(str(path))
+    assert loaded_A.shape == (1, 4, 4)
+
+
+def test_load_without_samples(tmp_path):
+    A, B, stamps, tags = load_samples(str(tmp_path / 'missing.bin'))
+    assert A.shape == (0, 4, 4) and B.shape == (0, 4, 4)
+    assert len(stamps) == 0 and len(tags) == 0
+
+
+def synthetic_samples(n, tag_poses, noise=0.0, seed=0):
+    """Make robot poses A and the camera's view B of fixed tags, for a known X."""
+    rng = np.random.default_rng(seed)
+    A = random_transforms(n, seed=seed + 1)
+    tags = rng.integers(len(tag_poses), size=n)
+    # panda_link0 -> tag = A X B, so B = inv(A X) T
+    B = compose(invert(compose(A, X)), tag_poses[tags])
+    if noise:
+        B = compose(B, se3_exp(rng.normal(scale=noise, size=(n, 6))))
+    return A, B, tags
+
+
+def test_solve_hand_eye_recovers_x():
+    tag_poses = random_transforms(1, seed=10)
+    A, B, _ = synthetic_samples(10, tag_poses)
+    solved, residuals = solve_hand_eye(A, B)
+    np.testing.assert_allclose(solved, X, atol=1e-9)
+    np.testing.assert_allclose(residuals, 0.0, atol=1e-9)
+
+
+def test_solve_hand_eye_with_several_tags_and_noise():
+    tag_poses = random_transforms(3, seed=11)
+    A, B, tags = synthetic_samples(60, tag_poses, noise=1e-4)
+    solved, residuals = solve_hand_eye(A, B, tags)
+    error = se3_log(invert(X) @ solved)
+    assert np.linalg.norm(error[:3]) < 1e-3
+    assert np.linalg.norm(error[3:]) < 1e-3
+    assert residuals.shape == (60,)
+    assert residuals.max() < 0.005
+
+
+def test_solve_hand_eye_needs_three_samples():
+    A, B, _ = synthetic_samples(2, random_transforms(1, seed=12))
+    with pytest.raises(ValueError):
+        solve_hand_eye(A, B)
+
+
+def test_save_and_load_result(tmp_path):
+    path = str(tmp_path / 'hand_eye.npz')
+    save_result(path, X, np.zeros(4))
+    np.testing.assert_array_equal(load_result(path), X)
+    assert load_result(str(tmp_path / 'missing.npz')) is None
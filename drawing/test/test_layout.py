@@ -0,0 +1,89 @@
+import os
+
+from drawing.geometry import se3_exp
+from drawing.layout import BoardLayout, MAN, STAND, tile_table, WORD, WRONG
+import numpy as np
+import pytest
+
+LAYOUT_FILE = os.path.join(os.path.dirname(__file__), '..', 'config', 'layout.yaml')
+
+
+def grid_to_world(mode, position, cell_size=0.1):
+    """Place a tile the way the old Grid class did, as [x, y]."""
+    if mode in (0, 1):
+        row, column = 2 * mode, position + 2
+    elif mode == 2:
+        row, column = [(2, 1), (1, 1), (1, 0), (0, 0), (0, 1)][position]
+    else:
+        row, column = 3, 0
+    x = column * cell_size
+    if mode in (0, 1):
+        x += 0.1 * position
+    return [x, row * cell_size]
+
+
+@pytest.mark.parametrize('layout', [BoardLayout(), BoardLayout.from_file(LAYOUT_FILE)])
+def test_layout_matches_the_old_grid(layout):
+    tiles = [(mode, position) for mode in (0, 1, 2) for position in range(5)] + [(3, 0)]
+    assert sorted(layout.tiles()) == tiles
+    for mode, position in tiles:
+        np.testing.assert_allclose(layout.tile_origin(mode, position),
+                                   np.array(grid_to_world(mode, position)) * 0.667,
+                                   atol=1e-12)
+
+
+def test_modes():
+    layout = BoardLayout()
+    assert (WRONG, WORD, MAN, STAND) == (0, 1, 2, 3)
+    assert layout.word_length == 5 and layout.wrong_guesses == 5 and layout.man_parts == 5
+
+
+def test_longer_word():
+    layout = BoardLayout(board_size=(1.2, 0.4), word_length=8, letter_step=1)
+    np.testing.assert_allclose(layout.tile_origin(WORD, 7), [0.9 * 0.667, 0.2 * 0.667])
+    with pytest.raises(KeyError):
+        layout.tile_origin(WORD, 8)
+
+
+def test_tiles_off_the_board():
+    with pytest.raises(ValueError):
+        BoardLayout(word_length=8)
+    with pytest.raises(ValueError):
+        BoardLayout(stand_cell=(-1, 0))
+
+
+def test_empty_file_gives_the_default_layout(tmp_path):
+    path = tmp_path / 'layout.yaml'
+    path.write_text('')
+    layout = BoardLayout.from_file(str(path))
+    assert layout.tiles() == BoardLayout().tiles()
+
+
+def old_tile_transform(layout, Trb, mode, position):
+    """Compose a tile transform the way where_to_write did on every request."""
+    lx, ly = layout.tile_origin(mode, position)
+    Tbl = np.array([[1, 0, 0, lx],
+                    [0, 1, 0, ly],
+                    [0, 0, 1, 0],
+                    [0, 0, 0, 1]])
+    return Trb @ Tbl
+
+
+def test_tile_table_matches_per_request_transforms():
+    layout = BoardLayout()
+    for Trb in (np.eye(4), se3_exp(np.array([0.1, -0.3, 1.2, 0.4, 0.05, 0.02]))):
+        table = tile_table(layout, Trb)
+        assert sorted(table) == sorted(layout.tiles())
+        for tile, Trl in table.items():
+            np.testing.assert_allclose(Trl, old_tile_transform(layout, Trb, *tile), atol=1e-15)
+
+
+def test_tile_table_follows_the_board():
+    layout = BoardLayout()
+    before = tile_table(layout, np.eye(4))
+    # a recalibration moves the board 2 cm along x
+    board = np.eye(4)
+    board[0, 3] = 0.02
+    after = tile_table(layout, board)
+    for tile in layout.tiles():
+        np.testing.assert_allclose(after[tile][:3, 3], before[tile][:3, 3] + [0.02, 0, 0])
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from drawing.plan_ahead import discard_reason, queue_changed
+
+
+def poses(n):
+    return [SimpleNamespace(position=SimpleNamespace(x=0.1 * k, y=0.0, z=0.1)) for k in range(n)]
+
+
+def test_plan_for_the_front_of_the_queue():
+    queue = poses(5)
+    assert not queue_changed(queue[:3], 0.1, queue, [0.1] * 5)
+    assert not queue_changed(queue, 0.1, queue, [0.1] * 5)
+
+
+def test_queue_changed():
+    queue = poses(5)
+    # the rest of a stopped stroke was queued in front
+    assert queue_changed(queue[:3], 0.1, poses(2) + queue, [0.1] * 7)
+    # equal poses that are not the ones that were planned
+    assert queue_changed(queue[:3], 0.1, poses(5), [0.1] * 5)
+    assert queue_changed(queue[:3], 0.1, queue[:2], [0.1] * 2)
+    assert queue_changed(queue[:3], 0.1, [], [])
+    assert queue_changed(queue[:3], 0.1, queue, [0.2] * 5)
+
+
+def test_discard_reason():
+    queue = poses(4)
+    assert discard_reason(queue[:2], 0.1, queue, [0.1] * 4, 0.01, 0.02) is None
+    assert discard_reason(queue[:2], 0.1, queue, [0.1] * 4, 0.02, 0.02) is None
+    assert discard_reason(queue[:2], 0.1, queue[1:], [0.1] * 3, 0.0, 0.02) == \
+        'queue changed, discarding the planned ahead stroke'
+    # the robot did not end where the plan starts, or its state is unknown
+    assert discard_reason(queue[:2], 0.1, queue, [0.1] * 4, 0.05, 0.02) == \
+        'robot is 0.05 rad from where the planned ahead stroke starts, discarding it'
+    assert 'None rad' in discard_reason(queue[:2], 0.1, queue, [0.1] * 4, None, 0.02)
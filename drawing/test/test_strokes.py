@@ -0,0 +1,149 @@
+from itertools import permutations, product
+
+from drawing.strokes import (best_orientation, order_strokes, reverse_strokes,
+                             simplify_stroke, simplify_strokes, tour_cost, transit_distance,
+                             two_opt)
+import numpy as np
+
+
+def line(x0, y0, x1, y1, n=5):
+    return np.linspace([x0, y0], [x1, y1], n)
+
+
+def brute_force(strokes, start):
+    best = np.inf
+    for order in permutations(range(len(strokes))):
+        for flips in product([False, True], repeat=len(strokes)):
+            tour = [strokes[i][::-1] if f else strokes[i] for i, f in zip(order, flips)]
+            best = min(best, transit_distance(tour, start))
+    return best
+
+
+def test_transit_distance():
+    strokes = [line(0, 0, 1, 0), line(1, 1, 0, 1)]
+    assert transit_distance(strokes) == 1.0
+    assert transit_distance(strokes, start=np.array([0.0, -1.0])) == 2.0
+
+
+def test_order_reverses_strokes_in_a_chain():
+    # three dashes end to end, given shuffled and pointing the wrong way
+    strokes = [line(2, 0, 3, 0), line(1, 0, 0, 0), line(2, 0, 1, 0)]
+    ordered, order, flipped = order_strokes(strokes, start=np.zeros(2))
+    assert order == [1, 2, 0]
+    assert flipped == [True, True, False]
+    assert transit_distance(ordered, np.zeros(2)) == 0.0
+    for stroke, i, flip in zip(ordered, order, flipped):
+        expected = strokes[i][::-1] if flip else strokes[i]
+        np.testing.assert_array_equal(stroke, expected)
+
+
+def test_exact_order_is_optimal():
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        strokes = [rng.uniform(0, 1, (4, 2)) for _ in range(5)]
+        start = rng.uniform(0, 1, 2)
+        ordered, _, _ = order_strokes(strokes, start)
+        assert np.isclose(transit_distance(ordered, start), brute_force(strokes, start))
+
+
+def test_two_opt_does_not_lose_strokes_and_beats_given_order():
+    rng = np.random.default_rng(1)
+    strokes = [rng.uniform(0, 1, (3, 2)) for _ in range(12)]
+    ordered, order, flipped = order_strokes(strokes, np.zeros(2))
+    assert sorted(order) == list(range(12))
+    assert len(flipped) == 12
+    assert transit_distance(ordered, np.zeros(2)) <= transit_distance(strokes, np.zeros(2))
+
+
+def test_two_opt_sweeps_dashes_on_a_line():
+    # eight dashes along x, given shuffled and in both directions
+    rng = np.random.default_rng(2)
+    strokes = [line(2 * k, 0, 2 * k + 1, 0) for k in range(8)]
+    strokes = [s[::-1] if rng.random() < 0.5 else s for s in strokes]
+    strokes = [strokes[i] for i in rng.permutation(8)]
+    ordered, _, _ = order_strokes(strokes, start=np.zeros(2))
+    assert np.isclose(transit_distance(ordered, np.zeros(2)), 7.0)
+
+
+def test_two_opt_fixes_a_bad_tour():
+    starts = np.array([[2 * k, 0.0] for k in range(6)])
+    ends = starts + [1.0, 0.0]
+    order = np.array([0, 3, 1, 4, 2, 5])
+    flipped = np.zeros(6, dtype=bool)
+    before = tour_cost(order, flipped, starts, ends, np.zeros(2))
+    order, flipped = two_opt(order, flipped, starts, ends, np.zeros(2))
+    assert order.tolist() == list(range(6))
+    assert tour_cost(order, flipped, starts, ends, np.zeros(2)) < before
+
+
+def test_large_order_draws_every_stroke_in_its_best_direction():
+    rng = np.random.default_rng(2)
+    strokes = [rng.uniform(0, 1, (3, 2)) for _ in range(10)]
+    ordered, order, _ = order_strokes(strokes, np.zeros(2))
+    starts = np.array([s[0] for s in strokes])
+    ends = np.array([s[-1] for s in strokes])
+    _, best = best_orientation(np.array(order), starts, ends, np.zeros(2))
+    assert np.isclose(transit_distance(ordered, np.zeros(2)), best)
+
+
+def test_order_of_no_or_one_stroke():
+    assert order_strokes([]) == ([], [], [])
+    stroke = line(0, 0, 1, 0)
+    ordered, order, flipped = order_strokes([stroke])
+    assert order == [0] and flipped == [False]
+    ordered, order, flipped = order_strokes([stroke], start=np.array([1.0, 0.0]))
+    assert flipped == [True]
+    np.testing.assert_array_equal(ordered[0], stroke[::-1])
+
+
+def test_reverse_strokes():
+    strokes = [line(0, 0, 1, 0), line(1, 1, 2, 1)]
+    reversed_ = reverse_strokes(strokes)
+    np.testing.assert_array_equal(reversed_[0], strokes[1][::-1])
+    np.testing.assert_array_equal(reversed_[1], strokes[0][::-1])
+
+
+def segment_distance(points, a, b):
+    ab = b - a
+    t = np.clip((points - a) @ ab / max(ab @ ab, 1e-300), 0.0, 1.0)
+    return np.linalg.norm(points - (a + t[:, None] * ab), axis=1)
+
+
+def test_simplify_drops_collinear_points():
+    stroke = line(0, 0, 1, 0, 11)
+    np.testing.assert_array_equal(simplify_stroke(stroke, 1e-6), stroke[[0, -1]])
+
+
+def test_simplify_keeps_corners():
+    stroke = np.vstack([line(0, 0, 1, 0, 6), line(1, 0, 1, 1, 6)[1:]])
+    np.testing.assert_array_equal(simplify_stroke(stroke, 1e-6), [[0, 0], [1, 0], [1, 1]])
+
+
+def test_simplify_stays_within_tolerance():
+    t = np.linspace(0, np.pi, 200)
+    stroke = np.stack([np.cos(t), np.sin(t)], axis=1)
+    tolerance = 0.001
+    simplified = simplify_stroke(stroke, tolerance)
+    assert 3 < len(simplified) < len(stroke)
+    np.testing.assert_array_equal(simplified[[0, -1]], stroke[[0, -1]])
+    # every dropped point is near the part of the simplified stroke that replaced it
+    kept = [int(np.flatnonzero((stroke == p).all(axis=1))[0]) for p in simplified]
+    for first, last in zip(kept[:-1], kept[1:]):
+        distance = segment_distance(stroke[first:last + 1], stroke[first], stroke[last])
+        assert distance.max() <= tolerance
+
+
+def test_simplify_closed_stroke():
+    t = np.linspace(0, 2 * np.pi, 50)
+    stroke = np.stack([np.cos(t), np.sin(t)], axis=1)
+    simplified = simplify_stroke(stroke, 0.01)
+    assert len(simplified) > 4
+    np.testing.assert_allclose(simplified[0], simplified[-1], atol=1e-12)
+
+
+def test_simplify_short_strokes_and_zero_tolerance():
+    stroke = line(0, 0, 1, 0, 2)
+    np.testing.assert_array_equal(simplify_stroke(stroke, 0.1), stroke)
+    stroke = line(0, 0, 1, 0, 5)
+    np.testing.assert_array_equal(simplify_stroke(stroke, 0.0), stroke)
+    assert [len(s) for s in simplify_strokes([stroke, stroke], 0.1)] == [2, 2]
@@ -0,0 +1,106 @@
+from drawing.surface import BoardSurface, surface_terms
+import numpy as np
+
+
+def plane(x, y):
+    return 0.002 + 0.01 * x - 0.005 * y
+
+
+def bowl(x, y):
+    return plane(x, y) + 0.02 * x * x - 0.01 * x * y + 0.03 * y * y
+
+
+def grid(n):
+    rng = np.random.default_rng(n)
+    return rng.uniform(-0.4, 0.4, n), rng.uniform(-0.2, 0.2, n)
+
+
+def test_surface_terms():
+    np.testing.assert_array_equal(surface_terms(2.0, 3.0, 6), [1, 2, 3, 4, 6, 9])
+    assert surface_terms(np.zeros((4, 5)), np.zeros((4, 5)), 3).shape == (4, 5, 3)
+
+
+def test_default_without_contacts():
+    surface = BoardSurface()
+    np.testing.assert_array_equal(surface.height(np.zeros(3), np.zeros(3), 0.01), [0.01] * 3)
+
+
+def test_model_grows_with_the_samples():
+    surface = BoardSurface()
+    surface.add(0.1, 0.1, 0.004)
+    surface.add(-0.1, 0.0, 0.002)
+    # a constant offset, then a plane from 3 and a quadratic from 12 samples
+    assert len(surface.coefficients) == 1
+    np.testing.assert_allclose(surface.height(0.3, -0.2, 0.0), 0.003)
+
+    x, y = grid(10)
+    for xi, yi in zip(x[:9], y[:9]):
+        surface.add(xi, yi, plane(xi, yi))
+    assert len(surface.coefficients) == 3
+    surface.add(x[9], y[9], plane(x[9], y[9]))
+    assert len(surface.coefficients) == 6
+
+
+def test_plane_fits_exactly():
+    surface = BoardSurface()
+    x, y = grid(5)
+    for xi, yi in zip(x, y):
+        surface.add(xi, yi, plane(xi, yi))
+    assert len(surface.coefficients) == 3
+    qx, qy = grid(7)
+    np.testing.assert_allclose(surface.height(qx, qy, 0.0), plane(qx, qy), atol=1e-12)
+
+
+def test_quadratic_fits_exactly():
+    surface = BoardSurface()
+    x, y = grid(20)
+    for xi, yi in zip(x, y):
+        surface.add(xi, yi, bowl(xi, yi))
+    assert len(surface.coefficients) == 6
+    qx, qy = grid(7)
+    np.testing.assert_allclose(surface.height(qx, qy, 0.0), bowl(qx, qy), atol=1e-12)
+
+
+def test_only_recent_samples_are_fitted():
+    surface = BoardSurface(max_samples=20)
+    x, y = grid(20)
+    for xi, yi in zip(x, y):
+        surface.add(xi, yi, plane(xi, yi))
+    # the board settles 1 mm lower
+    for xi, yi in zip(x, y):
+        surface.add(xi, yi, plane(xi, yi) - 0.001)
+    assert len(surface.samples) == 20
+    np.testing.assert_allclose(surface.height(x, y, 0.0), plane(x, y) - 0.001, atol=1e-12)
+
+
+def test_contacts_along_one_dash():
+    surface = BoardSurface()
+    # a diagonal dash, with the height noise of the force loop
+    rng = np.random.default_rng(0)
+    t = np.linspace(0.0, 0.1, 30)
+    x, y = 0.2 + t, 0.1 + 0.5 * t
+    for xi, yi in zip(x, y):
+        surface.add(xi, yi, plane(xi, yi) + rng.normal(scale=1e-4))
+    assert len(surface.coefficients) == 3
+    # along the dash it follows the heights, across it the surface is flat
+    np.testing.assert_allclose(surface.height(x, y, 0.0), plane(x, y), atol=1e-4)
+    across = np.array([-0.5, 1.0]) * 0.2
+    np.testing.assert_allclose(surface.height(x + across[0], y + across[1], 0.0),
+                               surface.height(x, y, 0.0), atol=1e-12)
+
+
+def test_contacts_in_one_spot():
+    surface = BoardSurface()
+    for k in range(20):
+        surface.add(0.3 + 1e-4 * (k % 3), 0.1 + 1e-4 * (k % 5), 0.004 + 1e-4 * k)
+    assert len(surface.coefficients) == 1
+    np.testing.assert_allclose(surface.height(-0.3, 0.2, 0.0), 0.004 + 1e-4 * 9.5)
+
+
+def test_reset():
+    surface = BoardSurface()
+    surface.add(0.0, 0.0, 0.005)
+    surface.reset()
+    assert len(surface.samples) == 0
+    assert surface.coefficients is None
+    assert surface.height(0.0, 0.0, 0.01) == 0.01
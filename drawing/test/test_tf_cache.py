@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('rclpy')
+
+from drawing.tf_cache import TransformCache  # noqa: E402
+
+
+class FakeNode:
+    """Node with a clock the test moves by hand, recording what is logged."""
+
+    def __init__(self):
+        self.nanoseconds = 0
+        self.logs = []
+
+    def get_clock(self):
+        time = SimpleNamespace(nanoseconds=self.nanoseconds)
+        return SimpleNamespace(now=lambda: time)
+
+    def get_logger(self):
+        return SimpleNamespace(info=self.logs.append)
+
+    def advance(self, seconds):
+        self.nanoseconds += round(seconds * 1e9)
+
+
+class FakeBuffer:
+    """Answer every lookup with a new transform, or fail for missing frames."""
+
+    def __init__(self, missing=()):
+        self.lookups = []
+        self.missing = set(missing)
+
+    def lookup_transform(self, parent_frame, child_frame, time):
+        if child_frame in self.missing:
+            raise LookupError(f'{child_frame} does not exist')
+        self.lookups.append((parent_frame, child_frame))
+        return SimpleNamespace(parent=parent_frame, child=child_frame, lookup=len(self.lookups))
+
+
+def test_keyed_lookups_hit_while_the_key_is_the_same():
+    buffer = FakeBuffer()
+    cache = TransformCache(FakeNode(), buffer)
+    first = cache.lookup('panda_link0', 'panda_hand_tcp', (10, 0))
+    assert cache.lookup('panda_link0', 'panda_hand_tcp', (10, 0)) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    # a new joint state
+    second = cache.lookup('panda_link0', 'panda_hand_tcp', (10, 1000))
+    assert second is not first
+    assert cache.lookup('panda_link0', 'panda_hand_tcp', (10, 1000)) is second
+    assert len(buffer.lookups) == 2
+
+
+def test_pairs_are_cached_separately():
+    buffer = FakeBuffer()
+    cache = TransformCache(FakeNode(), buffer)
+    tcp = cache.lookup('panda_link0', 'panda_hand_tcp', 1)
+    board = cache.lookup('panda_link0', 'board', 1)
+    assert (tcp.child, board.child) == ('panda_hand_tcp', 'board')
+    assert cache.lookup('board', 'panda_hand_tcp', 1).parent == 'board'
+    assert cache.misses == 3 and cache.hits == 0
+
+
+def test_a_new_calibration_epoch_invalidates_the_board():
+    buffer = FakeBuffer()
+    cache = TransformCache(FakeNode(), buffer)
+    stamp = (10, 0)
+    before = cache.lookup('board', 'panda_hand_tcp', (stamp, 7))
+    assert cache.lookup('board', 'panda_hand_tcp', (stamp, 7)) is before
+    # same joint state, but the board was recalibrated
+    after = cache.lookup('board', 'panda_hand_tcp', (stamp, 8))
+    assert after is not before
+    assert len(buffer.lookups) == 2
+
+
+def test_unkeyed_lookups_expire_after_max_age():
+    node = FakeNode()
+    buffer = FakeBuffer()
+    cache = TransformCache(node, buffer, max_age=0.5)
+    first = cache.lookup('panda_link0', 'board')
+    node.advance(0.4)
+    assert cache.lookup('panda_link0', 'board') is first
+    node.advance(0.1)
+    assert cache.lookup('panda_link0', 'board') is not first
+    assert len(buffer.lookups) == 2
+
+    # without a max_age every unkeyed lookup goes to the buffer
+    uncached = TransformCache(node, buffer)
+    uncached.lookup('panda_link0', 'board')
+    uncached.lookup('panda_link0', 'board')
+    assert (uncached.hits, uncached.misses) == (0, 2)
+
+
+def test_failed_lookups_are_not_cached():
+    buffer = FakeBuffer(missing={'tag56'})
+    cache = TransformCache(FakeNode(), buffer)
+    for _ in range(2):
+        with pytest.raises(LookupError):
+            cache.lookup('camera_link', 'tag56', 1)
+    buffer.missing.clear()
+    assert cache.lookup('camera_link', 'tag56', 1).child == 'tag56'
+    assert cache.hits == 0
+
+
+def test_hit_rate_report():
+    node = FakeNode()
+    cache = TransformCache(node, FakeBuffer(), report_period=60.0)
+    for _ in range(4):
+        cache.lookup('panda_link0', 'panda_hand_tcp', 1)
+    assert node.logs == []
+    node.advance(60.0)
+    cache.lookup('panda_link0', 'panda_hand_tcp', 1)
+    assert node.logs == ['tf cache: 4/5 hits (80.0%), 1 frame pairs']
+    assert (cache.hits, cache.misses) == (0, 0)
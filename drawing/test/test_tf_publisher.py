@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('rclpy')
+pytest.importorskip('tf2_ros')
+
+from builtin_interfaces.msg import Time  # noqa: E402
+from drawing.tf_publisher import TransformPublisher  # noqa: E402
+from geometry_msgs.msg import TransformStamped  # noqa: E402
+from rclpy.serialization import serialize_message  # noqa: E402
+from tf2_msgs.msg import TFMessage  # noqa: E402
+
+
+class FakeNode:
+    """Record what is published, with a clock the test moves by hand."""
+
+    def __init__(self):
+        self.nanoseconds = 0
+        self.published = {}
+        self.logs = []
+
+    def create_publisher(self, msg_type, topic, qos, **kwargs):
+        messages = self.published.setdefault(topic, [])
+        return SimpleNamespace(publish=messages.append)
+
+    def get_clock(self):
+        nanoseconds = self.nanoseconds
+        time = SimpleNamespace(nanoseconds=nanoseconds, to_msg=lambda: Time(
+            sec=nanoseconds // 10**9, nanosec=nanoseconds % 10**9))
+        return SimpleNamespace(now=lambda: time)
+
+    def get_logger(self):
+        return SimpleNamespace(info=self.logs.append)
+
+    def advance(self, seconds):
+        self.nanoseconds += round(seconds * 1e9)
+
+
+def transform(parent, child, x=0.0):
+    message = TransformStamped()
+    message.header.frame_id = parent
+    message.child_frame_id = child
+    message.transform.translation.x = x
+    message.transform.rotation.w = 1.0
+    return message
+
+
+def message_size(message):
+    return len(serialize_message(TFMessage(transforms=[message])))
+
+
+def test_dynamic_frames_are_sent_when_they_change():
+    node = FakeNode()
+    publisher = TransformPublisher(node, keepalive=1.0)
+    sent = node.published['/tf']
+
+    publisher.set_dynamic(transform('panda_link0', 'point', 0.3))
+    assert len(sent) == 1
+    node.advance(0.1)
+    publisher.set_dynamic(transform('panda_link0', 'point', 0.3))
+    publisher.tick()
+    assert len(sent) == 1
+
+    node.advance(0.1)
+    publisher.set_dynamic(transform('panda_link0', 'point', 0.35))
+    assert len(sent) == 2
+    assert sent[-1].transforms[0].transform.translation.x == 0.35
+    assert sent[-1].transforms[0].header.stamp.nanosec == 200_000_000
+
+    # unchanged for a second, the keepalive resends it
+    node.advance(0.9)
+    publisher.tick()
+    assert len(sent) == 2
+    node.advance(0.1)
+    publisher.tick()
+    assert len(sent) == 3
+    assert sent[-1].transforms[0].transform.translation.x == 0.35
+    assert not node.published['/tf_static']
+
+
+def test_static_frames_are_republished_together():
+    node = FakeNode()
+    publisher = TransformPublisher(node)
+    sent = node.published['/tf_static']
+
+    publisher.set_static(transform('camera_link', 'panda_link0'))
+    publisher.set_static(transform('panda_link0', 'board', 0.4))
+    assert [len(message.transforms) for message in sent] == [1, 2]
+
+    # a recalibration replaces the board and keeps the camera
+    node.advance(5.0)
+    publisher.set_static(transform('panda_link0', 'board', 0.5))
+    assert len(sent) == 3
+    frames = {t.child_frame_id: t for t in sent[-1].transforms}
+    assert sorted(frames) == ['board', 'panda_link0']
+    assert frames['board'].transform.translation.x == 0.5
+    assert all(t.header.stamp.sec == 5 for t in sent[-1].transforms)
+    for _ in range(20):
+        node.advance(0.1)
+        publisher.tick()
+    assert len(sent) == 3
+    assert not node.published['/tf']
+
+
+def test_bandwidth_report():
+    node = FakeNode()
+    publisher = TransformPublisher(node, keepalive=1.0, report_period=1.0,
+                                   rebroadcast_static=('board',))
+    board = transform('panda_link0', 'board', 0.4)
+    point = transform('panda_link0', 'point', 0.3)
+    publisher.set_static(board)
+    publisher.set_dynamic(point)
+
+    # ten ticks of the old 10 Hz timer, one of them sending the keepalive
+    for _ in range(10):
+        node.advance(0.1)
+        publisher.tick()
+    assert len(node.published['/tf']) == 2
+    sent = 2 * message_size(point)
+    rebroadcast = 10 * (message_size(board) + message_size(point))
+    assert node.logs == [f'/tf: sent {sent:.0f} B/s, saved {rebroadcast - sent:.0f} B/s '
+                         'against re-broadcasting every tick']
+    assert publisher.sent_bytes == 0 and publisher.rebroadcast_bytes == 0
@@ -0,0 +1,296 @@
+"""
+Retry policy around compute_cartesian_path.
+
+MoveIt returns the part of a Cartesian path it could plan, and a fraction
+of the waypoints it reached. CartesianPolicy does not accept a partial
+path straight away. Within a time budget it
+
+1. plans the waypoints again with max_step halved, down to min_max_step,
+2. bisects the waypoints and plans each half from where the other ends,
+3. for a single waypoint that still fails, solves IK seeded with the
+   start state and interpolates the joints, if no joint has to jump
+   further than max_joint_jump and forward kinematics puts every
+   interpolated point within max_deviation of the straight line, so a pen
+   on the board neither leaves it nor digs in.
+
+The pieces are joined into one GetCartesianPath response, whose fraction
+is the share of the waypoints that was reached.
+"""
+
+import math
+import time
+
+import numpy as np
+
+from moveit_msgs.msg import MoveItErrorCodes
+from moveit_msgs.srv import GetCartesianPath
+from sensor_msgs.msg import JointState
+from std_msgs.msg import String
+from trajectory_msgs.msg import JointTrajectoryPoint
+
+from path_planner.panda_kinematics import JOINT_NAMES, forward_kinematics
+
+
+def reached(result, count):
+    """Count how many of the count waypoints a response got through."""
+    if result.error_code.val != MoveItErrorCodes.SUCCESS:
+        return 0
+    return min(count, int(math.floor(result.fraction * count + 1e-9)))
+
+
+def failure():
+    """Make an empty response that reached none of the waypoints."""
+    result = GetCartesianPath.Response()
+    result.error_code.val = MoveItErrorCodes.PLANNING_FAILED
+    return result
+
+
+def end_state(start_state, trajectory):
+    """Joint state at the end of a RobotTrajectory started from start_state."""
+    positions = dict(zip(start_state.name, start_state.position))
+    points = trajectory.joint_trajectory.points
+    if points:
+        positions.update(zip(trajectory.joint_trajectory.joint_names, points[-1].positions))
+    return JointState(name=list(positions.keys()),
+                      position=[float(p) for p in positions.values()])
+
+
+def join(pieces, count):
+    """
+    Join the responses for consecutive parts of a waypoint list.
+
+    Args:
+    ----
+    pieces (list): (response, number of waypoints) for each part, in order
+    count (int): number of waypoints of the whole list
+
+    Returns
+    -------
+    One GetCartesianPath response. It stops after the first part that was
+    not planned completely.
+
+    """
+    joined = GetCartesianPath.Response()
+    joined.start_state = pieces[0][0].start_state
+    joined.error_code.val = pieces[0][0].error_code.val
+    trajectory = joined.solution.joint_trajectory
+    done = 0
+    for result, size in pieces:
+        piece = result.solution.joint_trajectory
+        if piece.points and not trajectory.joint_names:
+            trajectory.joint_names = list(piece.joint_names)
+        # every piece starts with the state the previous one ended in, joints
+        # a piece does not move keep their last position
+        for point in piece.points[1 if trajectory.points else 0:]:
+            positions = dict(zip(trajectory.joint_names, trajectory.points[-1].positions)
+                             if trajectory.points else ())
+            positions.update(zip(piece.joint_names, point.positions))
+            trajectory.points.append(JointTrajectoryPoint(
+                positions=[positions[name] for name in trajectory.joint_names],
+                time_from_start=point.time_from_start))
+        part = reached(result, size)
+        done += part
+        if part < size:
+            break
+    joined.fraction = done / count
+    if done == 0 and joined.error_code.val == MoveItErrorCodes.SUCCESS:
+        joined.error_code.val = MoveItErrorCodes.PLANNING_FAILED
+    return joined
+
+
+def line_deviation(positions):
+    """
+    Measure how far positions stray from the segment between the first and last.
+
+    Args:
+    ----
+    positions (array): N x 3 positions
+
+    Returns
+    -------
+    The largest distance (m).
+
+    """
+    start, end = positions[0], positions[-1]
+    direction = end - start
+    length = np.dot(direction, direction)
+    if length < 1e-12:
+        return float(np.max(np.linalg.norm(positions - start, axis=1)))
+    s = np.clip((positions - start) @ direction / length, 0.0, 1.0)
+    closest = start + s[:, None] * direction
+    return float(np.max(np.linalg.norm(positions - closest, axis=1)))
+
+
+class CartesianPolicy:
+    """Plan Cartesian paths with retries, and keep statistics on them."""
+
+    def __init__(self, planner, time_budget=2.0, min_max_step=0.0025,
+                 max_joint_jump=0.2, max_deviation=0.002,
+                 topic='cartesian_planning_stats'):
+        """
+        Create the policy.
+
+        Args:
+        ----
+        planner (Path_Plan_Execute): used for compute_cartesian_path and IK
+        time_budget (float): seconds spent on retries for one request
+        min_max_step (float): smallest max_step tried (m)
+        max_joint_jump (float): largest joint motion (rad) the IK fallback
+            may interpolate
+        max_deviation (float): furthest the IK fallback may stray from the
+            straight line to the waypoint (m)
+        topic (string): topic the statistics are published on
+
+        """
+        self.planner = planner
+        self.time_budget = time_budget
+        self.min_max_step = min_max_step
+        self.max_joint_jump = max_joint_jump
+        self.max_deviation = max_deviation
+        self.stats_publisher = planner.node.create_publisher(String, topic, 10)
+        # joints of the planning group, learnt from the planned trajectories
+        self.joint_names = []
+        self.counts = dict(requests=0, complete=0, max_step=0, bisect=0, ik=0,
+                           partial=0, retries=0)
+
+    async def plan(self, queue, velocity, start_state, max_step=None):
+        """
+        Plan a Cartesian path through queue, retrying when it is partial.
+
+        Args:
+        ----
+        queue (list): the Pose waypoints to visit
+        velocity (float): max velocity scaling factor of the path
+        start_state (JointState): the joint state the path starts from
+        max_step (float): interpolation step (m), the planner's default if None
+
+        Returns
+        -------
+        The GetCartesianPath response.
+
+        """
+        self.counts['requests'] += 1
+        deadline = time.monotonic() + self.time_budget
+        max_step = max_step or self.planner.cartesian_max_step
+        result = await self.planner.compute_cartesian_path(
+            queue, velocity, start_state, max_step)
+        self.joint_names = list(result.solution.joint_trajectory.joint_names) or \
+            self.joint_names
+        if reached(result, len(queue)) == len(queue):
+            self.counts['complete'] += 1
+        else:
+            self.planner.node.get_logger().info(
+                f"only {result.fraction * 100}% of the path was computed, retrying")
+            result = await self.recover(queue, velocity, start_state, max_step, result,
+                                        deadline)
+        self.stats_publisher.publish(String(data=self.stats()))
+        return result
+
+    async def recover(self, queue, velocity, start_state, max_step, result, deadline):
+        """Try a smaller max_step, then bisection, then IK, until the deadline."""
+        step = max_step / 2.0
+        while step >= self.min_max_step and time.monotonic() < deadline:
+            self.counts['retries'] += 1
+            retry = await self.planner.compute_cartesian_path(
+                queue, velocity, start_state, step)
+            if reached(retry, len(queue)) == len(queue):
+                self.counts['max_step'] += 1
+                return retry
+            if retry.fraction > result.fraction:
+                result = retry
+            step /= 2.0
+
+        retry = await self.subdivide(queue, velocity, start_state, max_step, deadline)
+        if reached(retry, len(queue)) == len(queue):
+            if len(queue) > 1:
+                self.counts['bisect'] += 1
+            return retry
+        if retry.fraction > result.fraction:
+            result = retry
+        self.counts['partial'] += 1
+        self.planner.node.get_logger().info(
+            f"giving up with {result.fraction * 100}% of the path computed")
+        return result
+
+    async def subdivide(self, queue, velocity, start_state, max_step, deadline):
+        """Plan the halves of queue one after the other, recursively."""
+        if len(queue) == 1:
+            return await self.interpolate(queue[0], velocity, start_state, deadline)
+
+        half = len(queue) // 2
+        pieces = []
+        state = start_state
+        for part in (queue[:half], queue[half:]):
+            if time.monotonic() >= deadline:
+                break
+            self.counts['retries'] += 1
+            result = await self.planner.compute_cartesian_path(part, velocity, state, max_step)
+            if reached(result, len(part)) < len(part):
+                result = await self.subdivide(part, velocity, state, max_step, deadline)
+            pieces.append((result, len(part)))
+            if reached(result, len(part)) < len(part):
+                break
+            state = end_state(state, result.solution)
+
+        if not pieces:
+            return failure()
+        return join(pieces, len(queue))
+
+    async def interpolate(self, pose, velocity, start_state, deadline):
+        """Reach a single waypoint with seeded IK and a joint space interpolation."""
+        if time.monotonic() >= deadline:
+            return failure()
+        self.counts['retries'] += 1
+        ik = await self.planner.ik_callback(pose, start_state)
+        if ik.error_code.val != MoveItErrorCodes.SUCCESS:
+            return failure()
+
+        start = dict(zip(start_state.name, start_state.position))
+        goal = dict(zip(ik.solution.joint_state.name, ik.solution.joint_state.position))
+        names = [name for name in self.joint_names or goal if name in start and name in goal]
+        if not names:
+            return failure()
+        jump = max(abs(goal[name] - start[name]) for name in names)
+        if jump > self.max_joint_jump:
+            self.planner.node.get_logger().info(
+                f"IK fallback would move a joint {jump} rad, not interpolating")
+            return failure()
+
+        # the straight line check needs the whole arm
+        if not all(name in start and name in goal for name in JOINT_NAMES):
+            return failure()
+        q_start = np.array([start[name] for name in JOINT_NAMES])
+        q_goal = np.array([goal[name] for name in JOINT_NAMES])
+        distance = np.linalg.norm(forward_kinematics(q_goal)[:3, 3]
+                                  - forward_kinematics(q_start)[:3, 3])
+        steps = max(1, int(math.ceil(distance / self.planner.cartesian_max_step)),
+                    int(math.ceil(jump / 0.02)))
+        s = np.linspace(0.0, 1.0, steps + 1)
+        positions = forward_kinematics(
+            (1.0 - s)[:, None] * q_start + s[:, None] * q_goal)[:, :3, 3]
+        deviation = line_deviation(positions)
+        if deviation > self.max_deviation:
+            self.planner.node.get_logger().info(
+                f"IK fallback would leave the straight line by {deviation} m, "
+                "not interpolating")
+            return failure()
+
+        result = GetCartesianPath.Response()
+        result.start_state.joint_state = start_state
+        trajectory = result.solution.joint_trajectory
+        trajectory.joint_names = names
+        for step in s:
+            trajectory.points.append(JointTrajectoryPoint(positions=[
+                (1.0 - step) * start[name] + step * goal[name] for name in names]))
+        result.fraction = 1.0
+        result.error_code.val = MoveItErrorCodes.SUCCESS
+        self.counts['ik'] += 1
+        return result
+
+    def stats(self):
+        """One line summary, also published on the statistics topic."""
+        counts = self.counts
+        return (f"cartesian planning: {counts['complete']}/{counts['requests']} complete "
+                f"first time, recovered {counts['max_step']} by max_step, "
+                f"{counts['bisect']} by bisection, {counts['ik']} waypoints by IK, "
+                f"{counts['partial']} partial, {counts['retries']} retries")
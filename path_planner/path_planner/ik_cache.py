@@ -0,0 +1,151 @@
+"""
+Memo of compute_ik results.
+
+Many MoveIt targets repeat every game: the home and observe poses, the
+calibration pose and the approach poses of the tiles. IKCache keeps the
+solutions of recent requests, keyed by the target pose rounded to a
+quantization step, and for every pose the seeds the solutions came from.
+A request is answered from the cache when a stored seed is close to the
+current joint configuration, because a redundant arm can reach the same
+pose in several ways and the seed decides which one IK finds.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+def quantize_pose(pose, position_step, orientation_step):
+    """
+    Round a Pose onto a grid, for use as a dictionary key.
+
+    Args:
+    ----
+    pose (Pose): the pose to quantize
+    position_step (float): grid step of the position (m)
+    orientation_step (float): grid step of the quaternion components
+
+    Returns
+    -------
+    A tuple of seven integers.
+
+    """
+    p = pose.position
+    q = np.array([pose.orientation.x, pose.orientation.y,
+                  pose.orientation.z, pose.orientation.w])
+    # q and -q are the same rotation, make the first of w, x, y, z that
+    # is not zero positive
+    components = q[[3, 0, 1, 2]]
+    nonzero = np.flatnonzero(np.abs(components) > 1e-9)
+    if nonzero.size and components[nonzero[0]] < 0:
+        q = -q
+    position = np.round(np.array([p.x, p.y, p.z]) / position_step)
+    orientation = np.round(q / orientation_step)
+    return tuple(position.astype(int).tolist() + orientation.astype(int).tolist())
+
+
+def seed_distance(names, positions, seed):
+    """Largest joint difference to a JointState, or None if the joints differ."""
+    current = np.asarray(seed.position, dtype=np.float64)
+    if names != tuple(seed.name) or positions.shape != current.shape:
+        return None
+    return float(np.max(np.abs(positions - current), initial=0.0))
+
+
+class IKCache:
+    """
+    Least recently used cache of IK solutions.
+
+    The cache only holds solutions for the planning scene it was filled
+    in, call invalidate whenever the scene changes.
+    """
+
+    def __init__(self, capacity=128, position_step=0.001, orientation_step=0.005,
+                 seed_tolerance=0.2):
+        """
+        Create an empty cache.
+
+        Args:
+        ----
+        capacity (int): most target poses to remember
+        position_step (float): quantization of the target position (m)
+        orientation_step (float): quantization of the target quaternion
+        seed_tolerance (float): largest distance (rad) between the current
+            joint positions and a stored seed for its solution to be reused
+
+        """
+        self.capacity = capacity
+        self.position_step = position_step
+        self.orientation_step = orientation_step
+        self.seed_tolerance = seed_tolerance
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def pose_key(self, pose):
+        """Quantize a Pose into a hashable key."""
+        return quantize_pose(pose, self.position_step, self.orientation_step)
+
+    def get(self, pose, seed):
+        """
+        Look up a solution for pose, from a seed close to this one.
+
+        Args:
+        ----
+        pose (Pose): the IK target
+        seed (JointState): the joint state IK would be seeded with
+
+        Returns
+        -------
+        The cached GetPositionIK response, or None.
+
+        """
+        key = self.pose_key(pose)
+        candidates = self.entries.get(key, [])
+        best = None
+        for names, stored, response in candidates:
+            distance = seed_distance(names, stored, seed)
+            if distance is None:
+                continue
+            if distance <= self.seed_tolerance and (best is None or distance < best[0]):
+                best = (distance, response)
+
+        if best is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return best[1]
+
+    def put(self, pose, seed, response):
+        """Store a successful IK response for pose, solved from seed."""
+        key = self.pose_key(pose)
+        candidates = self.entries.setdefault(key, [])
+        candidates.append((tuple(seed.name),
+                           np.asarray(seed.position, dtype=np.float64), response))
+        # a few seeds per pose are enough, keep the most recent
+        del candidates[:-4]
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def discard(self, pose):
+        """Forget the solutions for one pose, for example when MoveIt rejected one."""
+        self.entries.pop(self.pose_key(pose), None)
+
+    def invalidate(self):
+        """Forget every solution, for example after the planning scene changed."""
+        if self.entries:
+            self.invalidations += 1
+        self.entries.clear()
+
+    def hit_rate(self):
+        """Fraction of lookups answered from the cache."""
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def stats(self):
+        """One line summary for the logs."""
+        return (f'IK cache: {self.hits}/{self.hits + self.misses} hits '
+                f'({100.0 * self.hit_rate():.1f}%), {len(self.entries)} poses, '
+                f'{self.invalidations} invalidations')
@@ -0,0 +1,242 @@
+"""
+Forward and inverse kinematics of the Panda arm in NumPy.
+
+The arm is described with the modified (Craig) Denavit-Hartenberg
+parameters from the Franka documentation, whose frames are the URDF
+frames panda_link1 ... panda_link8. panda_hand is panda_link8 turned by
+-45 degrees about z, and panda_hand_tcp sits 0.1034 m in front of it.
+
+Every function takes joint positions of shape (..., 7), so a whole
+trajectory is evaluated in one call. The IK knows nothing about
+collisions, callers that need a collision free solution still have to ask
+MoveIt.
+"""
+
+import numpy as np
+
+JOINT_NAMES = tuple(f'panda_joint{i}' for i in range(1, 8))
+
+# a (m), d (m), alpha (rad) of joints 1 to 7, then the flange
+DH = np.array([
+    [0.0, 0.333, 0.0],
+    [0.0, 0.0, -np.pi / 2],
+    [0.0, 0.316, np.pi / 2],
+    [0.0825, 0.0, np.pi / 2],
+    [-0.0825, 0.384, -np.pi / 2],
+    [0.0, 0.0, np.pi / 2],
+    [0.088, 0.0, np.pi / 2],
+    [0.0, 0.107, 0.0],
+])
+
+LOWER_LIMITS = np.array([-2.8973, -1.7628, -2.8973, -3.0718, -2.8973, -0.0175, -2.8973])
+UPPER_LIMITS = np.array([2.8973, 1.7628, 2.8973, -0.0698, 2.8973, 3.7525, 2.8973])
+
+# index of every frame in the output of link_transforms
+FRAMES = {f'panda_link{i}': i for i in range(9)}
+FRAMES['panda_hand'] = 9
+FRAMES['panda_hand_tcp'] = 10
+
+HAND = np.array([
+    [np.cos(-np.pi / 4), -np.sin(-np.pi / 4), 0.0, 0.0],
+    [np.sin(-np.pi / 4), np.cos(-np.pi / 4), 0.0, 0.0],
+    [0.0, 0.0, 1.0, 0.0],
+    [0.0, 0.0, 0.0, 1.0],
+])
+TCP = np.array([
+    [1.0, 0.0, 0.0, 0.0],
+    [0.0, 1.0, 0.0, 0.0],
+    [0.0, 0.0, 1.0, 0.1034],
+    [0.0, 0.0, 0.0, 1.0],
+])
+
+
+def arm_positions(joint_state):
+    """
+    Positions of the seven arm joints in a JointState.
+
+    Returns
+    -------
+    An array of 7 positions, or None if a joint is missing.
+
+    """
+    positions = dict(zip(joint_state.name, joint_state.position))
+    if not all(name in positions for name in JOINT_NAMES):
+        return None
+    return np.array([positions[name] for name in JOINT_NAMES], dtype=np.float64)
+
+
+def pose_to_transform(pose):
+    """4 x 4 transform of a geometry_msgs Pose."""
+    x, y, z, w = (pose.orientation.x, pose.orientation.y,
+                  pose.orientation.z, pose.orientation.w)
+    norm = np.sqrt(x * x + y * y + z * z + w * w)
+    x, y, z, w = x / norm, y / norm, z / norm, w / norm
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w), pose.position.x],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w), pose.position.y],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y), pose.position.z],
+        [0.0, 0.0, 0.0, 1.0],
+    ])
+
+
+def dh_transforms(q):
+    """
+    Transform across every joint and the flange.
+
+    Args:
+    ----
+    q (array): joint positions, shape (..., 7)
+
+    Returns
+    -------
+    An array of shape (..., 8, 4, 4), parent to child for each joint.
+
+    """
+    q = np.asarray(q, dtype=np.float64)
+    theta = np.concatenate([q, np.zeros(q.shape[:-1] + (1,))], axis=-1)
+    a, d, alpha = DH.T
+    ct, st = np.cos(theta), np.sin(theta)
+    ca, sa = np.cos(alpha), np.sin(alpha)
+    T = np.zeros(theta.shape + (4, 4))
+    # RotX(alpha) TransX(a) RotZ(theta) TransZ(d)
+    T[..., 0, 0] = ct
+    T[..., 0, 1] = -st
+    T[..., 0, 3] = a
+    T[..., 1, 0] = st * ca
+    T[..., 1, 1] = ct * ca
+    T[..., 1, 2] = -sa
+    T[..., 1, 3] = -sa * d
+    T[..., 2, 0] = st * sa
+    T[..., 2, 1] = ct * sa
+    T[..., 2, 2] = ca
+    T[..., 2, 3] = ca * d
+    T[..., 3, 3] = 1.0
+    return T
+
+
+def link_transforms(q):
+    """
+    Pose of every frame of the arm in panda_link0.
+
+    Args:
+    ----
+    q (array): joint positions, shape (..., 7)
+
+    Returns
+    -------
+    An array of shape (..., 11, 4, 4), indexed by FRAMES.
+
+    """
+    joints = dh_transforms(q)
+    frames = np.empty(joints.shape[:-3] + (11, 4, 4))
+    frames[..., 0, :, :] = np.eye(4)
+    for i in range(8):
+        frames[..., i + 1, :, :] = frames[..., i, :, :] @ joints[..., i, :, :]
+    frames[..., 9, :, :] = frames[..., 8, :, :] @ HAND
+    frames[..., 10, :, :] = frames[..., 9, :, :] @ TCP
+    return frames
+
+
+def forward_kinematics(q, frame='panda_hand_tcp'):
+    """
+    Pose of one frame in panda_link0.
+
+    Args:
+    ----
+    q (array): joint positions, shape (..., 7)
+    frame (string): one of the keys of FRAMES
+
+    Returns
+    -------
+    An array of shape (..., 4, 4).
+
+    """
+    return link_transforms(q)[..., FRAMES[frame], :, :]
+
+
+def jacobian(q, frame='panda_hand_tcp'):
+    """
+    Geometric Jacobian of a frame, expressed in panda_link0.
+
+    Args:
+    ----
+    q (array): joint positions, shape (..., 7)
+    frame (string): one of the keys of FRAMES after panda_link7
+
+    Returns
+    -------
+    An array of shape (..., 6, 7), angular velocity rows first.
+
+    """
+    frames = link_transforms(q)
+    # joint i turns about the z axis of panda_link{i}
+    axes = frames[..., 1:8, :3, 2]
+    origins = frames[..., 1:8, :3, 3]
+    end = frames[..., FRAMES[frame], :3, 3]
+    linear = np.cross(axes, end[..., None, :] - origins)
+    return np.concatenate([np.swapaxes(axes, -1, -2), np.swapaxes(linear, -1, -2)], axis=-2)
+
+
+def pose_error(current, target):
+    """
+    Rotation vector and translation from current to target, in panda_link0.
+
+    Args:
+    ----
+    current (array): 4 x 4 transform
+    target (array): 4 x 4 transform
+
+    Returns
+    -------
+    An array of 6, rotation first.
+
+    """
+    R = target[:3, :3] @ current[:3, :3].T
+    cos = np.clip((np.trace(R) - 1.0) / 2.0, -1.0, 1.0)
+    angle = np.arccos(cos)
+    axis = np.array([R[2, 1] - R[1, 2], R[0, 2] - R[2, 0], R[1, 0] - R[0, 1]])
+    if angle < 1e-6:
+        rotation = 0.5 * axis
+    elif np.pi - angle < 1e-6:
+        # sin is 0, take the axis from the diagonal instead
+        k = np.argmax(np.diag(R))
+        column = (R[:, k] + np.eye(3)[k]) / np.sqrt(2.0 * (1.0 + R[k, k]))
+        rotation = angle * column
+    else:
+        rotation = angle / (2.0 * np.sin(angle)) * axis
+    return np.concatenate([rotation, target[:3, 3] - current[:3, 3]])
+
+
+def inverse_kinematics(target, seed, frame='panda_hand_tcp', damping=0.05,
+                       tolerance=1e-4, iterations=100, max_step=0.2):
+    """
+    Damped least squares IK, starting from a seed.
+
+    Args:
+    ----
+    target (array): 4 x 4 goal pose of frame in panda_link0
+    seed (array): joint positions to start from, usually the current ones
+    frame (string): the frame to move to the target
+    damping (float): damping of the least squares step
+    tolerance (float): largest error (m and rad) of a solution
+    iterations (int): most steps taken
+    max_step (float): largest change of a joint in one step (rad)
+
+    Returns
+    -------
+    The joint positions, and whether they reach the target within tolerance
+    and the joint limits.
+
+    """
+    q = np.clip(np.asarray(seed, dtype=np.float64), LOWER_LIMITS, UPPER_LIMITS)
+    identity = np.eye(6) * damping ** 2
+    for _ in range(iterations):
+        error = pose_error(forward_kinematics(q, frame), target)
+        if np.max(np.abs(error)) < tolerance:
+            return q, True
+        J = jacobian(q, frame)
+        step = J.T @ np.linalg.solve(J @ J.T + identity, error)
+        step *= min(1.0, max_step / max(np.max(np.abs(step)), 1e-12))
+        q = np.clip(q + step, LOWER_LIMITS, UPPER_LIMITS)
+    error = pose_error(forward_kinematics(q, frame), target)
+    return q, bool(np.max(np.abs(error)) < tolerance)
@@ -6,23 +6,28 @@ the robot using the move group and action clients.
 PUBLISHERS:
   + /collision object (CollisionObject) - The collision box representing the
   table
+  + cartesian_planning_stats (String) - How often Cartesian paths were
+  complete, and how partial ones were recovered
 SERVICES:
     none
 PARAMETERS:
     none
 """
 
+import numpy as np
+
 from rclpy.action import ActionClient
 from action_msgs.msg import GoalStatus
 from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
 
-from std_msgs.msg import Header
+from rclpy.qos import DurabilityPolicy, QoSProfile
+from std_msgs.msg import Header, Int64
 
 from moveit_msgs.action import MoveGroup
 from moveit_msgs.msg import (JointConstraint, Constraints, OrientationConstraint,
                              PlanningScene, PlanningOptions, RobotState,
                              MotionPlanRequest, WorkspaceParameters, PositionIKRequest,
-                             CollisionObject)
+                             CollisionObject, MoveItErrorCodes)
 from moveit_msgs.srv import GetPositionIK, GetPositionFK, GetCartesianPath
 
 from geometry_msgs.msg import Vector3, Quaternion
@@ -30,6 +35,13 @@ from sensor_msgs.msg import JointState
 from trajectory_msgs.msg import JointTrajectoryPoint, JointTrajectory
 
 from franka_msgs.action import Homing, Grasp
+from path_planner.ik_cache import IKCache
+from path_planner.trajectory_cache import TrajectoryCache
+from path_planner.stroke_segments import segment_index_from_positions, segment_index_map
+from path_planner.panda_kinematics import (JOINT_NAMES, arm_positions, forward_kinematics,
+                                           inverse_kinematics, pose_to_transform)
+from path_planner.cartesian_policy import CartesianPolicy
+from path_planner.stroke_profile import StrokeProfile
 from moveit_msgs.msg import CollisionObject
 from shape_msgs.msg import SolidPrimitive
 
@@ -65,6 +77,13 @@ class Path_Plan_Execute():
             JointState, '/joint_states', self.joint_states_callback, 10, callback_group=self.joint_states_callback_group)
         self.current_joint_state = JointState()
 
+        # board calibration epoch from the tags node, latched so a late
+        # subscriber still gets the current one
+        self.calibration_epoch = 0
+        self.calibration_epoch_subs = self.node.create_subscription(
+            Int64, 'calibration_epoch', self.calibration_epoch_callback,
+            QoSProfile(depth=1, durability=DurabilityPolicy.TRANSIENT_LOCAL))
+
         ########### create action clients ###########
 
         self.movegroup_client = ActionClient(self.node, MoveGroup,
@@ -106,8 +125,26 @@ class Path_Plan_Execute():
         self.movegroup_status = GoalStatus.STATUS_UNKNOWN
 
         self.goal_joint_state = None
+        # pose the goal joint state was solved for, until MoveGroup answers
+        self.goal_pose = None
         self.planned_trajectory = None
 
+        # solutions of recent IK requests, cleared when the scene changes
+        self.ik_cache = IKCache()
+        # seconds between two reports of a cache's statistics in the log
+        self.cache_report_period = 60.0
+        self.cache_reports = {}
+        # complete Cartesian paths, reused for the same board calibration
+        self.trajectory_cache = TrajectoryCache()
+        # interpolation step of the Cartesian planner (m), used unless a
+        # stroke profile asks for another one
+        self.cartesian_max_step = 0.01
+        # per segment step of strokes, from their curvature, never shorter
+        # than cartesian_max_step
+        self.stroke_profile = StrokeProfile(min_step=self.cartesian_max_step)
+        # retries partial Cartesian paths, publishes how often it had to
+        self.cartesian_policy = CartesianPolicy(self)
+
         # i want to remove the commented lines below, but i'm not sure
         # if it will break things. Leaving them here until I can confirm
         # we don't need them
@@ -131,6 +168,19 @@ class Path_Plan_Execute():
         """Receive the message from the joint state subscriber."""
         self.current_joint_state = msg
 
+    def report_cache(self, cache):
+        """Log the statistics of a cache, at most once every cache_report_period."""
+        now = self.node.get_clock().now().nanoseconds * 1e-9
+        last = self.cache_reports.get(id(cache))
+        if last is not None and now - last < self.cache_report_period:
+            return
+        self.cache_reports[id(cache)] = now
+        self.node.get_logger().info(cache.stats())
+
+    def calibration_epoch_callback(self, msg):
+        """Receive the board calibration epoch from the tags node."""
+        self.calibration_epoch = msg.data
+
     def create_movegroup_msg(self, movegroup_goal_msg):
 
         # we had previously split this all up into like four
@@ -262,7 +312,12 @@ class Path_Plan_Execute():
 
         request.ik_request = position
 
-        result = await self.ik_client.call_async(request)
+        result = self.ik_cache.get(pose, joint_state)
+        if result is None:
+            result = await self.ik_client.call_async(request)
+            if result.error_code.val == MoveItErrorCodes.SUCCESS:
+                self.ik_cache.put(pose, joint_state, result)
+        self.report_cache(self.ik_cache)
 
         return result
 
@@ -270,20 +325,74 @@ class Path_Plan_Execute():
         """
         Set desired goal oreintation.
 
-        Set the desired goal orientation for the robot arm using the
-        IK service.
+        Set the desired goal orientation for the robot arm. A solution from
+        the IK cache is used first, then the local Panda IK seeded with the
+        current joint state, whose solution goes into the cache, and the IK
+        service only when it does not converge. The local IK does not check
+        for collisions; when MoveGroup rejects its goal,
+        get_movegroup_result_callback solves the pose again with the IK
+        service.
 
         Args:
         ----
         None
 
         """
+        self.goal_pose = pose
+        result = self.ik_cache.get(pose, self.current_joint_state)
+        if result is not None:
+            self.goal_joint_state = result.solution.joint_state
+            return
+
+        seed = arm_positions(self.current_joint_state)
+        if seed is not None:
+            positions, success = inverse_kinematics(pose_to_transform(pose), seed)
+            if success:
+                result = GetPositionIK.Response()
+                result.solution.joint_state = JointState(
+                    name=list(JOINT_NAMES), position=positions.tolist())
+                result.error_code.val = MoveItErrorCodes.SUCCESS
+                self.ik_cache.put(pose, self.current_joint_state, result)
+                self.goal_joint_state = result.solution.joint_state
+                self.node.get_logger().info(
+                    f"local IK solution: {self.goal_joint_state.position}")
+                return
+
+        await self.moveit_goal_joint_states(pose)
+
+    async def moveit_goal_joint_states(self, pose):
+        """Set the goal joint state from the collision aware IK service."""
         result = await self.ik_callback(pose, self.current_joint_state)
         self.node.get_logger().info(
             f"solution.jiont_state: {result.solution.joint_state}")
         self.goal_joint_state = result.solution.joint_state
 
-    async def plan_cartesian_path(self, queue, velocity=0.025):
+    async def replan_with_moveit_ik(self, pose):
+        """Solve pose again with the IK service and plan to the new goal."""
+        self.ik_cache.discard(pose)
+        await self.moveit_goal_joint_states(pose)
+        self.plan_path()
+
+    async def compute_cartesian_path(self, queue, velocity, start_state, max_step=None):
+        """
+        Plan a Cartesian path through queue, starting from start_state.
+
+        Nothing on the planner is changed, so a path can be computed ahead
+        of time from a predicted start state while another one executes.
+
+        Args:
+        ----
+        queue (list): the Pose waypoints to visit
+        velocity (float): max velocity scaling factor of the path
+        start_state (JointState): the joint state the path starts from
+        max_step (float): interpolation step (m), cartesian_max_step if None.
+            The executor publishes one point per 0.1 s, so this sets the speed
+
+        Returns
+        -------
+        The GetCartesianPath response.
+
+        """
         # orientation_constraint = OrientationConstraint()
         # orientation_constraint.header = Header(
         #     stamp=self.node.get_clock().now().to_msg())
@@ -294,39 +403,57 @@ class Path_Plan_Execute():
         # orientation_constraint.absolute_y_axis_tolerance = 0.1
         # orientation_constraint.absolute_z_axis_tolerance = 0.1
         # orientation_constraint.weight = 1.0
+        max_step = max_step or self.cartesian_max_step
 
-        self.cartesian_path_request = GetCartesianPath.Request()
+        cartesian_path_request = GetCartesianPath.Request()
 
-        self.cartesian_path_request.header = Header(
+        cartesian_path_request.header = Header(
             stamp=self.node.get_clock().now().to_msg())
-        self.cartesian_path_request.start_state = RobotState(
+        cartesian_path_request.start_state = RobotState(
             joint_state=JointState(
                 header=Header(stamp=self.node.get_clock().now().to_msg()),
-                name=self.current_joint_state.name,
-                position=self.current_joint_state.position,
-                velocity=self.current_joint_state.velocity,
-                effort=self.current_joint_state.effort),
+                name=start_state.name,
+                position=start_state.position,
+                velocity=start_state.velocity,
+                effort=start_state.effort),
             is_diff=False
         )
 
         # leave the commented out lines below here for now
         # they may come in handy later as we continue to debug
-        self.cartesian_path_request.group_name = self.node.group_name
-        self.cartesian_path_request.waypoints = queue
-        self.cartesian_path_request.link_name = 'panda_hand_tcp'
+        cartesian_path_request.group_name = self.node.group_name
+        cartesian_path_request.waypoints = queue
+        cartesian_path_request.link_name = 'panda_hand_tcp'
         # setting this to 0.1 for now, could cause problems later
-        self.cartesian_path_request.max_step = 0.01
-        # self.cartesian_path_request.jump_threshold = 0
-        # self.cartesian_path_request.prismatic_jump_threshold = 0
-        # self.cartesian_path_request.revolute_jump_threshold = 0
-        self.cartesian_path_request.avoid_collisions = True
-        self.cartesian_path_request.max_velocity_scaling_factor = velocity
-        self.cartesian_path_request.max_acceleration_scaling_factor = 0.05
-        # self.cartesian_path_request.path_constraints.orientation_constraint = []
-        # self.node.get_logger().info(f"request: {self.cartesian_path_request}")
-
-        cartesian_trajectory_result = await self.cartesian_path_client.call_async(self.cartesian_path_request)
-
+        cartesian_path_request.max_step = max_step
+        # cartesian_path_request.jump_threshold = 0
+        # cartesian_path_request.prismatic_jump_threshold = 0
+        # cartesian_path_request.revolute_jump_threshold = 0
+        cartesian_path_request.avoid_collisions = True
+        cartesian_path_request.max_velocity_scaling_factor = velocity
+        cartesian_path_request.max_acceleration_scaling_factor = 0.05
+        # cartesian_path_request.path_constraints.orientation_constraint = []
+        # self.node.get_logger().info(f"request: {cartesian_path_request}")
+
+        cartesian_trajectory_result = self.trajectory_cache.get(
+            self.calibration_epoch, queue, velocity, max_step, start_state)
+        if cartesian_trajectory_result is None:
+            cartesian_trajectory_result = await self.cartesian_path_client.call_async(
+                cartesian_path_request)
+            if cartesian_trajectory_result.fraction >= 1.0 and \
+                    cartesian_trajectory_result.error_code.val == MoveItErrorCodes.SUCCESS:
+                self.trajectory_cache.put(self.calibration_epoch, queue, velocity, max_step,
+                                          start_state, cartesian_trajectory_result)
+        self.report_cache(self.trajectory_cache)
+        return cartesian_trajectory_result
+
+    async def plan_cartesian_path(self, queue, velocity=0.025, max_step=None):
+        """Plan a Cartesian path through queue from the current joint state."""
+        self.use_cartesian_path(await self.cartesian_policy.plan(
+            queue, velocity, self.current_joint_state, max_step))
+
+    def use_cartesian_path(self, cartesian_trajectory_result):
+        """Make a GetCartesianPath response the trajectory to execute next."""
         # self.node.get_logger().info(
         #     f"result: {cartesian_trajectory_result}")
         self.cartesian_trajectory_start_state = cartesian_trajectory_result.start_state
@@ -343,6 +470,66 @@ class Path_Plan_Execute():
 
         self.planned_trajectory = self.cartesian_trajectory_solution
 
+    def final_state(self):
+        """
+        Joint state at the end of the planned trajectory.
+
+        Joints the trajectory does not move, like the fingers, keep their
+        current positions.
+
+        Returns
+        -------
+        A JointState, used as the predicted start of the next path.
+
+        """
+        trajectory = self.planned_trajectory.joint_trajectory
+        positions = dict(zip(self.current_joint_state.name,
+                             self.current_joint_state.position))
+        if trajectory.points:
+            positions.update(zip(trajectory.joint_names, trajectory.points[-1].positions))
+        return JointState(name=list(positions.keys()),
+                          position=[float(p) for p in positions.values()])
+
+    def joint_distance(self, state):
+        """
+        Largest difference between state and the current joint positions.
+
+        Only the joints in both are compared, None is returned if there are none.
+        """
+        current = dict(zip(self.current_joint_state.name,
+                           self.current_joint_state.position))
+        differences = [abs(position - current[name])
+                       for name, position in zip(state.name, state.position)
+                       if name in current]
+        return max(differences) if differences else None
+
+    def waypoint_segments(self, start, waypoints, max_step=None):
+        """
+        Index of the waypoint each point of the planned trajectory heads to.
+
+        Args:
+        ----
+        start (list): xyz of panda_hand_tcp when the path was planned
+        waypoints (list): the waypoints given to plan_cartesian_path
+        max_step (float): the max_step they were planned with
+
+        Returns
+        -------
+        One waypoint index per trajectory from execute_individual_trajectories.
+
+        """
+        max_step = max_step or self.cartesian_max_step
+        trajectory = self.planned_trajectory.joint_trajectory
+        if trajectory.points and set(JOINT_NAMES) <= set(trajectory.joint_names):
+            # where the end-effector is at every point, from batch FK
+            columns = [list(trajectory.joint_names).index(name) for name in JOINT_NAMES]
+            q = np.array([point.positions for point in trajectory.points])[:, columns]
+            index = segment_index_from_positions(
+                forward_kinematics(q)[:, :3, 3], waypoints, max_step / 4.0)
+            if index is not None:
+                return index
+        return segment_index_map(start, waypoints, len(trajectory.points), max_step)
+
     def plan_path(self):
         """
         Plan a path using the robots joint states and other parameters.
@@ -418,6 +605,19 @@ class Path_Plan_Execute():
         self.node.get_logger().info(
             f"movegroup_result: {self.movegroup_status}")
 
+        # the goal may have come from the cache or the local IK, neither of
+        # which checks for collisions, so try once more with the IK service
+        pose, self.goal_pose = self.goal_pose, None
+        if pose is not None and self.movegroup_result.error_code.val in (
+                MoveItErrorCodes.GOAL_IN_COLLISION,
+                MoveItErrorCodes.INVALID_GOAL_CONSTRAINTS,
+                MoveItErrorCodes.GOAL_CONSTRAINTS_VIOLATED):
+            self.node.get_logger().info(
+                f"goal rejected ({self.movegroup_result.error_code.val}), "
+                "solving it again with the IK service")
+            self.node.executor.create_task(self.replan_with_moveit_ik(pose))
+            return
+
         self.planned_trajectory = self.movegroup_result.planned_trajectory
         # self.node.get_logger().info(
         #     f"currentjointstate: {self.current_joint_state}")
@@ -507,6 +707,9 @@ class Path_Plan_Execute():
         pose (list) : the cartesian coordinates of the box origin
 
         """
+        # IK solutions avoid collisions, so they may change with the scene
+        self.ik_cache.invalidate()
+
         collision_object = CollisionObject()
         collision_object.header.frame_id = frame_id
         collision_object.id = box_id
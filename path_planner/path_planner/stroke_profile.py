@@ -0,0 +1,159 @@
+"""
+Step size of Cartesian strokes from their curvature.
+
+The velocity scaling of a Cartesian request does not set how fast a stroke
+is drawn: execute_individual_trajectories sends every planned point as its
+own trajectory and the executor publishes one of them per PUBLISH_PERIOD.
+The arm therefore moves max_step every PUBLISH_PERIOD, and max_step is the
+only speed control there is.
+
+MoveIt still reaches every waypoint whatever the step, so the step does not
+change the shape of a stroke, only how fast it is drawn and how much the
+direction of travel changes from one published point to the next.
+StrokeProfile picks, for every segment, the largest step in STEPS that
+keeps this change under max_turn, but never less than min_step, the step
+every stroke used to be planned with: straight dashes get long steps and
+are drawn quickly, curves keep the old step. A corner between two straight
+segments turns by its angle whatever the step, so it does not shorten the
+steps around it. Segments drawn under force control are also held to
+force_max_step, which keeps the pen slow enough for the force loop that
+corrects it once per published point.
+
+Curvature does not change under a rigid transform, so the waypoints can be
+given in the robot frame even though the strokes are designed in the board
+frame.
+"""
+
+import numpy as np
+
+# the max_step values a segment can get (m)
+STEPS = (0.0025, 0.005, 0.01, 0.02, 0.04)
+
+# seconds between two points published by the executor, every 10th tick of
+# its 0.01 s timer
+PUBLISH_PERIOD = 0.1
+# fastest the pen is moved along the board under force control (m/s)
+FORCE_MAX_SPEED = 0.2
+
+
+def waypoint_curvature(points):
+    """
+    Compute the curvature of the circle through every point and its neighbours.
+
+    Args:
+    ----
+    points (array): N x 3 positions
+
+    Returns
+    -------
+    N curvatures (1/m), 0 at the two ends and where points coincide.
+
+    """
+    points = np.asarray(points, dtype=np.float64)
+    curvature = np.zeros(len(points))
+    if len(points) < 3:
+        return curvature
+    a = points[1:-1] - points[:-2]
+    b = points[2:] - points[1:-1]
+    c = points[2:] - points[:-2]
+    twice_area = np.linalg.norm(np.cross(a, b), axis=1)
+    sides = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) * np.linalg.norm(c, axis=1)
+    valid = sides > 1e-12
+    curvature[1:-1][valid] = 2.0 * twice_area[valid] / sides[valid]
+    return curvature
+
+
+def waypoint_turn(points):
+    """
+    Compute the change of direction (rad) at every point.
+
+    Args:
+    ----
+    points (array): N x 3 positions
+
+    Returns
+    -------
+    N angles, 0 at the two ends and where points coincide.
+
+    """
+    points = np.asarray(points, dtype=np.float64)
+    turn = np.zeros(len(points))
+    if len(points) < 3:
+        return turn
+    a = points[1:-1] - points[:-2]
+    b = points[2:] - points[1:-1]
+    lengths = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    valid = lengths > 1e-12
+    cos = np.einsum('ij,ij->i', a[valid], b[valid]) / lengths[valid]
+    turn[1:-1][valid] = np.arccos(np.clip(cos, -1.0, 1.0))
+    return turn
+
+
+def segment_curvature(start, waypoints, corner_turn=np.inf):
+    """
+    Compute the curvature of every segment of a stroke, the larger of its two ends.
+
+    Args:
+    ----
+    start (array): xyz the stroke starts from
+    waypoints (list): the Pose waypoints of the stroke
+    corner_turn (float): waypoints turning by more than this (rad) are
+        corners and do not count
+
+    Returns
+    -------
+    One curvature per waypoint, for the segment ending in it.
+
+    """
+    points = [start] + [[pose.position.x, pose.position.y, pose.position.z]
+                        for pose in waypoints]
+    curvature = waypoint_curvature(points)
+    curvature[waypoint_turn(points) > corner_turn] = 0.0
+    return np.maximum(curvature[:-1], curvature[1:])
+
+
+class StrokeProfile:
+    """Choose max_step for every segment of a stroke."""
+
+    def __init__(self, max_turn=0.5, min_step=0.01,
+                 force_max_step=FORCE_MAX_SPEED * PUBLISH_PERIOD):
+        """
+        Create the profile.
+
+        Args:
+        ----
+        max_turn (float): largest change of direction (rad) between two
+            published points
+        min_step (float): shortest step a segment gets (m), however curved
+        force_max_step (float): longest step of a force controlled segment (m)
+
+        """
+        self.max_turn = max_turn
+        self.min_step = min_step
+        self.force_max_step = force_max_step
+
+    def step(self, curvature, use_force_control=False):
+        """Pick the largest step in STEPS that turns at most max_turn."""
+        allowed = [step for step in STEPS
+                   if not use_force_control or step <= self.force_max_step + 1e-9]
+        fits = [step for step in allowed if step * curvature <= self.max_turn]
+        # curves are never drawn slower than with min_step
+        return max(fits + [self.min_step])
+
+    def profile(self, start, waypoints, use_force_control):
+        """
+        Pick the step of every segment of a stroke.
+
+        Args:
+        ----
+        start (array): xyz the stroke starts from
+        waypoints (list): the Pose waypoints of the stroke
+        use_force_control (list): force control flag of every waypoint
+
+        Returns
+        -------
+        A max_step per waypoint.
+
+        """
+        curvature = segment_curvature(start, waypoints, self.max_turn)
+        return [self.step(k, force) for k, force in zip(curvature, use_force_control)]
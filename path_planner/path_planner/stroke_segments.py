@@ -0,0 +1,99 @@
+"""
+Map the points of a multi-waypoint Cartesian path back to its waypoints.
+
+compute_cartesian_path returns one flat list of joint trajectory points
+for all the waypoints of a request. MoveIt interpolates every segment
+between two waypoints in floor(length / max_step) + 1 steps and puts the
+start state first, so the index of the waypoint each point is heading to
+can be recovered from the segment lengths. When the point count does not
+match (MoveIt stopped early, or interpolated differently) the points are
+shared between the segments in proportion to their steps instead.
+
+When the joint positions of the points are known, the end-effector
+positions from forward kinematics give the exact map instead.
+"""
+
+import numpy as np
+
+
+def segment_steps(start, waypoints, max_step):
+    """
+    Count the interpolation steps MoveIt takes for each segment.
+
+    Args:
+    ----
+    start (array): xyz of the end-effector at the start of the path
+    waypoints (list): the Pose waypoints of the request
+    max_step (float): max_step of the request (m)
+
+    Returns
+    -------
+    An integer array with one entry per waypoint.
+
+    """
+    points = np.array([start] + [[pose.position.x, pose.position.y, pose.position.z]
+                                 for pose in waypoints], dtype=np.float64)
+    lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    return np.floor(lengths / max_step).astype(int) + 1
+
+
+def segment_index_from_positions(positions, waypoints, tolerance):
+    """
+    Index of the waypoint every trajectory point is heading to, from FK.
+
+    A point belongs to the first waypoint not reached yet, and the point
+    that reaches a waypoint still belongs to it.
+
+    Args:
+    ----
+    positions (array): N x 3 end-effector positions of the trajectory points
+    waypoints (list): the Pose waypoints of the request
+    tolerance (float): distance (m) at which a waypoint counts as reached
+
+    Returns
+    -------
+    A list of N waypoint indices, or None if the trajectory does not reach
+    the last waypoint.
+
+    """
+    targets = np.array([[pose.position.x, pose.position.y, pose.position.z]
+                        for pose in waypoints], dtype=np.float64)
+    index = []
+    segment = 0
+    for position in positions:
+        index.append(segment)
+        while segment < len(targets) and \
+                np.linalg.norm(position - targets[segment]) <= tolerance:
+            segment += 1
+        if segment == len(targets):
+            break
+    if segment < len(targets) or len(index) < len(positions):
+        return None
+    return index
+
+
+def segment_index_map(start, waypoints, point_count, max_step):
+    """
+    Index of the waypoint every trajectory point is heading to.
+
+    Args:
+    ----
+    start (array): xyz of the end-effector at the start of the path
+    waypoints (list): the Pose waypoints of the request
+    point_count (int): number of points in the planned trajectory
+    max_step (float): max_step of the request (m)
+
+    Returns
+    -------
+    A list of point_count waypoint indices, never decreasing.
+
+    """
+    if point_count <= 0 or not waypoints:
+        return []
+    steps = segment_steps(start, waypoints, max_step)
+    ends = np.cumsum(steps)
+    if ends[-1] != point_count - 1:
+        ends = np.round(ends * (point_count - 1) / ends[-1]).astype(int)
+    # point 0 is the start state, point i > 0 is the step ending at i
+    index = np.searchsorted(ends, np.arange(1, point_count), side='left')
+    return [0] + np.minimum(index, len(waypoints) - 1).tolist()
@@ -0,0 +1,95 @@
+"""
+Memo of compute_cartesian_path results.
+
+The dashes, wrong guess slots and stand are drawn with the same waypoints
+every game. A stored trajectory is reused when it was planned for the same
+board calibration (the epoch the tags node publishes), through the same
+quantized waypoints with the same velocity and max_step, and
+from a start state within start_tolerance of the current one.
+"""
+
+from collections import OrderedDict
+import time
+
+import numpy as np
+
+from path_planner.ik_cache import quantize_pose, seed_distance
+
+
+class TrajectoryCache:
+    """Cache of complete Cartesian paths, evicted by size and by age."""
+
+    def __init__(self, capacity=64, max_age=3600.0, position_step=0.001,
+                 orientation_step=0.005, start_tolerance=0.01):
+        """
+        Create an empty cache.
+
+        Args:
+        ----
+        capacity (int): most waypoint lists to remember
+        max_age (float): seconds a trajectory stays valid
+        position_step (float): quantization of the waypoint positions (m)
+        orientation_step (float): quantization of the waypoint quaternions
+        start_tolerance (float): largest joint difference (rad) between the
+            current state and the start of a stored trajectory
+
+        """
+        self.capacity = capacity
+        self.max_age = max_age
+        self.position_step = position_step
+        self.orientation_step = orientation_step
+        self.start_tolerance = start_tolerance
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, epoch, waypoints, velocity, max_step):
+        """Hashable key of a planning request."""
+        return (epoch, round(velocity, 6), round(max_step, 6)) + tuple(
+            quantize_pose(pose, self.position_step, self.orientation_step)
+            for pose in waypoints)
+
+    def evict(self, now):
+        """Drop trajectories older than max_age, then the least recently used."""
+        for key in [key for key, (stamp, _) in self.entries.items()
+                    if now - stamp > self.max_age]:
+            del self.entries[key]
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def get(self, epoch, waypoints, velocity, max_step, start_state):
+        """
+        Look up a trajectory planned from close to start_state.
+
+        Returns
+        -------
+        The cached GetCartesianPath response, or None.
+
+        """
+        self.evict(time.monotonic())
+        key = self.key(epoch, waypoints, velocity, max_step)
+        entry = self.entries.get(key)
+        if entry is not None:
+            names, positions, response = entry[1]
+            distance = seed_distance(names, positions, start_state)
+            if distance is not None and distance <= self.start_tolerance:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return response
+        self.misses += 1
+        return None
+
+    def put(self, epoch, waypoints, velocity, max_step, start_state, response):
+        """Store a complete GetCartesianPath response."""
+        key = self.key(epoch, waypoints, velocity, max_step)
+        self.entries[key] = (time.monotonic(), (
+            tuple(start_state.name),
+            np.asarray(start_state.position, dtype=np.float64), response))
+        self.entries.move_to_end(key)
+        self.evict(time.monotonic())
+
+    def stats(self):
+        """One line summary for the logs."""
+        total = self.hits + self.misses
+        return (f'trajectory cache: {self.hits}/{total} hits, '
+                f'{len(self.entries)} paths')
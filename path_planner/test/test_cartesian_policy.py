@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('moveit_msgs')
+
+from builtin_interfaces.msg import Duration  # noqa: E402
+from moveit_msgs.msg import MoveItErrorCodes  # noqa: E402
+from moveit_msgs.srv import GetCartesianPath  # noqa: E402
+from path_planner.cartesian_policy import failure, join, line_deviation, reached  # noqa: E402
+from trajectory_msgs.msg import JointTrajectoryPoint  # noqa: E402
+
+
+def response(names, points, fraction, error=MoveItErrorCodes.SUCCESS):
+    """Make a GetCartesianPath response with one point per second."""
+    result = GetCartesianPath.Response()
+    result.solution.joint_trajectory.joint_names = names
+    result.solution.joint_trajectory.points = [
+        JointTrajectoryPoint(positions=positions, time_from_start=Duration(sec=i))
+        for i, positions in enumerate(points)]
+    result.fraction = fraction
+    result.error_code.val = error
+    return result
+
+
+def test_reached():
+    assert reached(response([], [], 1.0), 3) == 3
+    assert reached(response([], [], 2.0 / 3.0), 3) == 2
+    assert reached(response([], [], 1.0 / 3.0), 3) == 1
+    assert reached(response([], [], 0.99), 3) == 2
+    assert reached(response([], [], 1.0, MoveItErrorCodes.PLANNING_FAILED), 3) == 0
+
+
+def test_failure():
+    result = failure()
+    assert result.error_code.val == MoveItErrorCodes.PLANNING_FAILED
+    assert reached(result, 1) == 0
+    assert not result.solution.joint_trajectory.points
+
+
+def test_join_keeps_joints_a_piece_does_not_move():
+    first = response(['a', 'b'], [[0.0, 0.0], [1.0, 0.0]], 1.0)
+    second = response(['b'], [[0.0], [2.0]], 0.5)
+    ignored = response(['a', 'b'], [[1.0, 2.0], [5.0, 5.0]], 1.0)
+    joined = join([(first, 2), (second, 2), (ignored, 1)], 5)
+    trajectory = joined.solution.joint_trajectory
+    assert trajectory.joint_names == ['a', 'b']
+    # the second piece starts where the first ends, and stops after it
+    assert [list(point.positions) for point in trajectory.points] == \
+        [[0.0, 0.0], [1.0, 0.0], [1.0, 2.0]]
+    assert np.isclose(joined.fraction, 3 / 5)
+    assert joined.error_code.val == MoveItErrorCodes.SUCCESS
+
+
+def test_join_of_nothing_reached_fails():
+    joined = join([(response(['a'], [[0.0]], 0.0), 2)], 2)
+    assert joined.fraction == 0.0
+    assert joined.error_code.val == MoveItErrorCodes.PLANNING_FAILED
+
+
+def test_line_deviation():
+    assert line_deviation(np.linspace([0, 0, 0], [1, 2, 3], 5)) == 0.0
+    t = np.linspace(0, np.pi, 101)
+    arc = np.stack([np.cos(t), np.sin(t), np.zeros_like(t)], axis=1)
+    assert np.isclose(line_deviation(arc), 1.0)
+    # back to the start: the distance from the start
+    assert np.isclose(line_deviation(np.array([[0, 0, 0], [0.003, 0.004, 0], [0, 0, 0.0]])),
+                      0.005)
+    # before the start: measured from the end point of the segment
+    assert np.isclose(line_deviation(np.array([[0, 0, 0], [-0.003, 0, 0], [0.01, 0, 0.0]])),
+                      0.003)
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+from path_planner.ik_cache import IKCache, quantize_pose, seed_distance
+import numpy as np
+
+NAMES = ['panda_joint1', 'panda_joint2', 'panda_joint3']
+
+
+def pose(x, y, z, qx=1.0, qy=0.0, qz=0.0, qw=0.0):
+    return SimpleNamespace(position=SimpleNamespace(x=x, y=y, z=z),
+                           orientation=SimpleNamespace(x=qx, y=qy, z=qz, w=qw))
+
+
+def joints(*positions, names=NAMES):
+    return SimpleNamespace(name=list(names), position=list(positions))
+
+
+def test_quantize_pose():
+    assert quantize_pose(pose(0.3, -0.1, 0.4), 0.001, 0.005) == (300, -100, 400, 200, 0, 0, 0)
+    # positions closer than half a step share a key
+    assert quantize_pose(pose(0.3002, -0.1, 0.4), 0.001, 0.005) == \
+        quantize_pose(pose(0.2999, -0.1, 0.4), 0.001, 0.005)
+    assert quantize_pose(pose(0.301, -0.1, 0.4), 0.001, 0.005) != \
+        quantize_pose(pose(0.3, -0.1, 0.4), 0.001, 0.005)
+
+
+def test_quantize_pose_of_opposite_quaternions():
+    q = np.array([0.1, -0.7, 0.2, 0.5])
+    q /= np.linalg.norm(q)
+    assert quantize_pose(pose(0, 0, 0, *q), 0.001, 0.005) == \
+        quantize_pose(pose(0, 0, 0, *-q), 0.001, 0.005)
+    # w is zero, so the sign comes from x
+    assert quantize_pose(pose(0, 0, 0, -1.0), 0.001, 0.005) == \
+        quantize_pose(pose(0, 0, 0, 1.0), 0.001, 0.005)
+
+
+def test_seed_distance():
+    positions = np.array([0.1, 0.2, 0.3])
+    assert np.isclose(seed_distance(tuple(NAMES), positions, joints(0.1, 0.25, 0.2)), 0.1)
+    assert seed_distance(tuple(NAMES), positions, joints(0.1, 0.2, 0.3, names=NAMES[::-1])) \
+        is None
+    assert seed_distance(tuple(NAMES), positions, joints(0.1, 0.2)) is None
+
+
+def test_get_needs_a_close_seed():
+    cache = IKCache(seed_tolerance=0.2)
+    cache.put(pose(0.3, 0.0, 0.4), joints(0.0, 0.0, 0.0), 'solution')
+    assert cache.get(pose(0.3, 0.0, 0.4), joints(0.1, -0.1, 0.15)) == 'solution'
+    assert cache.get(pose(0.3, 0.0, 0.4), joints(0.3, 0.0, 0.0)) is None
+    assert cache.get(pose(0.31, 0.0, 0.4), joints(0.0, 0.0, 0.0)) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert np.isclose(cache.hit_rate(), 1 / 3)
+
+
+def test_get_prefers_the_closest_seed():
+    cache = IKCache()
+    cache.put(pose(0.3, 0.0, 0.4), joints(0.0, 0.0, 0.0), 'elbow up')
+    cache.put(pose(0.3, 0.0, 0.4), joints(0.15, 0.0, 0.0), 'elbow down')
+    assert cache.get(pose(0.3, 0.0, 0.4), joints(0.1, 0.0, 0.0)) == 'elbow down'
+    assert cache.get(pose(0.3, 0.0, 0.4), joints(0.05, 0.0, 0.0)) == 'elbow up'
+
+
+def test_only_the_last_seeds_are_kept():
+    cache = IKCache()
+    for k in range(6):
+        cache.put(pose(0.3, 0.0, 0.4), joints(float(k), 0.0, 0.0), k)
+    assert len(cache.entries[cache.pose_key(pose(0.3, 0.0, 0.4))]) == 4
+    assert cache.get(pose(0.3, 0.0, 0.4), joints(0.0, 0.0, 0.0)) is None
+    assert cache.get(pose(0.3, 0.0, 0.4), joints(2.0, 0.0, 0.0)) == 2
+
+
+def test_least_recently_used_pose_is_dropped():
+    cache = IKCache(capacity=2)
+    seed = joints(0.0, 0.0, 0.0)
+    cache.put(pose(0.1, 0.0, 0.4), seed, 'a')
+    cache.put(pose(0.2, 0.0, 0.4), seed, 'b')
+    assert cache.get(pose(0.1, 0.0, 0.4), seed) == 'a'
+    cache.put(pose(0.3, 0.0, 0.4), seed, 'c')
+    assert cache.get(pose(0.2, 0.0, 0.4), seed) is None
+    assert cache.get(pose(0.1, 0.0, 0.4), seed) == 'a'
+    assert cache.get(pose(0.3, 0.0, 0.4), seed) == 'c'
+
+
+def test_discard_and_invalidate():
+    cache = IKCache()
+    seed = joints(0.0, 0.0, 0.0)
+    cache.put(pose(0.1, 0.0, 0.4), seed, 'a')
+    cache.put(pose(0.2, 0.0, 0.4), seed, 'b')
+    cache.discard(pose(0.1, 0.0, 0.4))
+    cache.discard(pose(0.5, 0.0, 0.4))
+    assert cache.get(pose(0.1, 0.0, 0.4), seed) is None
+    assert cache.get(pose(0.2, 0.0, 0.4), seed) == 'b'
+    cache.invalidate()
+    cache.invalidate()
+    assert cache.invalidations == 1
+    assert cache.get(pose(0.2, 0.0, 0.4), seed) is None
+    assert cache.stats() == 'IK cache: 1/3 hits (33.3%), 0 poses, 1 invalidations'
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+from path_planner.panda_kinematics import (arm_positions, forward_kinematics,
+                                           inverse_kinematics, jacobian, JOINT_NAMES,
+                                           link_transforms, LOWER_LIMITS, pose_error,
+                                           pose_to_transform, UPPER_LIMITS)
+import numpy as np
+
+READY = np.array([0.0, -np.pi / 4, 0.0, -3 * np.pi / 4, 0.0, np.pi / 2, np.pi / 4])
+
+
+def random_configurations(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(LOWER_LIMITS + 0.1, UPPER_LIMITS - 0.1, (n, 7))
+
+
+def rotation_about_z(angle):
+    return np.array([[np.cos(angle), -np.sin(angle), 0.0],
+                     [np.sin(angle), np.cos(angle), 0.0],
+                     [0.0, 0.0, 1.0]])
+
+
+def test_ready_pose():
+    tcp = forward_kinematics(READY)
+    np.testing.assert_allclose(tcp[:3, 3], [0.307, 0.0, 0.487], atol=5e-4)
+    # the pen points straight down
+    np.testing.assert_allclose(tcp[:3, :3], np.diag([1.0, -1.0, -1.0]), atol=1e-12)
+    flange = forward_kinematics(READY, 'panda_link8')
+    np.testing.assert_allclose(flange[:3, 3], tcp[:3, 3] + [0.0, 0.0, 0.1034], atol=1e-12)
+
+
+def test_zero_pose():
+    # the arm stretched straight up
+    frames = link_transforms(np.zeros(7))
+    np.testing.assert_allclose(frames[7, :3, 3], [0.088, 0.0, 0.333 + 0.316 + 0.384],
+                               atol=1e-12)
+    np.testing.assert_allclose(frames[8, :3, 3], [0.088, 0.0, 0.926], atol=1e-12)
+
+
+def test_batch_matches_single_configurations():
+    q = random_configurations(10).reshape(2, 5, 7)
+    batch = forward_kinematics(q)
+    assert batch.shape == (2, 5, 4, 4)
+    for i in range(2):
+        for j in range(5):
+            np.testing.assert_allclose(batch[i, j], forward_kinematics(q[i, j]), atol=1e-14)
+
+
+def test_rotations_are_orthonormal():
+    R = link_transforms(random_configurations(20))[..., :3, :3]
+    np.testing.assert_allclose(R @ np.swapaxes(R, -1, -2),
+                               np.broadcast_to(np.eye(3), R.shape), atol=1e-12)
+
+
+def test_jacobian_matches_finite_differences():
+    eps = 1e-6
+    for q in random_configurations(5, seed=1):
+        J = jacobian(q)
+        T = forward_kinematics(q)
+        for i in range(7):
+            dq = np.zeros(7)
+            dq[i] = eps
+            numerical = pose_error(T, forward_kinematics(q + dq)) / eps
+            np.testing.assert_allclose(J[:, i], numerical, atol=1e-5)
+    assert jacobian(random_configurations(3)).shape == (3, 6, 7)
+
+
+def test_pose_error():
+    current = np.eye(4)
+    target = np.eye(4)
+    target[:3, :3] = rotation_about_z(0.3)
+    target[:3, 3] = [0.1, -0.2, 0.3]
+    np.testing.assert_allclose(pose_error(current, target), [0, 0, 0.3, 0.1, -0.2, 0.3])
+    # a half turn, where the axis cannot come from the sine
+    target[:3, :3] = rotation_about_z(np.pi)
+    np.testing.assert_allclose(np.abs(pose_error(current, target)[:3]), [0, 0, np.pi],
+                               atol=1e-12)
+
+
+def test_inverse_kinematics_reaches_a_nearby_pose():
+    target = forward_kinematics(READY)
+    target[:3, 3] += [0.05, -0.08, -0.3]
+    target[:3, :3] = target[:3, :3] @ rotation_about_z(0.4)
+    q, success = inverse_kinematics(target, READY)
+    assert success
+    assert np.all(q >= LOWER_LIMITS) and np.all(q <= UPPER_LIMITS)
+    assert np.max(np.abs(pose_error(forward_kinematics(q), target))) < 1e-4
+
+
+def test_inverse_kinematics_round_trip():
+    for q in random_configurations(10, seed=2):
+        # seeded near the answer, as the planner seeds with the current state
+        seed = np.clip(q + 0.1, LOWER_LIMITS, UPPER_LIMITS)
+        solution, success = inverse_kinematics(forward_kinematics(q), seed)
+        assert success
+        np.testing.assert_allclose(forward_kinematics(solution), forward_kinematics(q),
+                                   atol=2e-4)
+
+
+def test_inverse_kinematics_of_an_unreachable_pose():
+    target = np.eye(4)
+    target[:3, 3] = [2.0, 0.0, 0.5]
+    _, success = inverse_kinematics(target, READY)
+    assert not success
+
+
+def test_arm_positions():
+    names = ['panda_finger_joint1'] + list(JOINT_NAMES[::-1])
+    state = SimpleNamespace(name=names, position=[0.04] + READY[::-1].tolist())
+    np.testing.assert_array_equal(arm_positions(state), READY)
+    state = SimpleNamespace(name=list(JOINT_NAMES[:6]), position=READY[:6].tolist())
+    assert arm_positions(state) is None
+
+
+def test_pose_to_transform():
+    # a quaternion that is not normalized, a half turn about x
+    pose = SimpleNamespace(position=SimpleNamespace(x=0.3, y=0.0, z=0.5),
+                           orientation=SimpleNamespace(x=2.0, y=0.0, z=0.0, w=0.0))
+    expected = np.eye(4)
+    expected[:3, :3] = np.diag([1.0, -1.0, -1.0])
+    expected[:3, 3] = [0.3, 0.0, 0.5]
+    np.testing.assert_allclose(pose_to_transform(pose), expected, atol=1e-12)
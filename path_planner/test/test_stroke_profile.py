@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+from path_planner.stroke_profile import (FORCE_MAX_SPEED, PUBLISH_PERIOD, segment_curvature,
+                                         STEPS, StrokeProfile, waypoint_curvature,
+                                         waypoint_turn)
+import numpy as np
+
+
+def poses(points):
+    return [SimpleNamespace(position=SimpleNamespace(x=x, y=y, z=z)) for x, y, z in points]
+
+
+def circle(radius, n=16):
+    t = np.linspace(0.0, np.pi, n)
+    return np.stack([radius * np.cos(t), radius * np.sin(t), np.full(n, 0.1)], axis=1)
+
+
+def test_waypoint_curvature_of_a_circle():
+    curvature = waypoint_curvature(circle(0.02))
+    assert curvature[0] == 0.0 and curvature[-1] == 0.0
+    np.testing.assert_allclose(curvature[1:-1], 50.0)
+
+
+def test_waypoint_curvature_of_lines_and_repeats():
+    np.testing.assert_allclose(waypoint_curvature(np.linspace([0, 0, 0], [1, 2, 0], 6)), 0.0)
+    points = [[0, 0, 0], [0, 0, 0], [1, 0, 0]]
+    np.testing.assert_array_equal(waypoint_curvature(points), [0.0, 0.0, 0.0])
+    assert len(waypoint_curvature([[0, 0, 0], [1, 0, 0]])) == 2
+
+
+def test_curvature_does_not_depend_on_the_frame():
+    points = circle(0.05)
+    angle = 0.7
+    rotation = np.array([[np.cos(angle), 0.0, np.sin(angle)], [0.0, 1.0, 0.0],
+                         [-np.sin(angle), 0.0, np.cos(angle)]])
+    moved = points @ rotation.T + [0.3, -0.2, 0.5]
+    np.testing.assert_allclose(waypoint_curvature(moved), waypoint_curvature(points))
+
+
+def test_segment_curvature_takes_the_larger_end():
+    # a right angle at the second waypoint
+    start = [0.0, 0.0, 0.0]
+    curvature = segment_curvature(start, poses([[0.01, 0, 0], [0.01, 0.01, 0],
+                                                [0.02, 0.01, 0]]))
+    assert len(curvature) == 3
+    assert curvature[0] == curvature[1] == curvature[2] > 0.0
+
+
+def test_waypoint_turn():
+    points = [[0, 0, 0], [1, 0, 0], [1, 1, 0], [1, 1, 0], [0, 2, 0]]
+    np.testing.assert_allclose(waypoint_turn(points), [0, np.pi / 2, 0, 0, 0])
+    np.testing.assert_allclose(waypoint_turn([[0, 0, 0], [1, 0, 0], [0, 0, 0]]), [0, np.pi, 0])
+    np.testing.assert_allclose(waypoint_turn(circle(0.02))[1:-1], np.pi / 15)
+
+
+def test_corners_do_not_count():
+    start = [0.0, 0.0, 0.0]
+    waypoints = poses([[0.01, 0, 0], [0.02, 0, 0], [0.02, 0.01, 0], [0.02, 0.02, 0]])
+    assert np.all(segment_curvature(start, waypoints)[1:3] > 100.0)
+    np.testing.assert_array_equal(segment_curvature(start, waypoints, corner_turn=0.5), 0.0)
+
+
+def test_step():
+    profile = StrokeProfile(max_turn=0.5, min_step=0.01, force_max_step=0.02)
+    assert profile.step(0.0) == max(STEPS)
+    assert profile.step(20.0) == 0.02
+    assert profile.step(40.0) == 0.01
+    # however curved, never slower than the old fixed step
+    assert profile.step(1000.0) == 0.01
+    assert profile.step(0.0, use_force_control=True) == 0.02
+    assert profile.step(1000.0, use_force_control=True) == 0.01
+    # without a floor, tight curves get shorter steps
+    assert StrokeProfile(min_step=min(STEPS)).step(1000.0) == min(STEPS)
+
+
+def test_force_controlled_steps_follow_the_publish_rate():
+    profile = StrokeProfile()
+    assert profile.force_max_step == FORCE_MAX_SPEED * PUBLISH_PERIOD
+    assert profile.step(0.0, use_force_control=True) / PUBLISH_PERIOD <= FORCE_MAX_SPEED
+
+
+def test_profile_of_a_dash_and_an_arc():
+    profile = StrokeProfile()
+    dash = poses(np.linspace([0.3, 0.0, 0.1], [0.4, 0.0, 0.1], 5)[1:])
+    start = [0.3, 0.0, 0.1]
+    assert profile.profile(start, dash, [False] * 4) == [0.04] * 4
+    # a dash on the board is still drawn faster than with the old 1 cm step
+    assert profile.profile(start, dash, [True] * 4) == [0.02] * 4
+
+    arc = circle(0.03)
+    assert profile.profile(arc[0], poses(arc[1:]), [True] * 15) == [0.01] * 15
+    arc = circle(0.005)
+    assert profile.profile(arc[0], poses(arc[1:]), [True] * 15) == [0.01] * 15
+
+
+def test_profile_of_a_corner():
+    # an L on the board, its corner does not slow the straight strokes down
+    profile = StrokeProfile()
+    start = [0.0, 0.0, 0.0]
+    waypoints = poses([[0.05, 0, 0], [0.1, 0, 0], [0.1, 0.05, 0], [0.1, 0.1, 0]])
+    assert profile.profile(start, waypoints, [True] * 4) == [0.02] * 4
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from path_planner.stroke_segments import (segment_index_from_positions, segment_index_map,
+                                          segment_steps)
+import numpy as np
+
+
+def pose(x, y, z):
+    return SimpleNamespace(position=SimpleNamespace(x=x, y=y, z=z))
+
+
+START = [0.0, 0.0, 0.0]
+# 2.5 cm along x, then 1.5 cm along y
+WAYPOINTS = [pose(0.025, 0.0, 0.0), pose(0.025, 0.015, 0.0)]
+
+
+def test_segment_steps():
+    np.testing.assert_array_equal(segment_steps(START, WAYPOINTS, 0.01), [3, 2])
+    # a waypoint on top of the last one still takes a step
+    np.testing.assert_array_equal(segment_steps(START, [pose(0, 0, 0)], 0.01), [1])
+
+
+def test_segment_index_map():
+    assert segment_index_map(START, WAYPOINTS, 6, 0.01) == [0, 0, 0, 0, 1, 1]
+
+
+def test_segment_index_map_of_a_different_point_count():
+    # the steps are stretched over the points MoveIt returned
+    assert segment_index_map(START, WAYPOINTS, 11, 0.01) == [0] * 7 + [1] * 4
+    index = segment_index_map(START, WAYPOINTS, 4, 0.01)
+    assert len(index) == 4 and index[0] == 0 and index[-1] == 1
+    assert index == sorted(index)
+
+
+def test_segment_index_map_of_nothing():
+    assert segment_index_map(START, WAYPOINTS, 0, 0.01) == []
+    assert segment_index_map(START, [], 5, 0.01) == []
+
+
+def test_segment_index_from_positions():
+    positions = np.array([[0.0, 0.0, 0.0], [0.01, 0.0, 0.0], [0.02, 0.0, 0.0],
+                          [0.025, 0.0, 0.0], [0.025, 0.008, 0.0], [0.025, 0.015, 0.0]])
+    assert segment_index_from_positions(positions, WAYPOINTS, 0.001) == [0, 0, 0, 0, 1, 1]
+    # uneven steps, as MoveIt takes near a singularity
+    positions = np.array([[0.0, 0.0, 0.0], [0.024, 0.0, 0.0], [0.0252, 0.0003, 0.0],
+                          [0.025, 0.004, 0.0], [0.025, 0.009, 0.0], [0.025, 0.015, 0.0]])
+    assert segment_index_from_positions(positions, WAYPOINTS, 0.001) == [0, 0, 0, 1, 1, 1]
+
+
+def test_segment_index_from_positions_short_of_the_end():
+    positions = np.array([[0.0, 0.0, 0.0], [0.025, 0.0, 0.0], [0.025, 0.01, 0.0]])
+    assert segment_index_from_positions(positions, WAYPOINTS, 0.001) is None
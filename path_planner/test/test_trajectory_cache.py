@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from path_planner.trajectory_cache import TrajectoryCache
+import pytest
+
+NAMES = ['panda_joint1', 'panda_joint2']
+
+
+def pose(x, y, z):
+    return SimpleNamespace(position=SimpleNamespace(x=x, y=y, z=z),
+                           orientation=SimpleNamespace(x=1.0, y=0.0, z=0.0, w=0.0))
+
+
+def joints(*positions):
+    return SimpleNamespace(name=list(NAMES), position=list(positions))
+
+
+DASH = [pose(0.3, 0.0, 0.1), pose(0.35, 0.0, 0.1)]
+START = joints(0.0, -0.785)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(t=1000.0)
+    monkeypatch.setattr('path_planner.trajectory_cache.time.monotonic', lambda: now.t)
+    return now
+
+
+def test_get_matches_the_whole_request(clock):
+    cache = TrajectoryCache()
+    cache.put(3, DASH, 0.1, 0.01, START, 'dash')
+    assert cache.get(3, DASH, 0.1, 0.01, joints(0.005, -0.78)) == 'dash'
+    # another calibration, velocity, step, path or start state misses
+    assert cache.get(4, DASH, 0.1, 0.01, START) is None
+    assert cache.get(3, DASH, 0.2, 0.01, START) is None
+    assert cache.get(3, DASH, 0.1, 0.005, START) is None
+    assert cache.get(3, DASH[::-1], 0.1, 0.01, START) is None
+    assert cache.get(3, DASH, 0.1, 0.01, joints(0.05, -0.785)) is None
+    assert (cache.hits, cache.misses) == (1, 5)
+    assert cache.stats() == 'trajectory cache: 1/6 hits, 1 paths'
+
+
+def test_waypoints_are_quantized(clock):
+    cache = TrajectoryCache(position_step=0.001)
+    cache.put(0, DASH, 0.1, 0.01, START, 'dash')
+    close = [pose(0.3002, 0.0, 0.1), pose(0.35, -0.0003, 0.1)]
+    assert cache.get(0, close, 0.1, 0.01, START) == 'dash'
+
+
+def test_old_trajectories_expire(clock):
+    cache = TrajectoryCache(max_age=60.0)
+    cache.put(0, DASH, 0.1, 0.01, START, 'dash')
+    clock.t += 59.0
+    assert cache.get(0, DASH, 0.1, 0.01, START) == 'dash'
+    clock.t += 2.0
+    assert cache.get(0, DASH, 0.1, 0.01, START) is None
+    assert not cache.entries
+
+
+def test_least_recently_used_path_is_dropped(clock):
+    cache = TrajectoryCache(capacity=2)
+    paths = [[pose(0.1 * k, 0.0, 0.1)] for k in range(3)]
+    cache.put(0, paths[0], 0.1, 0.01, START, 0)
+    cache.put(0, paths[1], 0.1, 0.01, START, 1)
+    assert cache.get(0, paths[0], 0.1, 0.01, START) == 0
+    cache.put(0, paths[2], 0.1, 0.01, START, 2)
+    assert cache.get(0, paths[1], 0.1, 0.01, START) is None
+    assert cache.get(0, paths[0], 0.1, 0.01, START) == 0
+    assert cache.get(0, paths[2], 0.1, 0.01, START) == 2
+
+
+def test_put_replaces_the_start_state(clock):
+    cache = TrajectoryCache()
+    cache.put(0, DASH, 0.1, 0.01, START, 'old')
+    cache.put(0, DASH, 0.1, 0.01, joints(0.5, -0.785), 'new')
+    assert cache.get(0, DASH, 0.1, 0.01, START) is None
+    assert cache.get(0, DASH, 0.1, 0.01, joints(0.5, -0.785)) == 'new'